@@ -1,16 +1,32 @@
 import json
-import copy
-from flask import Flask, render_template, url_for
+import sys
+import numpy as np
+from bisect import bisect_left
+from collections import deque
+from flask import Flask, Response, render_template, url_for, jsonify
+from bitset_domains import BitsetDomains
+from nogoods import NogoodStore
+import search_control
+import local_search
+import job_service
+import page_cache
+import instrumentation
+import problem_model
+import problem_cache
+import symmetry
+from problem_model import ClassType, SAME_GROUP, BEFORE, AFTER
 app = Flask(__name__)
 
 restrictions = []
 duringConstructionRestrictions = []
 fileNames = ['grupe', 'materii', 'profesori', 'sali', 'timp', 'extraRestrictions']
 loadedData = {}
+fileContents = []  # what the startup cache key is computed from
 # loading the data that we have
 for fileName in fileNames:
-    with open(f'./data/{fileName}.json', 'r') as file:
-        readData = json.load(file)
+    with open(f'./data/{fileName}.json', 'rb') as file:
+        fileContents.append(file.read())
+        readData = json.loads(fileContents[-1])
         loadedData[fileName] = readData
 
 group_codes = {group['cod']: group for group in loadedData['grupe']}
@@ -18,10 +34,40 @@ sala_codes = {sala['cod']: sala for sala in loadedData['sali']}
 profesor_codes = {profesor['cod']: profesor for profesor in loadedData['profesori']}
 materie_codes = {materie['cod']: materie for materie in loadedData['materii']}
 time_codes = {time['cod']: time for time in loadedData['timp']}
+preferred_times = {
+    restriction['profId']: set(restriction['intervalTimpPreferat'])
+    for restriction in loadedData['extraRestrictions']['extraRestricitions'] if restriction['tip'] == 2
+}
+
+# revise procedure used by AC3(): 'ac3' (rescan the domain of Xj from the start every time)
+# or 'ac2001' (AC-2001/AC-3.1 - remember the last support and resume the scan after it)
+PROPAGATOR = 'ac3'
+
+# conflict-directed backjumping on top of MAC + learned nogoods (bounded, least recently used evicted)
+BACKJUMPING = True
+NOGOOD_CAPACITY = 10000
+# False => plain backtracking: a value is only checked against the classes already assigned (no AC-3 in the search)
+MAINTAIN_ARC_CONSISTENCY = True
+# search budgets and restarts (see search_control.py), None = no limit / no restarts
+SEARCH_TIME_BUDGET = None  # seconds
+SEARCH_NODE_BUDGET = None
+RESTART_SCHEDULE = None  # None, 'luby' or 'geometric'
+RESTART_BASE = 10  # nodes of the first restart (a MAC node costs much more than an eng_main one)
+# preferred intervals (extraRestrictions tip 2) are soft: a class of the professor outside his interval costs
+# PREFERRED_INTERVAL_WEIGHT, and LOCAL_SEARCH ('tabu', 'annealing' or None, see local_search.py) lowers that
+# penalty of the solution for LOCAL_SEARCH_TIME_BUDGET seconds
+PREFERRED_INTERVAL_WEIGHT = 1
+LOCAL_SEARCH = None
+LOCAL_SEARCH_TIME_BUDGET = 10
+# of the values that only differ by an interchangeable room, or by a professor with no class yet that is
+# interchangeable with another one, only the first is tried (see symmetry.py)
+SYMMETRY_BREAKING = True
+# keep the domains / neighbors / AC-3 preprocessing of the data/ files in the startup cache (problem_cache.py)
+PROBLEM_CACHE = True
 
 # initialize variables
 bestTimeTable = None
-bestTimeTableScore = 0
+bestTimeTableScore = 0  # preference penalty of bestTimeTable (lower is better)
 currentTimetable = {}  # currentTimetable[profesorIndex][timeIndex] = (grupa, sala, materie)
 profesor_hours = {}
 group_schedule = {}
@@ -66,85 +112,66 @@ for materie in loadedData['materii']:
             })
 
 # Define the initial domains for each variable (class)
-variable_domains = {}
-for class_index, cls in enumerate(class_list):
-    variable_domains[class_index] = []
-    materie = cls['materie']
-    grupa = cls['grupa']
-    class_type = cls['type']  # 'course' or 'seminar'
-    #  store all valid combinations of professor, time, and room for a given class.
-
-    possible_professors = []
-
-    for profesor in loadedData['profesori']:
-        if materie in profesor['materiiPredate']:
-            profesorIndex = profesor['cod']
-
-            # check if the professor can teach courses/seminars
-            if class_type == 'course' and profesor['poatePredaCurs'] == 0:
-                continue
-
-            possible_professors.append(profesorIndex)
+# domain_tensor[class, prof, time, room] = True if (prof, time, room) is a valid assignment for the class
+# built from small availability matrices instead of looping over every (prof, time, room)
+# (the axes are the dense ids of the compiled model = file order, see problem_model.py)
+model = problem_model.compile_ac3_data(loadedData, class_list)
+# interchangeable rooms / professors (the professors compared with their preferred intervals too)
+room_class = symmetry.room_classes(model)
+teacher_class = symmetry.teacher_classes(model, [frozenset(preferred_times[code]) if code in preferred_times else None
+                                               for code in model.teachers.code])
+# the domains, Neighbors and the AC-3 preprocessing below only depend on the data/ files: on a restart with
+# the same files they are read from the startup cache instead (see problem_cache.py)
+cache_key = problem_cache.digest(fileContents, 'ac3')
+cached = problem_cache.load('ac3', cache_key) if PROBLEM_CACHE else None
+if cached is None:
+    prof_order = model.teachers.code.tolist()
+    time_order = model.slots.code.tolist()
+    sala_order = model.rooms.code.tolist()
+
+    is_course_class = np.array(model.class_kind, dtype=np.int8) == ClassType.COURSE
+
+    # the professor teaches the subject and, for courses, can teach courses
+    prof_teaches = np.array([[model.teacher_subjects[p] >> model.class_subject[c] & 1 for p in range(len(model.teachers))]
+                             for c in range(len(class_list))], dtype=bool)
+    prof_can_teach_course = np.array(model.teacher_can_teach_course, dtype=bool)
+    class_prof_ok = prof_teaches & (~is_course_class[:, None] | prof_can_teach_course[None, :])
 
-    # the constraints:
     # room must support course/seminar(by default for seminar)
-    # room must be available at the given timeslot
-
-    for profesorIndex in possible_professors:
-        profesor = profesor_codes[profesorIndex]
-        for time in loadedData['timp']:
-            timeIndex = time['cod']
-            for sala in loadedData['sali']:
-                salaIndex = sala['cod']
-                is_course = (class_type == 'course')
-                if is_course and sala['curs_posibil'] != 1:     
-                    continue
-                if not is_course and sala['curs_posibil'] != 0:
-                    continue
-                if timeIndex not in sala['timp_posibil']:
-                    continue  # room is not available at this time
-
-                assignment = (profesorIndex, timeIndex, salaIndex)
-                variable_domains[class_index].append(assignment)
-                # domain of possible assignments for each class
-                # ## a list of valid combinations of (prof., time, room)
-
-# define neighbors(another variables with whom the first one interacts ~ restr.) for each variable(class)
-Neighbors = {}  # Neighbors[Xi(class)] = indices of neighboring variables
-for i in range(len(class_list)):
-    Neighbors[i] = set() # i is the index of  a class in class_list
-
-for i in range(len(class_list)):
-    Xi = class_list[i]
-    for j in range(len(class_list)):
-        if i == j:
-            continue # a class can t neighbour itself
-        Xj = class_list[j]
-
-        # if they share the same group (#so they 'share' a constraint)
-        if Xi['grupa'] == Xj['grupa']:
-            Neighbors[i].add(j) # we ll check if they can both be scheduled without conflicts (e.g time)
-            continue
-
-        # if they can possibly be assigned the same professor
-        possible_professors_i = set(assignment[0] for assignment in variable_domains[i])
-        possible_professors_j = set(assignment[0] for assignment in variable_domains[j])
-        if possible_professors_i & possible_professors_j:
-            Neighbors[i].add(j) # if possible professors overlap => neighbors
-            continue
-
-        # if they can possibly be assigned the same room
-        possible_rooms_i = set(assignment[2] for assignment in variable_domains[i])
-        possible_rooms_j = set(assignment[2] for assignment in variable_domains[j])
-        if possible_rooms_i & possible_rooms_j:
-            Neighbors[i].add(j)
-            continue
+    sala_is_course = np.array(model.room_course_possible, dtype=bool)
+    sala_is_seminar = ~sala_is_course
+    class_sala_ok = np.where(is_course_class[:, None], sala_is_course[None, :], sala_is_seminar[None, :])
 
-        # course before seminar constraint
-        if Xi['materie'] == Xj['materie'] and Xi['grupa'] == Xj['grupa']:
-            if (Xi['type'] == 'course' and Xj['type'] == 'seminar') or (Xi['type'] == 'seminar' and Xj['type'] == 'course'):
-                Neighbors[i].add(j)
-                continue
+    # room must be available at the given timeslot
+    time_sala_ok = np.array([[model.room_free(r, t) for r in range(len(sala_order))] for t in range(len(time_order))], dtype=bool)
+
+    domain_tensor = class_prof_ok[:, :, None, None] & time_sala_ok[None, None, :, :] & class_sala_ok[:, None, None, :]
+
+    variable_domains = {}
+    for class_index in range(len(class_list)):
+        # np.nonzero walks (prof, time, room) in file order => same order as the old nested loops
+        # domain of possible assignments for each class: a list of valid combinations of (prof., time, room)
+        p_idx, t_idx, r_idx = np.nonzero(domain_tensor[class_index])
+        variable_domains[class_index] = [
+            (prof_order[p], time_order[t], sala_order[r])
+            for p, t, r in zip(p_idx.tolist(), t_idx.tolist(), r_idx.tolist())
+        ]
+
+    # define neighbors(another variables with whom the first one interacts ~ restr.) for each variable(class)
+    # two classes are neighbors if they share the group, a possible professor or a possible room
+    # (course before seminar only links classes of the same group, so it is already covered)
+    # => products of the class x group / class x prof / class x room incidence matrices
+    class_group = np.zeros((len(class_list), len(model.groups)), dtype=np.int32)
+    class_group[np.arange(len(class_list)), np.array(model.class_group, dtype=np.intp)] = 1
+    class_prof = domain_tensor.any(axis=(2, 3)).astype(np.int32)
+    class_sala = domain_tensor.any(axis=(1, 2)).astype(np.int32)
+
+    shares_constraint = (class_group @ class_group.T > 0) | (class_prof @ class_prof.T > 0) | (class_sala @ class_sala.T > 0)
+    np.fill_diagonal(shares_constraint, False)  # a class can t neighbour itself
+
+    Neighbors = {}  # Neighbors[Xi(class)] = indices of neighboring variables
+    for i in range(len(class_list)):
+        Neighbors[i] = set(np.flatnonzero(shares_constraint[i]).tolist()) # i is the index of  a class in class_list
 
 # neighbours aici arata astfel:
 # neighbours = {
@@ -152,12 +179,12 @@ for i in range(len(class_list)):
 # }
 
 # AC-3
-def is_consistent(xi, xj, Xi, Xj): # Xi Xj - variables (classes compared)
+def is_consistent(xi, xj, relation): # relation = model.relations[Xi][Xj] of the variables (classes compared)
     prof_i, time_i, room_i = xi # xi - specific assignments
     prof_j, time_j, room_j = xj # xj
 
     # Xi and Xj share the same group AND overlapping times => bad
-    if Xi['grupa'] == Xj['grupa']:
+    if relation & SAME_GROUP:
         if time_i == time_j:
             return False
 
@@ -171,55 +198,172 @@ def is_consistent(xi, xj, Xi, Xj): # Xi Xj - variables (classes compared)
         if time_i == time_j:
             return False
 
-    # course before seminar constraint
-    if Xi['materie'] == Xj['materie'] and Xi['grupa'] == Xj['grupa']:
-        if Xi['type'] == 'course' and Xj['type'] == 'seminar':
-            if time_i >= time_j:
-                return False
-        if Xi['type'] == 'seminar' and Xj['type'] == 'course':
-            if time_j >= time_i:
-                return False
+    # course before seminar constraint (same subject and group)
+    if relation & BEFORE:
+        if time_i >= time_j:
+            return False
+    if relation & AFTER:
+        if time_j >= time_i:
+            return False
 
     return True
 
-def remove_inconsistent_values(Xi, Xj, variable_domains):
+def remove_inconsistent_values(Xi, Xj, variable_domains, trail=None):
+    if PROPAGATOR == 'ac2001':
+        return remove_inconsistent_values_ac2001(Xi, Xj, variable_domains, trail)
+    removed = False
+    domain_xi = variable_domains[Xi]
+    domain_xj = variable_domains[Xj]
+    new_domain_xi = []
+    # what is_consistent() checks, with the class pair part looked up once per arc
+    relation = model.relations[Xi][Xj]
+    same_group, before, after = relation & SAME_GROUP, relation & BEFORE, relation & AFTER
+
+    for x in domain_xi:
+        prof_i, time_i, room_i = x
+        found = False
+        for prof_j, time_j, room_j in domain_xj:
+            if time_i == time_j and (same_group or prof_i == prof_j or room_i == room_j):
+                continue
+            if before and time_i >= time_j or after and time_j >= time_i:
+                continue
+            found = True # exista macar un y pt x care satisface constrangerile
+            break
+        if found:
+            new_domain_xi.append(x)
+        else:
+            removed = True
+    if removed:
+        if trail is not None:
+            trail.append((Xi, domain_xi))  # the old domain, restored on backtrack
+        variable_domains[Xi] = new_domain_xi
+    return removed
+
+# AC-2001 / AC-3.1
+# remember the last support found for every (Xi, x, Xj); on the next revision of the arc that support
+# is rechecked first (O(1)) and the domain of Xj is scanned only if it was removed in the meantime -
+# resuming right after the old support (the values before it were already rejected) and wrapping
+# around to the start, since a backtrack can give back values that were removed before
+last_support = {}  # last_support[(Xi, Xj)][x] = y
+value_rank = {}  # value_rank[Xi][value] = position of value in the initial domain of Xi (filled after preprocessing)
+
+def remove_inconsistent_values_ac2001(Xi, Xj, variable_domains, trail=None):
     removed = False
     domain_xi = variable_domains[Xi]
     domain_xj = variable_domains[Xj]
+    relation = model.relations[Xi][Xj]
+    supports = last_support.setdefault((Xi, Xj), {})
+    present = set(domain_xj)
     new_domain_xi = []
 
     for x in domain_xi:
+        y = supports.get(x)
+        if y in present:
+            new_domain_xi.append(x) # the last support is still valid
+            continue
+        start = 0
+        if y is not None:
+            # domain_xj keeps the order of the initial domain => first value after y
+            rank_xj = value_rank[Xj]
+            start = bisect_left(domain_xj, rank_xj[y], key=rank_xj.__getitem__)
         found = False
-        for y in domain_xj:
-            if is_consistent(x, y, class_list[Xi], class_list[Xj]):
-                found = True # exista macar un y pt x care satisface constrangerile
+        for pos in range(start - len(domain_xj), start):  # start .. end, then 0 .. start
+            if is_consistent(x, domain_xj[pos], relation):
+                supports[x] = domain_xj[pos]
+                found = True
                 break
         if found:
             new_domain_xi.append(x)
         else:
             removed = True
     if removed:
+        if trail is not None:
+            trail.append((Xi, domain_xi))
         variable_domains[Xi] = new_domain_xi
     return removed
 
-def AC3(variable_domains):
-    queue = []
-    for Xi in range(len(class_list)):
-        for Xj in Neighbors[Xi]:
-            queue.append((Xi, Xj))
+metrics = instrumentation.new_metrics(['AC3'])  # per job counters (see instrumentation.py, /metrics)
+
+@instrumentation.timed(metrics, 'AC3')
+def AC3(variable_domains, trail=None, assigned=None):
+    global wipeout_conflict
+    # assigned=None -> every arc is checked (plain AC-3)
+    # assigned=Xi -> MAC mode: the domains were arc consistent before Xi got its value, so only
+    #                the arcs (Xk, Xi) pointing at Xi can be broken; the rest is reached by propagation
+    if assigned is None:
+        queue = deque((Xi, Xj) for Xi in range(len(class_list)) for Xj in Neighbors[Xi])
+    else:
+        queue = deque((Xk, assigned) for Xk in Neighbors[assigned])
+    in_queue = set(queue)  # an arc is never queued twice
+    queue_metrics = metrics['queue']
+    queue_metrics['arcs_queued'] += len(queue)
     while queue:
-        (Xi, Xj) = queue.pop(0)
-        if remove_inconsistent_values(Xi, Xj, variable_domains):
+        (Xi, Xj) = queue.popleft()
+        in_queue.discard((Xi, Xj))
+        search_stats['revisions'] += 1
+        if remove_inconsistent_values(Xi, Xj, variable_domains, trail):
+            if BACKJUMPING and trail is not None:
+                # the values of Xi were lost because of whatever shrank the domain of Xj
+                conflict_trail.append((Xi, domain_conflicts[Xi]))
+                domain_conflicts[Xi] = domain_conflicts[Xi] | domain_conflicts[Xj]
             if len(variable_domains[Xi]) == 0:
+                if BACKJUMPING and trail is not None:
+                    wipeout_conflict = domain_conflicts[Xi]
                 return False  # a domain became empty, so we have a failure (no solution exists AT ALL)
             for Xk in Neighbors[Xi]:
-                if Xk != Xj:
+                if Xk != Xj and (Xk, Xi) not in in_queue:
                     queue.append((Xk, Xi)) # Xi la dreapta, verf. toti neighb cu el
+                    in_queue.add((Xk, Xi))
+                    queue_metrics['arcs_queued'] += 1
+            if len(queue) > queue_metrics['longest']:
+                queue_metrics['longest'] = len(queue)
     return True  # now all variables are arc consistent
 
+def cache_columns():
+    """
+    variable_domains_preAC3 (flattened (prof, time, room) triples), variable_domains (positions in the
+    domain before AC-3), Neighbors and the preprocessing result as problem_cache columns.
+    """
+    pre_domains = [[code for value in variable_domains_preAC3[Xi] for code in value] for Xi in range(len(class_list))]
+    positions = []
+    for Xi in range(len(class_list)):
+        position = {value: p for p, value in enumerate(variable_domains_preAC3[Xi])}
+        positions.append([position[value] for value in variable_domains[Xi]])
+    domain_offsets, domain_values = problem_cache.pack_lists(pre_domains)
+    reduced_offsets, reduced_positions = problem_cache.pack_lists(positions)
+    neighbor_offsets, neighbor_values = problem_cache.pack_lists(sorted(Neighbors[Xi]) for Xi in range(len(class_list)))
+    return {'domain_offsets': domain_offsets, 'domain_values': domain_values,
+            'reduced_offsets': reduced_offsets, 'reduced_positions': reduced_positions,
+            'neighbor_offsets': neighbor_offsets, 'neighbor_values': neighbor_values,
+            'preprocessing': [int(preprocessing_ok), preprocessing_revisions]}
+
+def read_cache_columns(cached):
+    pre_domains = {}
+    domains = {}
+    reduced = problem_cache.unpack_lists(cached['reduced_offsets'], cached['reduced_positions'])
+    for Xi, values in enumerate(problem_cache.unpack_lists(cached['domain_offsets'], cached['domain_values'])):
+        values = values.tolist()
+        pre_domains[Xi] = list(zip(values[0::3], values[1::3], values[2::3]))
+        domains[Xi] = [pre_domains[Xi][p] for p in reduced[Xi]]
+    neighbors = {Xi: set(ids.tolist()) for Xi, ids in
+                 enumerate(problem_cache.unpack_lists(cached['neighbor_offsets'], cached['neighbor_values']))}
+    ok, revisions = cached['preprocessing']
+    return pre_domains, domains, neighbors, bool(ok), revisions
+
 # apply AC-3 algorithm as preprocessing
-variable_domains_preAC3 = copy.deepcopy(variable_domains)  # Keep a copy for comparison
-if not AC3(variable_domains):
+# (on the bitset-encoded domains - same fixpoint as AC3(), without the O(|Di|*|Dj|) pair loops)
+if cached is None:
+    variable_domains_preAC3 = {Xi: list(domain) for Xi, domain in variable_domains.items()}  # Keep a copy for comparison
+    bitset_domains = BitsetDomains(model.relations, variable_domains, Neighbors)
+    preprocessing_ok = bitset_domains.ac3()
+    preprocessing_revisions = bitset_domains.revisions  # arcs revised by the preprocessing
+    bitset_domains.write_back(variable_domains)
+    if PROBLEM_CACHE:
+        problem_cache.save('ac3', cache_key, cache_columns())
+else:
+    variable_domains_preAC3, variable_domains, Neighbors, preprocessing_ok, preprocessing_revisions = read_cache_columns(cached)
+
+if not preprocessing_ok:
     print("No solution possible after AC-3 preprocessing.")
 else:
     print("Domains after AC-3 preprocessing:")
@@ -234,56 +378,145 @@ else:
         #     print(f"    Professor {prof_i}, Time {time_i}, Room {room_i}")
     print()
 
+# trail (undo log) of the domain changes made during the search: (Xi, previous domain of Xi)
+# variable_domains is shared by all the branches and mutated in place, on backtrack
+# we only undo what the branch changed instead of deep-copying every domain at every node
+domain_trail = []
+
+def undo_trail(variable_domains, trail, mark):
+    while len(trail) > mark:
+        Xi, old_domain = trail.pop()
+        variable_domains[Xi] = old_domain
+
+# conflict-directed backjumping (MAC-CBJ):
+# domain_conflicts[Xi] - the assigned variables responsible for the values missing from the domain of Xi
+# (an assigned variable explains its own domain; a revision of (Xi, Xj) passes the blame of Xj to Xi)
+# the conflict sets change together with the domains, so they get their own trail with the same marks
+domain_conflicts = {Xi: frozenset() for Xi in range(len(class_list))}
+conflict_trail = []
+wipeout_conflict = frozenset()  # conflict set of the domain wiped out by the last failed AC3()
+failure_conflict = set()  # conflict set of the last dead end, read by the caller to decide where to jump
+nogood_store = NogoodStore(NOGOOD_CAPACITY)
+search_stats = {'nodes': 0, 'backtracks': 0, 'backjumps': 0, 'revisions': 0}  # revisions - arcs AC3() revised
+should_stop = None  # optional callable, once it returns True the search gives up (search_aborted)
+search_aborted = False
+tie_breaker = None  # optional random.Random: MRV ties and the order of the values are random
+deepest_assignment = {}  # the largest assignment seen since the last reset (partial timetable on a timeout)
+
+def reset_search_state(keep_learned=False):
+    # after a failed or stopped search the domains and conflict sets are already back to the preprocessed ones
+    # (every branch undoes its trail), only the counters are cleared here
+    global search_stats, search_aborted, deepest_assignment
+    instrumentation.fold(metrics, search_stats)  # the counters of the run that ends here
+    search_stats = {'nodes': 0, 'backtracks': 0, 'backjumps': 0, 'revisions': 0}
+    search_aborted = False
+    deepest_assignment = {}
+    if not keep_learned:
+        nogood_store.clear()
+
+def undo_conflicts(mark):
+    while len(conflict_trail) > mark:
+        Xi, old_conflict = conflict_trail.pop()
+        domain_conflicts[Xi] = old_conflict
+
+for Xi in range(len(class_list)):
+    value_rank[Xi] = {value: pos for pos, value in enumerate(variable_domains[Xi])}
+
 # integrate AC-3 into backtracking
 def backtracking(assignment, variable_domains):
+    global failure_conflict, search_aborted, deepest_assignment
     if len(assignment) == len(class_list):
         return assignment
+    search_stats['nodes'] += 1
+    if len(assignment) > len(deepest_assignment):
+        deepest_assignment = dict(assignment)
+    if should_stop is not None and should_stop():
+        search_aborted = True
+        return None
 
     # select unassigned variable Xi (euristica MRV - domeniul cel mai restrans)
     unassigned_vars = [Xi for Xi in range(len(class_list)) if Xi not in assignment]
-    Xi = min(unassigned_vars, key=lambda var: len(variable_domains[var]))
+    if tie_breaker is None:
+        Xi = min(unassigned_vars, key=lambda var: len(variable_domains[var]))
+    else:
+        Xi = min(unassigned_vars, key=lambda var: (len(variable_domains[var]), tie_breaker.random()))
 
+    # the values already pruned from Xi are blamed on the same variables as Xi's domain
+    conflict = set(domain_conflicts[Xi])
     domain_Xi = variable_domains[Xi] # lista de assignmenturi de tip (prof1, time1, sala1), (...)
+    if tie_breaker is not None:
+        domain_Xi = tie_breaker.sample(domain_Xi, len(domain_Xi))
+    if SYMMETRY_BREAKING:
+        # one value per class of interchangeable rooms / professors without a class yet (see symmetry.py)
+        used_profs = {prof for prof, _, _ in assignment.values()}
+        busy_rooms = {(room, time_index) for _, time_index, room in assignment.values()}
+        domain_Xi = symmetry.representatives(domain_Xi, room_class, teacher_class, used_profs.__contains__,
+                                             lambda room, time_index: (room, time_index) not in busy_rooms)
     for value in domain_Xi: # un assignment specific (profX, timeX, salaX)
-        # create copy of (original)variable_domains 
-        new_variable_domains = copy.deepcopy(variable_domains)
+        if BACKJUMPING:
+            nogood = nogood_store.find(assignment, Xi, value)
+            if nogood is not None:
+                conflict.update(Xk for Xk, _ in nogood if Xk != Xi)
+                continue
         # changes made to domain during one branch must not affect the others
+        # => everything after mark is undone before trying the next value
+        mark = len(domain_trail)
+        conflict_mark = len(conflict_trail)
 
         assignment[Xi] = value # pt. class Xi lucram cu UN (prof, time, sala)
         # reduce the domain of Xi to [value] - no need to consider other values for this branch of recrs
-        new_variable_domains[Xi] = [value]
-
-        # apply AC-3
-        if AC3(new_variable_domains):
-            result = backtracking(assignment, new_variable_domains)
+        domain_trail.append((Xi, variable_domains[Xi]))
+        variable_domains[Xi] = [value]
+        if BACKJUMPING:
+            conflict_trail.append((Xi, domain_conflicts[Xi]))
+            domain_conflicts[Xi] = frozenset((Xi,))
+
+        if MAINTAIN_ARC_CONSISTENCY:
+            # apply AC-3 (MAC - propagate only from the variable we just assigned)
+            consistent = AC3(variable_domains, domain_trail, Xi)
+            culprits = wipeout_conflict
+        else:
+            culprits = {Xk for Xk in Neighbors[Xi] if Xk in assignment
+                        and not is_consistent(value, assignment[Xk], model.relations[Xi][Xk])}
+            consistent = not culprits
+        if consistent:
+            result = backtracking(assignment, variable_domains)
             if result is not None:
                 return result
-        # remove assignment
+            if search_aborted:
+                undo_trail(variable_domains, domain_trail, mark)
+                undo_conflicts(conflict_mark)
+                del assignment[Xi]
+                return None  # stopped from outside, nothing was proven - just unwind
+            search_stats['backtracks'] += 1
+            if BACKJUMPING and Xi not in failure_conflict:
+                # Xi is not to blame for the dead end below => no other value of Xi can fix it, jump over Xi
+                search_stats['backjumps'] += 1
+                undo_trail(variable_domains, domain_trail, mark)
+                undo_conflicts(conflict_mark)
+                del assignment[Xi]
+                return None
+            conflict |= failure_conflict
+        elif BACKJUMPING:
+            conflict |= culprits
+        # remove assignment and roll back the domains
+        undo_trail(variable_domains, domain_trail, mark)
+        undo_conflicts(conflict_mark)
         del assignment[Xi]
 
+    if BACKJUMPING:
+        conflict.discard(Xi)
+        nogood_store.add((Xk, assignment[Xk]) for Xk in conflict)
+        failure_conflict = conflict
     return None  # failure
 
-# solve the CSP using backtracking with AC-3
-assignment = {}
-solution = backtracking(assignment, variable_domains)
-
-if solution is None:
-    print("No solution found.")
-else:
-    print("Solution found:")
-    for Xi in range(len(class_list)):
-        cls = class_list[Xi]
-        value = solution[Xi]
-        prof_i, time_i, room_i = value
-        print(f"Class {Xi}: {cls['type']} of subject {cls['materie']} for group {cls['grupa']}")
-        print(f"  Assigned to Professor {prof_i}, Time {time_i}, Room {room_i}")
-    print()
-
 ### FORMATTING
 # modifying the output section to store solution in the same format as main.py
 def format_solution(solution, class_list):
     formatted_timetable = {}
     for Xi in range(len(class_list)):
+        if Xi not in solution:
+            continue  # partial timetable (search stopped by a budget)
         cls = class_list[Xi]
         value = solution[Xi]
         prof_i, time_i, room_i = value
@@ -328,23 +561,96 @@ def transform_data(bestTimeTable, profesor_codes, time_codes, sala_codes, materi
             timetable_data[grupa][zi] = sorted(timetable_data[grupa][zi], key=lambda x: x["Interval"])
 
     return timetable_data
-# replace existing output code with:
-if solution:
+
+def scheduling_job():
+    """
+    Runs in a job_service worker: solves the CSP with backtracking + AC-3 (under SEARCH_TIME_BUDGET /
+    SEARCH_NODE_BUDGET / RESTART_SCHEDULE), then LOCAL_SEARCH. Returns (result, snapshot to publish or None).
+    """
+    global bestTimeTable, bestTimeTableScore
+    instrumentation.reset(metrics, search_stats)
+    job_service.watch(lambda: {'placed': len(deepest_assignment), 'total': len(class_list), 'nodes': search_stats['nodes'],
+                               'metrics': instrumentation.sample(metrics, search_stats)})
+    result = search_control.solve_ac3(sys.modules[__name__], node_budget=SEARCH_NODE_BUDGET, time_budget=SEARCH_TIME_BUDGET,
+                                      restarts=RESTART_SCHEDULE, restart_base=RESTART_BASE)
+    solution = result['assignment']  # the deepest partial assignment if a budget ran out
+    penalty_model = local_search.ac3_model(sys.modules[__name__])
+    if result['status'] == 'solved' and LOCAL_SEARCH:
+        improved = local_search.improve(penalty_model, solution,
+                                        method=LOCAL_SEARCH, time_budget=LOCAL_SEARCH_TIME_BUDGET)
+        print(f"Local search ({LOCAL_SEARCH}): penalty {improved['initial_penalty']} -> {improved['penalty']} "
+              f"after {improved['iterations']} iterations ({improved['elapsed']:.1f} s).")
+        solution = improved['assignment']
+
+    if solution is None:
+        print("No solution found.")
+        return result['status'], None
+    # penalty of the published solution, with or without the local search
+    bestTimeTableScore = sum(penalty_model['penalty'](Xi, value) for Xi, value in solution.items())
+    if result['status'] == 'timeout':
+        print(f"Search stopped by its budget after {result['nodes']} nodes ({result['elapsed']:.1f} s): "
+              f"partial solution with {result['placed']} of {result['total']} classes.")
+    print("Solution found:")
+    for Xi in range(len(class_list)):
+        if Xi not in solution:
+            continue
+        cls = class_list[Xi]
+        value = solution[Xi]
+        prof_i, time_i, room_i = value
+        print(f"Class {Xi}: {cls['type']} of subject {cls['materie']} for group {cls['grupa']}")
+        print(f"  Assigned to Professor {prof_i}, Time {time_i}, Room {room_i}")
+    print()
+
     formatted_timetable = format_solution(solution, class_list)
+    bestTimeTable = formatted_timetable
     timetable_data = transform_data(formatted_timetable, profesor_codes, time_codes, sala_codes, materie_codes, group_codes)
-    
-    @app.route('/')
-    def index():
-        groups = timetable_data.keys()
-        return render_template('index.html', groups=groups)
-
-    @app.route('/timetable/<int:group>')
-    def timetable(group):
-        if group not in timetable_data:
-            return "Orarul pentru această grupă nu este disponibil.", 404
-        data = timetable_data[group]
-        return render_template('timetable.html', group=group, timetable_data=data)
-
-    app.run(debug=True)
-else:
-    print("No solution found")
\ No newline at end of file
+    pages = {'index': ('index.html', {'groups': timetable_data.keys()})}
+    for group, data in timetable_data.items():
+        pages[group] = ('timetable.html', {'group': group, 'timetable_data': data})
+    snapshot = {
+        'solution': solution,
+        'score': bestTimeTableScore,
+        'timetable_data': timetable_data,
+        'pages': page_cache.prerender(app, pages),  # rendered once here, not by every request
+    }
+    return result['status'], snapshot
+
+service = None  # job_service.JobService of the running app (started in __main__)
+
+def published_snapshot():
+    # the last published solution (see scheduling_job), None until the job publishes one
+    return service.snapshot if service is not None else None
+
+@app.route('/')
+def index():
+    snapshot = published_snapshot()
+    if snapshot is None:
+        return render_template('index.html', groups=[])
+    return page_cache.cached_response(snapshot['pages']['index'])
+
+@app.route('/timetable/<int:group>')
+def timetable(group):
+    snapshot = published_snapshot()
+    if snapshot is None or group not in snapshot['pages']:
+        return "Orarul pentru această grupă nu este disponibil.", 404
+    return page_cache.cached_response(snapshot['pages'][group])
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = service.status(job_id) if service is not None else None
+    if job is None:
+        return jsonify(error='unknown job'), 404
+    return jsonify(job)
+
+@app.route('/metrics')
+def metrics_route():
+    # Prometheus scrape target: the search counters of the jobs (see instrumentation.py)
+    records, snapshot_version = (service.records(), service.snapshot_version) if service is not None else ([], 0)
+    return Response(instrumentation.prometheus_text('ac3', records, snapshot_version),
+                    mimetype='text/plain; version=0.0.4')
+
+if __name__ == '__main__':
+    # solve in the background - the server starts right away and serves the solution once it is published
+    service = job_service.JobService(workers=1, max_pending=1)
+    service.submit(scheduling_job, description='initial timetable')
+    app.run(debug=True, use_reloader=False)  # the reloader would start a second solve in its own process
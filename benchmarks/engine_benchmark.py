@@ -0,0 +1,92 @@
+"""
+Compares the native backtracking of eng_main.py / ac3.py with the external solvers of mip_backend.py
+(OR-Tools CP-SAT, CBC through PuLP) on the same model: result, search nodes (branches for CP-SAT)
+and wall time, the model build included for the external solvers.
+
+Every run happens in its own process and is stopped after --timeout seconds. Backends that are not
+installed are listed as such.
+
+usage: python benchmarks/engine_benchmark.py [--timeout 60]
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import mip_backend
+from ordering_benchmark import SCENARIOS
+
+# (solver, engine): 'backtracking' runs the solver's own search (eng_main with MRV + forward checking,
+# ac3 with MAC), the other engines are mip_backend backends
+ENGINES = [
+    ('eng_main', 'backtracking'),
+    ('eng_main', 'cpsat'),
+    ('eng_main', 'cbc'),
+    ('ac3', 'backtracking'),
+    ('ac3', 'cpsat'),
+    ('ac3', 'cbc'),
+]
+
+
+def run_engine(solver_name, engine, restrictions, results):
+    os.chdir(REPO_DIR)  # the solvers load ./data and ./eng_data
+    import search_control
+
+    if solver_name == 'eng_main':
+        import eng_main
+        if restrictions is not None:
+            eng_main.extra_restrictions = restrictions
+        eng_main.compile_candidate_tables()
+        eng_main.VARIABLE_ORDERING = 'mrv'
+        start = time.perf_counter()
+        if engine == 'backtracking':
+            result = search_control.solve_eng_main(eng_main)
+        else:
+            result = mip_backend.solve_eng_main(eng_main, engine)
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):  # ac3 prints its preprocessed domains on import
+            import ac3
+        start = time.perf_counter()
+        if engine == 'backtracking':
+            result = search_control.solve_ac3(ac3)
+        else:
+            result = mip_backend.solve_ac3(ac3, engine)
+    results.put((result['status'], result['nodes'], time.perf_counter() - start))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--timeout', type=float, default=60, help='seconds allowed for each run')
+    args = parser.parse_args()
+
+    installed = set(mip_backend.available_backends())
+    print(f"{'solver':<9} {'scenario':<22} {'engine':<13} {'result':<14} {'nodes':>9} {'time (s)':>9}")
+    for solver_name, engine in ENGINES:
+        # ac3.py reads its own data/ directory, the eng_data scenarios only apply to eng_main
+        scenarios = SCENARIOS if solver_name == 'eng_main' else {'data': None}
+        for scenario, restrictions in scenarios.items():
+            if engine != 'backtracking' and engine not in installed:
+                row = ('not installed', '-', '-')
+            else:
+                results = multiprocessing.Queue()
+                process = multiprocessing.Process(target=run_engine, args=(solver_name, engine, restrictions, results))
+                process.start()
+                process.join(args.timeout)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+                    row = ('timeout', '-', f'>{args.timeout:g}')
+                else:
+                    status, nodes, elapsed = results.get()
+                    row = (status, nodes, f'{elapsed:.2f}')
+            print(f"{solver_name:<9} {scenario:<22} {engine:<13} {row[0]:<14} {row[1]:>9} {row[2]:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+Random timetabling instances for scaling benchmarks, written in the eng_data/ schema that eng_main.py
+reads and, converted, in the data/ schema (Romanian keys) that ac3.py reads:
+
+    OUTPUT/eng_data/{groups,subjects,teachers,rooms,time_slots,extra_restrictions}.json
+    OUTPUT/data/{grupe,materii,profesori,sali,timp,extraRestrictions}.json
+
+so a solver started in OUTPUT (both read their files relative to the working directory) schedules it.
+
+Groups follow eng_data: EVERYONE (code 0), main groups A, B, ... (codes 1-9, a one letter name is what makes
+a main group) and their subgroups A1, A2, ... (codes 101, 102, ...). data/ has no EVERYONE group.
+
+tightness (0 - 1) scales how scarce the resources are: 0 => every room is free at every timeslot, teachers
+get twice the hours they are expected to teach and there are no extra restrictions; 1 => rooms are free
+at half of the timeslots, teachers get just the hours they are expected to teach, and a third of them
+have unpreferred timeslots / daily limits. Tight instances can be infeasible.
+
+usage: python benchmarks/instance_generator.py OUTPUT [--main-groups 3] [--subgroups 4] [--subjects 6]
+       [--optional-subjects 2] [--teachers 20] [--rooms 12] [--course-rooms 4] [--days 5]
+       [--slots-per-day 6] [--tightness 0.5] [--seed 1]
+"""
+import argparse
+import json
+import math
+import os
+import random
+
+DAYS = [("Monday", "luni"), ("Tuesday", "marti"), ("Wednesday", "miercuri"), ("Thursday", "joi"), ("Friday", "vineri")]
+FIRST_HOUR = 8  # first timeslot of the day, every timeslot is 2 hours
+MAIN_GROUP_NAMES = "ABCDEFGHI"  # main group codes are 1-9: eng_main finds subgroups by the code prefix
+COURSE_TEACHER_SHARE = 0.4  # teachers that can teach courses
+SUBJECTS_PER_TEACHER = (1, 3)
+
+
+def generate(main_groups=3, subgroups=4, subjects=6, optional_subjects=2, teachers=20, rooms=12, course_rooms=None,
+             days=5, slots_per_day=6, tightness=0.5, seed=None):
+    """
+    An instance in the eng_data schema: {'groups', 'subjects', 'teachers', 'rooms', 'time_slots', 'extra_restrictions'}.
+    """
+    if not 1 <= main_groups <= len(MAIN_GROUP_NAMES):
+        raise ValueError(f"main_groups must be between 1 and {len(MAIN_GROUP_NAMES)}")
+    if not 1 <= subgroups <= 99:
+        raise ValueError("subgroups must be between 1 and 99")
+    if not 1 <= days <= len(DAYS) or not 1 <= slots_per_day <= 7:
+        raise ValueError(f"at most {len(DAYS)} days of 7 timeslots")
+    if teachers < 2 or rooms < 2:
+        raise ValueError("at least 2 teachers and 2 rooms")
+    rng = random.Random(seed)
+    course_rooms = max(1, rooms // 3) if course_rooms is None else course_rooms
+
+    letters = MAIN_GROUP_NAMES[:main_groups]
+    groups = [{"name": letters if main_groups > 1 else "ALL", "language": "Romanian", "code": 0}]
+    groups += [{"name": letter, "language": "Romanian", "code": code} for code, letter in enumerate(letters, 1)]
+    for code, letter in enumerate(letters, 1):
+        groups += [{"name": f"{letter}{index}", "language": "Romanian", "code": code * 100 + index}
+                   for index in range(1, subgroups + 1)]
+
+    subject_list = [{"name": f"Subject {code}", "code": code, "is_optional": int(code > subjects)}
+                    for code in range(1, subjects + optional_subjects + 1)]
+
+    time_slots = [{"day": DAYS[day][0], "hour": f"{FIRST_HOUR + 2 * slot:02d}:00", "code": day * slots_per_day + slot + 1}
+                  for day in range(days) for slot in range(slots_per_day)]
+    slot_codes = [time['code'] for time in time_slots]
+
+    # a room is free at a random (1 - tightness / 2) share of the timeslots
+    free_slots = max(1, round(len(slot_codes) * (1 - tightness / 2)))
+    room_list = []
+    for code in range(1, rooms + 1):
+        course_possible = int(code <= course_rooms)
+        room_list.append({
+            "name": f"{'C' if course_possible else 'S'}{code}",
+            "possible_times": sorted(rng.sample(slot_codes, free_slots)),
+            "course_possible": course_possible,
+            "code": code,
+        })
+
+    # every subject gets a teacher that can teach its course and one more teacher, then the remaining
+    # teachers pick random subjects
+    teacher_list = [{"code": code, "name": f"Teacher {code}", "subjects_taught": [], "max_hours": 0,
+                     "can_teach_course": index < max(1, round(teachers * COURSE_TEACHER_SHARE))}
+                    for index, code in enumerate(range(1, teachers + 1))]
+    course_teachers = [teacher for teacher in teacher_list if teacher['can_teach_course']]
+    for subject in subject_list:
+        first = rng.choice(course_teachers)
+        second = rng.choice([teacher for teacher in teacher_list if teacher is not first])
+        for teacher in (first, second):
+            teacher['subjects_taught'].append(subject['code'])
+    for teacher in teacher_list:
+        wanted = rng.randint(*SUBJECTS_PER_TEACHER)
+        others = [subject['code'] for subject in subject_list if subject['code'] not in teacher['subjects_taught']]
+        missing = max(0, wanted - len(teacher['subjects_taught']))
+        teacher['subjects_taught'] += rng.sample(others, min(missing, len(others)))
+        teacher['subjects_taught'].sort()
+
+    # weekly hours: the classes of each subject shared evenly among the teachers who can teach them
+    # (the same class counts as eng_main.py builds them), times 2 - tightness
+    load = {teacher['code']: 0.0 for teacher in teacher_list}
+    for subject in subject_list:
+        if subject['is_optional']:
+            courses, seminars = 1, main_groups
+        else:
+            courses, seminars = main_groups, main_groups * subgroups
+        taught_by = [teacher for teacher in teacher_list if subject['code'] in teacher['subjects_taught']]
+        course_by = [teacher for teacher in taught_by if teacher['can_teach_course']]
+        for teacher in course_by:
+            load[teacher['code']] += courses / len(course_by)
+        for teacher in taught_by:
+            load[teacher['code']] += seminars / len(taught_by)
+    for teacher in teacher_list:
+        teacher['max_hours'] = max(1, math.ceil(load[teacher['code']] * (2 - tightness)))
+
+    # extra restrictions for a (tightness / 3) share of the teachers
+    restricted = rng.sample(teacher_list, round(len(teacher_list) * tightness / 3))
+    unpreferred_timeslots = {}
+    max_daily_hours = {}
+    for teacher in restricted[:len(restricted) // 2]:
+        unpreferred_timeslots[str(teacher['code'])] = sorted(rng.sample(slot_codes, round(len(slot_codes) * tightness / 3)))
+    for teacher in restricted[len(restricted) // 2:]:
+        max_daily_hours[str(teacher['code'])] = max(1, math.ceil(teacher['max_hours'] / days))
+
+    return {
+        'groups': groups,
+        'subjects': subject_list,
+        'teachers': teacher_list,
+        'rooms': room_list,
+        'time_slots': time_slots,
+        'extra_restrictions': {"unpreferred_timeslots": unpreferred_timeslots, "max_daily_hours": max_daily_hours},
+    }
+
+
+def ac3_data(instance):
+    """
+    The same instance in the data/ schema of ac3.py (unpreferred timeslots become preferred intervals, tip 2).
+    """
+    day_names = dict(DAYS)
+    slot_codes = [time['code'] for time in instance['time_slots']]
+    unpreferred_timeslots = instance['extra_restrictions']['unpreferred_timeslots']
+    extra = [{"tip": 1, "restrangeOrar": True}]
+    for teacher_code, slots in unpreferred_timeslots.items():
+        extra.append({"tip": 2, "profId": int(teacher_code),
+                      "intervalTimpPreferat": [code for code in slot_codes if code not in slots]})
+    extra += [{"tip": 4, "respectaNrMaxOreProf": True}, {"tip": 5, "respectaIntervaleSala": True}]
+    return {
+        'grupe': [{"nume": group['name'], "limba": "romana" if group['language'] == "Romanian" else "engleza",
+                   "cod": group['code']} for group in instance['groups'] if group['code'] != 0],
+        'materii': [{"nume": subject['name'], "cod": subject['code'], "este_optionala": subject['is_optional']}
+                    for subject in instance['subjects']],
+        'profesori': [{"cod": teacher['code'], "numeProfesor": teacher['name'], "materiiPredate": teacher['subjects_taught'],
+                       "nrMaximOre": teacher['max_hours'], "poatePredaCurs": teacher['can_teach_course']}
+                      for teacher in instance['teachers']],
+        'sali': [{"nume": room['name'], "timp_posibil": room['possible_times'], "curs_posibil": room['course_possible'],
+                  "cod": room['code']} for room in instance['rooms']],
+        'timp': [{"zi": day_names[time['day']], "ora": time['hour'], "cod": time['code']} for time in instance['time_slots']],
+        'extraRestrictions': {"extraRestricitions": extra},
+    }
+
+
+def write_instance(instance, directory):
+    """
+    Writes OUTPUT/eng_data/ and OUTPUT/data/ (see the module docstring).
+    """
+    for subdirectory, files in (('eng_data', instance), ('data', ac3_data(instance))):
+        os.makedirs(os.path.join(directory, subdirectory), exist_ok=True)
+        for name, content in files.items():
+            with open(os.path.join(directory, subdirectory, f'{name}.json'), 'w') as file:
+                json.dump(content, file, indent=4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output', help='directory of the instance')
+    parser.add_argument('--main-groups', type=int, default=3)
+    parser.add_argument('--subgroups', type=int, default=4, help='subgroups of every main group')
+    parser.add_argument('--subjects', type=int, default=6, help='mandatory subjects')
+    parser.add_argument('--optional-subjects', type=int, default=2)
+    parser.add_argument('--teachers', type=int, default=20)
+    parser.add_argument('--rooms', type=int, default=12)
+    parser.add_argument('--course-rooms', type=int, default=None, help='rooms where courses can be held (default: a third)')
+    parser.add_argument('--days', type=int, default=5)
+    parser.add_argument('--slots-per-day', type=int, default=6)
+    parser.add_argument('--tightness', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    instance = generate(args.main_groups, args.subgroups, args.subjects, args.optional_subjects, args.teachers,
+                        args.rooms, args.course_rooms, args.days, args.slots_per_day, args.tightness, args.seed)
+    write_instance(instance, args.output)
+    print(f"instance written to {args.output}/eng_data and {args.output}/data")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Compares the variable / value ordering heuristics of eng_main.py (VARIABLE_ORDERING, VALUE_ORDERING),
+with and without FORWARD_CHECKING and BACKJUMPING, against the static order: search nodes,
+backtracks, backjumps and wall time for each configuration.
+
+Every run happens in its own process and is stopped after --timeout seconds, since the static
+order can thrash for a very long time once a few unpreferred timeslots are added.
+
+usage: python benchmarks/ordering_benchmark.py [--timeout 30]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIGURATIONS = [
+    ('static', 'static', False, False),  # plain chronological backtracking
+    ('static', 'static', True, False),
+    ('static', 'static', True, True),
+    ('static', 'lcv', True, False),
+    ('mrv', 'static', False, False),
+    ('mrv', 'static', True, False),
+    ('mrv', 'static', True, True),
+    ('mrv', 'lcv', True, False),
+    ('domwdeg', 'static', False, False),
+    ('domwdeg', 'static', True, False),
+    ('domwdeg', 'static', True, True),
+    ('domwdeg', 'lcv', True, False),
+]
+
+# extra_restrictions scenarios on top of eng_data/
+SCENARIOS = {
+    'eng_data': None,  # the restrictions from eng_data/extra_restrictions.json
+    'unpreferred_mornings': {
+        "unpreferred_timeslots": {str(code): [1, 2, 3, 4, 5, 6] for code in (5, 7, 13, 23)},
+        "max_daily_hours": {},
+    },
+    'tight_daily_hours': {
+        "unpreferred_timeslots": {},
+        "max_daily_hours": {str(code): 1 for code in (2, 3, 13, 23)},
+    },
+}
+
+
+def run_configuration(restrictions, variable_ordering, value_ordering, forward_checking, backjumping, results):
+    os.chdir(REPO_DIR)  # eng_main loads ./eng_data
+    sys.path.insert(0, REPO_DIR)
+    import eng_main
+
+    if restrictions is not None:
+        eng_main.extra_restrictions = restrictions
+    eng_main.compile_candidate_tables()
+    eng_main.VARIABLE_ORDERING = variable_ordering
+    eng_main.VALUE_ORDERING = value_ordering
+    eng_main.FORWARD_CHECKING = forward_checking
+    eng_main.BACKJUMPING = backjumping
+    eng_main.reset_search_state()
+
+    start = time.perf_counter()
+    solved = eng_main.backtracking(0) == 1
+    results.put((solved, dict(eng_main.search_stats), time.perf_counter() - start))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--timeout', type=float, default=30, help='seconds allowed for each run')
+    args = parser.parse_args()
+
+    print(f"{'scenario':<22} {'variables':<9} {'values':<7} {'fc':<3} {'cbj':<3} {'result':<8} {'nodes':>9} {'backtracks':>10} {'backjumps':>9} {'time (s)':>9}")
+    for scenario, restrictions in SCENARIOS.items():
+        for variable_ordering, value_ordering, forward_checking, backjumping in CONFIGURATIONS:
+            results = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=run_configuration,
+                args=(restrictions, variable_ordering, value_ordering, forward_checking, backjumping, results),
+            )
+            process.start()
+            process.join(args.timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+                row = ('timeout', '-', '-', '-', f'>{args.timeout:g}')
+            else:
+                solved, stats, elapsed = results.get()
+                row = ('solved' if solved else 'no sol.', stats['nodes'], stats['backtracks'], stats['backjumps'], f'{elapsed:.2f}')
+            fc = 'on' if forward_checking else 'off'
+            cbj = 'on' if backjumping else 'off'
+            print(f"{scenario:<22} {variable_ordering:<9} {value_ordering:<7} {fc:<3} {cbj:<3} {row[0]:<8} {row[1]:>9} {row[2]:>10} {row[3]:>9} {row[4]:>9}")
+
+
+if __name__ == '__main__':
+    main()
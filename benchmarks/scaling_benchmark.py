@@ -0,0 +1,153 @@
+"""
+How the solvers scale: generates instances of growing size and tightness (instance_generator.py), runs
+eng_main.py's backtracking and ac3.py's MAC search on each one and records, per run,
+    status, placed / total classes, load time (reading + compiling / AC-3 preprocessing), solve time,
+    nodes, backtracks, backjumps, AC-3 revisions (ac3: preprocessing and search) and peak memory (max RSS).
+
+The results go to OUTPUT/scaling-<date>-<time>.json (the runs and the settings / commit they were measured
+with) and .csv, so two benchmark runs can be diffed to spot regressions.
+
+Every run happens in its own fresh (spawned) process - the peak memory is that process' - and the search
+gets --timeout seconds (status 'timeout'); a run still busy after three times that is killed ('killed').
+
+usage: python benchmarks/scaling_benchmark.py [--sizes small medium] [--tightness 0.2 0.6] [--seeds 1]
+       [--solvers eng_main ac3] [--variable-ordering static] [--timeout 60] [--output benchmarks/results]
+"""
+import argparse
+import contextlib
+import csv
+import datetime
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from instance_generator import generate, write_instance
+
+# instance_generator.generate() arguments of each size
+SIZES = {
+    'tiny': dict(main_groups=2, subgroups=2, subjects=3, optional_subjects=1, teachers=8, rooms=6, days=5, slots_per_day=4),
+    'small': dict(main_groups=3, subgroups=3, subjects=4, optional_subjects=2, teachers=14, rooms=8, days=5, slots_per_day=5),
+    'medium': dict(main_groups=3, subgroups=5, subjects=6, optional_subjects=3, teachers=24, rooms=14, days=5, slots_per_day=6),
+    'large': dict(main_groups=5, subgroups=6, subjects=8, optional_subjects=4, teachers=40, rooms=24, days=5, slots_per_day=6),
+    'xlarge': dict(main_groups=8, subgroups=8, subjects=10, optional_subjects=5, teachers=70, rooms=40, days=5, slots_per_day=7),
+}
+FIELDS = ['solver', 'size', 'tightness', 'seed', 'classes', 'status', 'placed', 'total', 'load_time', 'solve_time',
+          'nodes', 'backtracks', 'backjumps', 'revisions', 'peak_rss_kb']
+
+
+def run_solver(solver_name, directory, variable_ordering, timeout, results):
+    os.chdir(directory)  # the solvers read ./eng_data and ./data
+    sys.path.insert(0, REPO_DIR)
+    import search_control
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # ac3 prints its preprocessed domains on import
+        solver = importlib.import_module(solver_name)
+    load_time = time.perf_counter() - start
+    if solver_name == 'eng_main':
+        if variable_ordering is not None:
+            solver.VARIABLE_ORDERING = variable_ordering
+        result = search_control.solve_eng_main(solver, time_budget=timeout)
+        revisions = None  # forward checking, no AC-3
+    else:
+        preprocessing_revisions = solver.preprocessing_revisions
+        if solver.preprocessing_ok:
+            result = search_control.solve_ac3(solver, time_budget=timeout)
+        else:
+            result = {'status': 'infeasible', 'placed': 0, 'total': len(solver.class_list), 'nodes': 0, 'elapsed': 0.0}
+        revisions = preprocessing_revisions + solver.search_stats['revisions']
+    results.put({
+        'classes': len(solver.class_list),
+        'status': result['status'],
+        'placed': result['placed'],
+        'total': result['total'],
+        'load_time': round(load_time, 4),
+        'solve_time': round(result['elapsed'], 4),
+        'nodes': result['nodes'],
+        'backtracks': solver.search_stats['backtracks'],
+        'backjumps': solver.search_stats['backjumps'],
+        'revisions': revisions,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,  # kilobytes on Linux
+    })
+
+
+def measure(context, solver_name, directory, variable_ordering, timeout):
+    results = context.Queue()
+    process = context.Process(target=run_solver, args=(solver_name, directory, variable_ordering, timeout, results))
+    process.start()
+    process.join(3 * timeout)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+        return {'status': 'killed'}
+    if process.exitcode != 0:
+        return {'status': 'error'}
+    return results.get()
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', default=['tiny', 'small', 'medium'], choices=list(SIZES))
+    parser.add_argument('--tightness', nargs='+', type=float, default=[0.2, 0.6])
+    parser.add_argument('--seeds', nargs='+', type=int, default=[1])
+    parser.add_argument('--solvers', nargs='+', default=['eng_main', 'ac3'], choices=['eng_main', 'ac3'])
+    parser.add_argument('--variable-ordering', default=None, choices=['static', 'mrv', 'domwdeg'],
+                        help="eng_main's VARIABLE_ORDERING (default: the module's)")
+    parser.add_argument('--timeout', type=float, default=60, help='search seconds allowed for each run')
+    parser.add_argument('--output', default=os.path.join(REPO_DIR, 'benchmarks', 'results'))
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')  # a fresh process per run => its own peak memory
+    runs = []
+    print(f"{'solver':<9} {'size':<7} {'tight':>5} {'seed':>4} {'classes':>7} {'result':<10} {'nodes':>9} "
+          f"{'backtracks':>10} {'revisions':>10} {'load (s)':>8} {'solve (s)':>9} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as instances:
+        for size in args.sizes:
+            for tightness in args.tightness:
+                for seed in args.seeds:
+                    directory = os.path.join(instances, f'{size}-{tightness:g}-{seed}')
+                    write_instance(generate(**SIZES[size], tightness=tightness, seed=seed), directory)
+                    for solver_name in args.solvers:
+                        run = {'solver': solver_name, 'size': size, 'tightness': tightness, 'seed': seed}
+                        run.update(measure(context, solver_name, directory, args.variable_ordering, args.timeout))
+                        runs.append(run)
+                        peak = '-' if 'peak_rss_kb' not in run else f"{run['peak_rss_kb'] / 1024:.1f}"
+                        print(f"{solver_name:<9} {size:<7} {tightness:>5g} {seed:>4} {run.get('classes', '-'):>7} "
+                              f"{run['status']:<10} {run.get('nodes', '-'):>9} {run.get('backtracks', '-'):>10} "
+                              f"{str(run.get('revisions', '-')):>10} {run.get('load_time', '-'):>8} "
+                              f"{run.get('solve_time', '-'):>9} {peak:>8}")
+
+    os.makedirs(args.output, exist_ok=True)
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(args.output, f'scaling-{stamp}')
+    settings = {key: value for key, value in vars(args).items() if key != 'output'}
+    with open(f'{path}.json', 'w') as file:
+        json.dump({'commit': git_commit(), 'date': stamp, 'python': platform.python_version(),
+                   'settings': settings, 'sizes': {size: SIZES[size] for size in args.sizes}, 'runs': runs}, file, indent=4)
+    with open(f'{path}.csv', 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(runs)
+    print(f"results written to {path}.json and {path}.csv")
+
+
+if __name__ == '__main__':
+    main()
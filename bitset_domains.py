@@ -0,0 +1,183 @@
+"""
+Bitset-encoded domains for the AC-3 solver (ac3.py).
+
+Every (profesor, timp, sala) triple gets a fixed bit position, so the domain of a
+class is a single Python int and revising an arc is a handful of AND/OR operations
+over precomputed support masks instead of a loop over pairs of tuples.
+"""
+from collections import deque
+
+import problem_model
+
+# how two classes Xi, Xj are related (decides which masks support a value of Xi)
+DIFFERENT_GROUP = 0  # only prof/room clashes at the same time matter
+SAME_GROUP = 1  # same group => never at the same time
+COURSE_BEFORE_SEMINAR = 2  # Xi is the course, Xj the seminar (same materie & grupa)
+SEMINAR_AFTER_COURSE = 3  # Xi is the seminar, Xj the course
+
+
+def iter_bits(mask):
+    """
+    Yields the positions of the set bits of mask (lowest first).
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class BitsetDomains:
+    """
+    Domains of all classes as bitmasks over a fixed (prof, time, room) index.
+    bit = (prof_pos * len(times) + time_pos) * len(rooms) + room_pos
+    """
+
+    def __init__(self, relations, variable_domains, neighbors):
+        """
+        relations - problem_model relations[Xi][Xj] of the classes (SAME_GROUP / BEFORE / AFTER bits)
+        """
+        self.relations = relations
+        self.class_count = len(relations)
+        self.neighbors = neighbors
+        self.revisions = 0  # arcs revised by ac3()
+
+        profs = set()
+        times = set()
+        rooms = set()
+        for domain in variable_domains.values():
+            for prof, time, room in domain:
+                profs.add(prof)
+                times.add(time)
+                rooms.add(room)
+        self.profs = sorted(profs)
+        self.times = sorted(times)  # sorted by code => "before"/"after" masks follow the codes
+        self.rooms = sorted(rooms)
+        self.prof_pos = {prof: pos for pos, prof in enumerate(self.profs)}
+        self.time_pos = {time: pos for pos, time in enumerate(self.times)}
+        self.room_pos = {room: pos for pos, room in enumerate(self.rooms)}
+
+        # support masks: every bit having the given prof / time / room
+        n_profs, n_times, n_rooms = len(self.profs), len(self.times), len(self.rooms)
+        self.prof_masks = [0] * n_profs
+        self.time_masks = [0] * n_times
+        self.room_masks = [0] * n_rooms
+        for p in range(n_profs):
+            for t in range(n_times):
+                for r in range(n_rooms):
+                    bit = 1 << self.bit_of_pos(p, t, r)
+                    self.prof_masks[p] |= bit
+                    self.time_masks[t] |= bit
+                    self.room_masks[r] |= bit
+        # before_masks[t] - all bits with a time code < times[t]; after_masks[t] - > times[t]
+        self.before_masks = [0] * n_times
+        self.after_masks = [0] * n_times
+        acc = 0
+        for t in range(n_times):
+            self.before_masks[t] = acc
+            acc |= self.time_masks[t]
+        acc = 0
+        for t in reversed(range(n_times)):
+            self.after_masks[t] = acc
+            acc |= self.time_masks[t]
+
+        self.domains = [self.encode(variable_domains[Xi]) for Xi in range(self.class_count)]
+
+    def bit_of_pos(self, p, t, r):
+        return (p * len(self.times) + t) * len(self.rooms) + r
+
+    def bit_of(self, value):
+        prof, time, room = value
+        return self.bit_of_pos(self.prof_pos[prof], self.time_pos[time], self.room_pos[room])
+
+    def value_of(self, bit):
+        rest, r = divmod(bit, len(self.rooms))
+        p, t = divmod(rest, len(self.times))
+        return (self.profs[p], self.times[t], self.rooms[r])
+
+    def encode(self, domain):
+        mask = 0
+        for value in domain:
+            mask |= 1 << self.bit_of(value)
+        return mask
+
+    def decode(self, mask):
+        return [self.value_of(bit) for bit in iter_bits(mask)]
+
+    def size(self, Xi):
+        return bin(self.domains[Xi]).count('1')
+
+    def arc_kind(self, Xi, Xj):
+        relation = self.relations[Xi][Xj]
+        if not relation & problem_model.SAME_GROUP:
+            return DIFFERENT_GROUP
+        if relation & problem_model.BEFORE:
+            return COURSE_BEFORE_SEMINAR
+        if relation & problem_model.AFTER:
+            return SEMINAR_AFTER_COURSE
+        return SAME_GROUP
+
+    def unsupported(self, Xi, Xj):
+        """
+        Mask of the values of Xi that have no support in the domain of Xj
+        (same semantics as ac3.is_consistent).
+        """
+        domain_xi = self.domains[Xi]
+        domain_xj = self.domains[Xj]
+        kind = self.arc_kind(Xi, Xj)
+        removed = 0
+        for t, time_mask in enumerate(self.time_masks):
+            xi_at_t = domain_xi & time_mask
+            if not xi_at_t:
+                continue
+            if kind == COURSE_BEFORE_SEMINAR:
+                if not domain_xj & self.after_masks[t]:
+                    removed |= xi_at_t
+                continue
+            if kind == SEMINAR_AFTER_COURSE:
+                if not domain_xj & self.before_masks[t]:
+                    removed |= xi_at_t
+                continue
+            if domain_xj & ~time_mask:
+                continue  # some y at another time supports every x at this time
+            if kind == SAME_GROUP:
+                removed |= xi_at_t
+                continue
+            # every y of Xj is at this very time => x needs a y with another prof AND another room
+            for bit in iter_bits(xi_at_t):
+                rest, r = divmod(bit, len(self.rooms))
+                p = rest // len(self.times)
+                if not domain_xj & ~(self.prof_masks[p] | self.room_masks[r]):
+                    removed |= 1 << bit
+        return removed
+
+    def revise(self, Xi, Xj):
+        self.revisions += 1
+        removed = self.unsupported(Xi, Xj)
+        if removed:
+            self.domains[Xi] &= ~removed
+        return removed != 0
+
+    def ac3(self):
+        queue = deque((Xi, Xj) for Xi in range(self.class_count) for Xj in self.neighbors[Xi])
+        in_queue = set(queue)
+        while queue:
+            arc = queue.popleft()
+            in_queue.discard(arc)
+            Xi, Xj = arc
+            if self.revise(Xi, Xj):
+                if not self.domains[Xi]:
+                    return False  # a domain became empty
+                for Xk in self.neighbors[Xi]:
+                    if Xk != Xj and (Xk, Xi) not in in_queue:
+                        queue.append((Xk, Xi))
+                        in_queue.add((Xk, Xi))
+        return True
+
+    def write_back(self, variable_domains):
+        """
+        Filters the list domains down to the values still present in the bitsets
+        (keeps the original order of the values).
+        """
+        for Xi in range(self.class_count):
+            mask = self.domains[Xi]
+            variable_domains[Xi] = [value for value in variable_domains[Xi] if mask >> self.bit_of(value) & 1]
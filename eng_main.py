@@ -1,10 +1,26 @@
 import json
+import os
 import copy
-import cProfile
-from flask import Flask, render_template
+import sys
+from flask import Flask, Response, render_template, request, jsonify
 import threading
+import itertools
 import re
+from collections import deque, defaultdict
+from array import array
 from openai import OpenAI
+from nogoods import NogoodStore
+import search_control
+import local_search
+import mip_backend
+import job_service
+import page_cache
+import timetable_export
+import instrumentation
+import problem_model
+import problem_cache
+import symmetry
+from problem_model import ClassType
 
 """
 --- can be searched in code with "E1", "R3", ... ---
@@ -32,10 +48,12 @@ during_assignment_restrictions = []
 # JSON filenames loaded from the 'eng_data' directory
 file_names = ['groups', 'subjects', 'teachers', 'rooms', 'time_slots', 'extra_restrictions']
 loaded_data = {}
+file_contents = {}  # what the startup cache key is computed from
 # loading data from JSON files
 for file_name in file_names:
-    with open(f'./eng_data/{file_name}.json', 'r') as file:
-        read_data = json.load(file)
+    with open(f'./eng_data/{file_name}.json', 'rb') as file:
+        file_contents[file_name] = file.read()
+        read_data = json.loads(file_contents[file_name])
         loaded_data[file_name] = read_data
 
 # lookup dictionaries for entities accessed by codes(group['code'])
@@ -47,6 +65,29 @@ subjects = {subject['code']: subject for subject in loaded_data['subjects']}
 time_slots = {time['code']: time for time in loaded_data['time_slots']}
 extra_restrictions = loaded_data['extra_restrictions']
 
+# group hierarchy index (R2)
+# group_code == 0 is EVERYONE, a main group (A, B, E...) contains its subgroups (A1, A2, ...)
+EVERYONE = {code for code in groups if code != 0}
+group_children = {code: set() for code in groups}  # parent -> children
+group_ancestors = {code: set() for code in groups}  # child -> ancestors
+for code, group in groups.items():
+    if len(group['name']) == 1:
+        for other_code in groups:
+            if str(other_code).startswith(str(code)) and other_code != code:
+                group_children[code].add(other_code)
+                group_ancestors[other_code].add(code)
+if 0 in groups:
+    group_children[0] = set(EVERYONE)
+    for code in EVERYONE:
+        group_ancestors[code].add(0)
+main_group_codes = {code for code, group in groups.items() if len(group['name']) == 1}
+# group_conflicts[group_code] - groups whose R2 check sees a class of group_code:
+# the group itself and its ancestors (a main group / EVERYONE cannot overlap any of its subgroups),
+# and for EVERYONE also the main groups (a main group cannot overlap EVERYONE)
+group_conflicts = {code: {code} | group_ancestors[code] for code in groups}
+if 0 in groups:
+    group_conflicts[0] |= main_group_codes
+
 # builds the list of classes to schedule (courses & seminars)
 # a class is (GROUP_code + SUBJECT_code + class_TYPE(course/seminar))
 # group_code == 0 means EVERYONE
@@ -81,7 +122,266 @@ for subject in loaded_data['subjects']:
                 'group_code': group['code']
             })
 
+# dense ids and array columns of the loaded data and of class_list (see problem_model.py)
+model = problem_model.compile_eng_data(loaded_data, class_list)
+# group_conflict_mask[group_id] - group_conflicts as a bitmask of group ids (R2 between two classes without hashing codes)
+group_conflict_mask = [model.mask(model.groups, group_conflicts[code]) for code in model.groups.code]
+
+# SOFT_PREFERENCES: E2 stops being a hard restriction - the backtracking may use unpreferred timeslots (it tries
+# them last), every class in one costs UNPREFERRED_SLOT_WEIGHT, and the timetable it finds is then improved by
+# LOCAL_SEARCH ('tabu', 'annealing' or None, see local_search.py) for LOCAL_SEARCH_TIME_BUDGET seconds
+SOFT_PREFERENCES = False
+UNPREFERRED_SLOT_WEIGHT = 1
+LOCAL_SEARCH = 'annealing'
+LOCAL_SEARCH_TIME_BUDGET = 10
+# keep the candidate tables in the startup cache (problem_cache.py)
+PROBLEM_CACHE = True
+
+# candidate tables (compiled once per run by compile_candidate_tables(), read-only during the search)
+class_teachers = []  # class_teachers[class_index] = teachers allowed to teach the class (subject taught + R8)
+class_slots = []  # class_slots[class_index] = [(time_code, [room_codes valid at time_code (R4, R5)]), ...]
+teacher_max_hours = {}  # weekly limit per teacher (R6)
+teacher_max_daily_hours = {}  # E1 limit per teacher, extra_restrictions already resolved
+teacher_unpreferred_slots = {}  # E2 timeslots per teacher, as sets
+slot_day = {}  # slot_day[time_code] = day of the timeslot
+class_neighbors = []  # class_neighbors[class_index] = classes sharing a group (R2) or a possible teacher (R3)
+room_class = {}  # room_class[room_code] = symmetry class of the room (same class => interchangeable)
+teacher_class = {}  # teacher_class[teacher_code] = symmetry class of the teacher
+
+# forward checking index: every placement a class can ever get (R4, R5, R8, E2 already applied) gets an id,
+# and for each thing a committed placement takes (group / teacher / room at a timeslot, a full week or day of
+# a teacher) we keep the ids of the placements it makes impossible
+candidate_placements = []  # candidate_placements[candidate_id] = (teacher_code, time_code, room_code)
+candidate_class = array('i')  # candidate_class[candidate_id] = class_index
+class_candidate_ids = []  # class_candidate_ids[class_index] = range of the candidate ids of the class, in file order
+candidates_by_group_time = {}  # (group_code, time_code) -> array of candidate ids (all the candidates_by_* too,
+# memoryviews of the same ints when read from the startup cache)
+candidates_by_teacher_time = {}  # (teacher_code, time_code) -> candidate ids
+candidates_by_room_time = {}  # (room_code, time_code) -> candidate ids
+candidates_by_teacher = {}  # teacher_code -> candidate ids (R6)
+candidates_by_teacher_day = {}  # (teacher_code, day) -> candidate ids (E1)
+
+def compile_candidate_tables():
+    """
+    Precomputes, for each class, its eligible teachers and the valid rooms of each timeslot,
+    and resolves the teacher limits from extra_restrictions, so the search loop only
+    touches candidates that already passed the static checks (R4, R5, R8).
+    Must be called again whenever extra_restrictions changes.
+    """
+    global class_teachers, class_slots, teacher_max_hours, teacher_max_daily_hours
+    global teacher_unpreferred_slots, slot_day, class_neighbors, room_class, teacher_class, class_unpreferred_candidates
+    global candidate_placements, candidate_class, class_candidate_ids, candidates_by_group_time
+    global candidates_by_teacher_time, candidates_by_room_time, candidates_by_teacher, candidates_by_teacher_day
+
+    # rooms valid at each timeslot, for courses and for seminars
+    slot_rooms = {ClassType.COURSE: [], ClassType.SEMINAR: []}
+    for slot_id, time_code in enumerate(model.slots.code):
+        for kind in ClassType:
+            room_codes = [
+                model.rooms.code[room_id] for room_id in range(len(model.rooms))
+                if (kind != ClassType.COURSE or model.room_course_possible[room_id]) and model.room_free(room_id, slot_id)
+            ]
+            if room_codes:
+                slot_rooms[kind].append((time_code, room_codes))
+
+    class_teachers = []
+    class_slots = []
+    for class_index in range(len(class_list)):
+        class_teachers.append([
+            model.teachers.code[teacher_id] for teacher_id in range(len(model.teachers))
+            if model.teaches(teacher_id, class_index)
+        ])
+        class_slots.append(slot_rooms[model.class_kind[class_index]])
+
+    max_daily_hours = extra_restrictions.get("max_daily_hours", {})
+    unpreferred_timeslots = extra_restrictions.get("unpreferred_timeslots", {})
+    teacher_max_hours = {code: teacher['max_hours'] for code, teacher in teachers.items()}
+    teacher_max_daily_hours = {
+        code: max_daily_hours.get(str(code), teacher['max_hours']) for code, teacher in teachers.items()
+    }
+    teacher_unpreferred_slots = {code: set(unpreferred_timeslots.get(str(code), [])) for code in teachers}
+    slot_day = {code: time['day'] for code, time in time_slots.items()}
+
+    # placements of each class left out of the candidates below for an unpreferred timeslot (E2),
+    # counted as E2 failures whenever a search starts (see reset_search_state)
+    class_unpreferred_candidates = [0] * len(class_list)
+    if not SOFT_PREFERENCES:
+        for class_index in range(len(class_list)):
+            for teacher_code in class_teachers[class_index]:
+                if teacher_unpreferred_slots[teacher_code]:
+                    class_unpreferred_candidates[class_index] += sum(
+                        len(room_codes) for time_code, room_codes in class_slots[class_index]
+                        if time_code in teacher_unpreferred_slots[teacher_code])
+
+    # interchangeable rooms / teachers (see symmetry.py), the teachers compared with their E1 / E2 restrictions too
+    room_class = symmetry.room_classes(model)
+    teacher_class = symmetry.teacher_classes(model, [
+        (teacher_max_daily_hours[code], frozenset(teacher_unpreferred_slots[code])) for code in model.teachers.code
+    ])
+
+    # classes that constrain each other through R2 (overlapping groups) or R3 (a common possible teacher)
+    # rooms are left out - almost every class can use almost every room, they would add the same degree to all
+    class_neighbors = [set() for _ in class_list]
+    for i, cls_i in enumerate(class_list):
+        for j in range(i + 1, len(class_list)):
+            cls_j = class_list[j]
+            if (cls_j['group_code'] in group_conflicts[cls_i['group_code']]
+                    or cls_i['group_code'] in group_conflicts[cls_j['group_code']]
+                    or set(class_teachers[i]) & set(class_teachers[j])):
+                class_neighbors[i].add(j)
+                class_neighbors[j].add(i)
+
+    # the candidate tables only depend on the eng_data/ files and on extra_restrictions: when they were already
+    # compiled for the same ones (a restart, a job with restrictions seen before) they come from the startup cache
+    cache_key = problem_cache.digest([file_contents[name] for name in file_names if name != 'extra_restrictions'],
+                                     'eng_main', json.dumps(extra_restrictions, sort_keys=True), SOFT_PREFERENCES)
+    cached = problem_cache.load('eng_main', cache_key) if PROBLEM_CACHE else None
+    if cached is not None:
+        read_candidate_columns(cached)
+        return
+
+    # the id lists are packed int arrays (4 bytes an id instead of a pointer to an int object)
+    # and the candidates of a class get consecutive ids
+    candidate_placements = []
+    candidate_class = array('i')
+    class_candidate_ids = []
+    by_group_time, by_teacher_time, by_room_time, by_teacher, by_teacher_day = (defaultdict(lambda: array('i')) for _ in range(5))
+    for class_index, cls in enumerate(class_list):
+        first_id = len(candidate_placements)
+        for teacher_code in class_teachers[class_index]:
+            for time_code, room_codes in class_slots[class_index]:
+                if not SOFT_PREFERENCES and time_code in teacher_unpreferred_slots[teacher_code]:  # E2
+                    continue
+                for room_code in room_codes:
+                    candidate_id = len(candidate_placements)
+                    candidate_placements.append((teacher_code, time_code, room_code))
+                    candidate_class.append(class_index)
+                    by_group_time[(cls['group_code'], time_code)].append(candidate_id)
+                    by_teacher_time[(teacher_code, time_code)].append(candidate_id)
+                    by_room_time[(room_code, time_code)].append(candidate_id)
+                    by_teacher[teacher_code].append(candidate_id)
+                    by_teacher_day[(teacher_code, slot_day[time_code])].append(candidate_id)
+        class_candidate_ids.append(range(first_id, len(candidate_placements)))
+    candidates_by_group_time, candidates_by_teacher_time, candidates_by_room_time = dict(by_group_time), dict(by_teacher_time), dict(by_room_time)
+    candidates_by_teacher, candidates_by_teacher_day = dict(by_teacher), dict(by_teacher_day)
+    if PROBLEM_CACHE:
+        problem_cache.save('eng_main', cache_key, candidate_columns())
+
+def candidate_tables():
+    # candidates_by_* with every key as a tuple of ints (the day of candidates_by_teacher_day as its model.days id)
+    return {
+        'group_time': candidates_by_group_time,
+        'teacher_time': candidates_by_teacher_time,
+        'room_time': candidates_by_room_time,
+        'teacher': {(teacher_code,): ids for teacher_code, ids in candidates_by_teacher.items()},
+        'teacher_day': {(teacher_code, model.days.index(day)): ids for (teacher_code, day), ids in candidates_by_teacher_day.items()},
+    }
+
+def candidate_columns():
+    """
+    The candidate tables as problem_cache columns: the placements as flattened (teacher, time, room) triples,
+    the first candidate id of every class and, per candidates_by_* table, its keys and its id lists.
+    """
+    columns = {
+        'placements': array('i', itertools.chain.from_iterable(candidate_placements)),
+        'candidate_class': candidate_class,
+        'class_offsets': [ids.start for ids in class_candidate_ids] + [len(candidate_placements)],
+    }
+    for name, table in candidate_tables().items():
+        columns[f'{name}_keys'] = [code for key in table for code in key]
+        columns[f'{name}_offsets'], columns[f'{name}_ids'] = problem_cache.pack_lists(table.values())
+    return columns
+
+def read_candidate_columns(cached):
+    """
+    The candidate tables from the startup cache: the id lists and candidate_class stay memoryviews of the
+    mapped file, only candidate_placements is rebuilt as tuples.
+    """
+    global candidate_placements, candidate_class, class_candidate_ids, candidates_by_group_time
+    global candidates_by_teacher_time, candidates_by_room_time, candidates_by_teacher, candidates_by_teacher_day
+    placements = cached['placements'].tolist()
+    candidate_placements = list(zip(placements[0::3], placements[1::3], placements[2::3]))
+    candidate_class = cached['candidate_class']
+    offsets = cached['class_offsets']
+    class_candidate_ids = [range(offsets[i], offsets[i + 1]) for i in range(len(class_list))]
+    tables = {}
+    for name, width in (('group_time', 2), ('teacher_time', 2), ('room_time', 2), ('teacher', 1), ('teacher_day', 2)):
+        codes = cached[f'{name}_keys'].tolist()
+        keys = zip(*(codes[position::width] for position in range(width)))
+        tables[name] = dict(zip(keys, problem_cache.unpack_lists(cached[f'{name}_offsets'], cached[f'{name}_ids'])))
+    candidates_by_group_time = tables['group_time']
+    candidates_by_teacher_time = tables['teacher_time']
+    candidates_by_room_time = tables['room_time']
+    candidates_by_teacher = {teacher_code: ids for (teacher_code,), ids in tables['teacher'].items()}
+    candidates_by_teacher_day = {(teacher_code, model.days[day]): ids for (teacher_code, day), ids in tables['teacher_day'].items()}
+
+compile_candidate_tables()
+
+# search heuristics
+# VARIABLE_ORDERING: 'static' (class_list order), 'mrv' (fewest placements left, most unplaced neighbors breaks ties)
+#                    or 'domwdeg' (placements left / (unplaced neighbors + failures seen on the class))
+# VALUE_ORDERING: 'static' (teachers, timeslots, rooms in file order) or 'lcv' (least constraining placement first)
+VARIABLE_ORDERING = 'static'
+VALUE_ORDERING = 'static'
+# SYMMETRY_BREAKING: of the placements that only differ by an interchangeable room, or by a teacher with no
+# class yet that is interchangeable with another one, only the first is tried (see symmetry.py)
+SYMMETRY_BREAKING = True
+# FORWARD_CHECKING: every committed placement takes away the placements it makes impossible from the live
+# counts of the classes not placed yet, and is rejected as soon as one of them has none left
+FORWARD_CHECKING = True
+# BACKJUMPING: conflict-directed backjumping - a dead end returns the placed classes that caused it and the
+# search jumps straight back to the most recent of them; every conflict set is also kept as a nogood
+BACKJUMPING = True
+NOGOOD_CAPACITY = 10000
+# INCREMENTAL_RESCHEDULING: when extra_restrictions changes, reschedule() keeps the previous timetable
+# and only re-solves the placements the change broke (plus their neighborhood), instead of starting over
+# (if the repair fails it does start over)
+INCREMENTAL_RESCHEDULING = True
+# node limit of the repair: one pass over the classes + this many nodes per placement its free classes can take
+REPAIR_NODES_PER_PLACEMENT = 0.01
+# search budgets and restarts (see search_control.py), None = no limit / no restarts
+# once a budget runs out the search stops with the deepest partial timetable it reached
+SEARCH_TIME_BUDGET = None  # seconds
+SEARCH_NODE_BUDGET = None
+RESTART_SCHEDULE = None  # None, 'luby' or 'geometric' (restarts break ties / order placements at random)
+RESTART_BASE = 100  # nodes of the first restart (unit of the schedule)
+# ENGINE: 'backtracking' (this file) or an external solver the candidate tables are compiled to (see mip_backend.py):
+# 'cpsat' (OR-Tools) or 'cbc' (PuLP), SEARCH_TIME_BUDGET is its time limit
+ENGINE = 'backtracking'
+# the app solves in background jobs (see job_service.py): worker processes, jobs queued or running at most
+JOB_WORKERS = 1
+MAX_PENDING_JOBS = 4
+# a job submitted with "profile": true runs under the sampling profiler (see instrumentation.py), its folded
+# stacks are written to this directory
+PROFILE_DIRECTORY = 'profiles'
+
 best_timetable = None
+best_assignment = {}  # class_assignment of best_timetable, in placement order (what a repair starts from)
+search_stats = {'nodes': 0, 'backtracks': 0, 'backjumps': 0}
+metrics = instrumentation.new_metrics(['add_to_timetable'], instrumentation.FAILURE_RULES)  # per job, see /metrics
+class_assignment = {}  # class_assignment[class_index] = (teacher_code, time_code, room_code) for the placed classes
+class_weights = [0] * len(class_list)  # dom/wdeg - dead ends seen on each class
+candidate_blocks = []  # candidate_blocks[candidate_id] = committed placements that make the candidate impossible
+live_count = []  # live_count[class_index] = candidates of the class with no blocks
+placed_at_time = {}  # placed_at_time[time_code] = placed classes at that timeslot
+placed_by_teacher = {}  # placed_by_teacher[teacher_code] = placed classes of that teacher
+nogood_store = NogoodStore(NOGOOD_CAPACITY)  # (class_index, (teacher_code, time_code, room_code)) combinations with no solution
+failure_conflict = set()  # conflict set of the last dead end (read by the caller of backtracking)
+kept_placements = {}  # class_index -> the only placement the class may take (a repair keeps it from the previous timetable)
+wiped_out_class = None  # the class the last failed forward check left without candidates
+node_limit = None  # the search gives up (search_aborted) once search_stats['nodes'] goes past it
+should_stop = None  # ... or once this optional callable returns True
+search_aborted = False
+tie_breaker = None  # optional random.Random: ties of the variable ordering and the order of equal placements are random
+deepest_assignment = {}  # the largest class_assignment seen since the last reset (partial timetable on a timeout)
+
+# work splitting (parallel_search.py): when work_requested() says another worker is idle, the untried placements
+# of the shallowest open class are handed to give_work(subproblems) instead of being tried here
+# a subproblem is a list of (class_index, (teacher_code, time_code, room_code)) placements, in placement order
+work_requested = None
+give_work = None
+open_choices = []  # (depth, class_index, deque of untried placements) of the classes being tried, shallowest first
+donated_depth = None  # shallowest depth that gave work away - a dead end at or above it proves nothing
 
 current_timetable = {}  # current_timetable[teacher_code][time_code] = (group_code, room_code, subject_code, class_type)
 teacher_schedule = {}  # which timeslots are occupied by each teacher
@@ -89,67 +389,70 @@ group_schedule = {}  # which timeslots are occupied by each group -> detect over
 room_schedule = {}  # which time slots are occupied by each room
 daily_teacher_hours = {}  # daily hours for each teacher per day
 
-def add_to_timetable(teacher_code, time_code, group_code, room_code, subject_code, class_type):
+def new_group_busy():
+    # group_busy[group_code][time_code] = how many classes at time_code clash with group_code (see group_conflicts)
+    # => R2 is a single lookup for any group, no matter how many subgroups exist
+    return {code: {time_code: 0 for time_code in time_slots} for code in groups}
+
+group_busy = new_group_busy()
+
+@instrumentation.timed(metrics, 'add_to_timetable')
+def add_to_timetable(teacher_code, time_code, group_code, room_code, subject_code, class_type, class_index):
     """
-    Attempts to add a class (group_code, room_code, subject_code, class_type)
+    Attempts to add a class (group_code, room_code, subject_code, class_type) - class_list[class_index] -
     to current_timetable[teacher_code][time_code]. 
     True if successful
-    1) verifies the group is not already in group_schedule at that time
+    1) verifies the group (its subgroups and EVERYONE included) is not busy at that time
     2) verifies the room is free at the given timeslot
     3) increments teacher_schedule[teacher_code]
     """
     # initialize teacher in timetable if needed
     if teacher_code not in current_timetable:
         current_timetable[teacher_code] = {}
+    if teacher_code not in teacher_schedule:
+        teacher_schedule[teacher_code] = 0
 
     # initialize group in schedule if needed
     if group_code not in group_schedule:
         group_schedule[group_code] = set()
 
-    # if it's a main group (A, B, C...), ensure no sub-group conflicts
-    if len(groups[group_code]['name']) == 1:
-        for group in groups.values():
-            if str(group['code']).startswith(str(group_code)) and str(group_code) != str(group['code']):
-                if group['code'] not in group_schedule:
-                    group_schedule[group['code']] = set()
-                if time_code in group_schedule[group['code']]:
-                    return False
-        if 0 not in group_schedule: # EVERYONE
-            group_schedule[0] = set()
-        if time_code in group_schedule[0]: # if (someone from) EVERYONE is already busy
-            return False
-
-    if group_code == 0: # EVERYONE
-        for group in groups.values():
-            if group['code'] == 0:
-                continue # we don't compare it against itself
-            if group['code'] not in group_schedule:
-                group_schedule[group['code']] = set()
-            if time_code in group_schedule[group['code']]:
-                return False
+    # no sub-group / main group / EVERYONE conflicts (R2)
+    if group_busy[group_code][time_code]:
+        metrics['failures']['R2'] += 1
+        return False
 
     # checks room schedule (R4.1)
     if room_code not in room_schedule:
         room_schedule[room_code] = set()
     if time_code in room_schedule[room_code]:
+        metrics['failures']['R4.1'] += 1
         return False
 
     # handling extra restrictions (E1, E2, etc.)
-    day = time_slots[time_code]["day"]
+    day = slot_day[time_code]
     daily_teacher_hours.setdefault(teacher_code, {}).setdefault(day, 0)
-    max_daily_hours = extra_restrictions.get("max_daily_hours", {}).get(str(teacher_code), teachers[teacher_code]["max_hours"])
-    if daily_teacher_hours[teacher_code][day] + 1 > max_daily_hours:  # E1
+    if daily_teacher_hours[teacher_code][day] + 1 > teacher_max_daily_hours[teacher_code]:  # E1
+        metrics['failures']['E1'] += 1
         return False
-    unpreferred_slots = extra_restrictions.get("unpreferred_timeslots", {}).get(str(teacher_code), [])
-    if time_code in unpreferred_slots:  # E2
+    if not SOFT_PREFERENCES and time_code in teacher_unpreferred_slots[teacher_code]:  # E2
+        metrics['failures']['E2'] += 1
         return False
 
     # assigns class to timetable
     current_timetable[teacher_code][time_code] = (group_code, room_code, subject_code, class_type)
     teacher_schedule[teacher_code] += 1
     group_schedule[group_code].add(time_code)
+    for code in group_conflicts[group_code]:
+        group_busy[code][time_code] += 1
     room_schedule[room_code].add(time_code)
     daily_teacher_hours[teacher_code][day] += 1
+
+    if FORWARD_CHECKING:
+        global wiped_out_class
+        wiped_out_class = forward_check(teacher_code, time_code, group_code, room_code, class_index)
+        if wiped_out_class is not None:
+            remove_from_timetable(teacher_code, time_code)
+            return False
     return True
 
 def remove_from_timetable(teacher_code, time_code):
@@ -159,82 +462,563 @@ def remove_from_timetable(teacher_code, time_code):
     """
     if teacher_code in current_timetable and time_code in current_timetable[teacher_code]:
         group_code, room_code, _, _ = current_timetable[teacher_code][time_code]
-        day = time_slots[time_code]["day"]
+        day = slot_day[time_code]
+        if FORWARD_CHECKING:
+            # gives back the placements it took away (computed before the schedules are decremented)
+            for _, candidate_ids in blocked_candidates(teacher_code, time_code, group_code, room_code):
+                for candidate_id in candidate_ids:
+                    candidate_blocks[candidate_id] -= 1
+                    if candidate_blocks[candidate_id] == 0:
+                        live_count[candidate_class[candidate_id]] += 1
         del current_timetable[teacher_code][time_code]
         teacher_schedule[teacher_code] -= 1
         group_schedule[group_code].remove(time_code)
+        for code in group_conflicts[group_code]:
+            group_busy[code][time_code] -= 1
         room_schedule[room_code].remove(time_code)
         daily_teacher_hours[teacher_code][day] -= 1
 
-def backtracking(class_index):
+def blocked_candidates(teacher_code, time_code, group_code, room_code):
     """
-    We TRY to assign each class(group, subject, type) to a
-    (TEACHER, TIMESLOT, ROOM) ensuring no overlapping constraints
+    (rule, candidate ids) lists made impossible by a committed placement (the schedules already count it):
+    same timeslot for an overlapping group (R2), the teacher (R3) or the room (R4.1), and every
+    candidate of the teacher once he reached his daily (E1) or weekly (R6) maximum - the day first,
+    so forward_check charges it to E1 when both are reached (a daily maximum that is not below the
+    weekly one only follows from R6).
     """
-    global best_timetable
+    lists = [('R2', candidates_by_group_time.get((code, time_code), ())) for code in group_conflicts[group_code]]
+    lists.append(('R3', candidates_by_teacher_time.get((teacher_code, time_code), ())))
+    lists.append(('R4.1', candidates_by_room_time.get((room_code, time_code), ())))
+    day = slot_day[time_code]
+    if daily_teacher_hours[teacher_code][day] >= teacher_max_daily_hours[teacher_code] < teacher_max_hours[teacher_code]:
+        lists.append(('E1', candidates_by_teacher_day.get((teacher_code, day), ())))
+    if teacher_schedule[teacher_code] >= teacher_max_hours[teacher_code]:
+        lists.append(('R6', candidates_by_teacher.get(teacher_code, ())))
+    return lists
 
-    # base case: if we've processed all classes, success (R1)
-    if class_index == len(class_list):
-        best_timetable = copy.deepcopy(current_timetable)
-        return 1
+def forward_check(teacher_code, time_code, group_code, room_code, class_index):
+    """
+    Takes the candidates made impossible by a committed placement of class_index out of the
+    live counts (each one counted as a failure of the first rule that blocks it). Returns
+    another class not placed yet that has no candidate left, or None.
+    """
+    wiped_out = None
+    for rule, candidate_ids in blocked_candidates(teacher_code, time_code, group_code, room_code):
+        pruned = 0
+        for candidate_id in candidate_ids:
+            candidate_blocks[candidate_id] += 1
+            if candidate_blocks[candidate_id] == 1:
+                pruned += 1
+                other_index = candidate_class[candidate_id]
+                live_count[other_index] -= 1
+                if live_count[other_index] == 0 and other_index != class_index and other_index not in class_assignment:
+                    wiped_out = other_index  # keep going, remove_from_timetable gives back every block
+        metrics['failures'][rule] += pruned
+    return wiped_out
 
-    cls = class_list[class_index]
-    subject_code = cls['subject_code']
-    group_code = cls['group_code']
-    class_type = cls['type']
+def record_assignment(class_index, teacher_code, time_code, room_code):
+    class_assignment[class_index] = (teacher_code, time_code, room_code)
+    placed_at_time.setdefault(time_code, set()).add(class_index)
+    placed_by_teacher.setdefault(teacher_code, set()).add(class_index)
 
-    # we iterate only through teachers which can teach this subject
-    possible_teachers = [
-        teacher['code'] for teacher in loaded_data['teachers']
-        if subject_code in teacher['subjects_taught']
-    ]
+def forget_assignment(class_index):
+    teacher_code, time_code, _ = class_assignment.pop(class_index)
+    placed_at_time[time_code].discard(class_index)
+    placed_by_teacher[teacher_code].discard(class_index)
 
-    # WE TRY to assign each TEACHER in turn
-    for teacher_code in possible_teachers:
-        # if it's a course, we need to check if teacher is elligible (R8)
-        if class_type == 'course' and not teachers[teacher_code]['can_teach_course']:
+def candidate_reasons(class_index, teacher_code, time_code, room_code):
+    """
+    Why a placement of class_index is impossible: a list of sets of placed classes, each set alone
+    blocks the placement (empty list if it is still possible).
+    """
+    group_bit = 1 << model.class_group[class_index]
+    reasons = []
+    for other_index in placed_at_time.get(time_code, ()):
+        other_teacher, _, other_room = class_assignment[other_index]
+        if (group_conflict_mask[model.class_group[other_index]] & group_bit  # R2
+                or other_teacher == teacher_code or other_room == room_code):  # R3, R4.1
+            reasons.append({other_index})
+    teacher_classes = placed_by_teacher.get(teacher_code, set())
+    if teacher_schedule.get(teacher_code, 0) >= teacher_max_hours[teacher_code]:  # R6
+        reasons.append(set(teacher_classes))
+    day = slot_day[time_code]
+    if daily_teacher_hours.get(teacher_code, {}).get(day, 0) >= teacher_max_daily_hours[teacher_code]:  # E1
+        reasons.append({other_index for other_index in teacher_classes if slot_day[class_assignment[other_index][1]] == day})
+    return reasons
+
+def class_culprits(class_index):
+    """
+    A set of placed classes that together take away every impossible placement of class_index
+    (R4, R5, R8, E2 never depend on them, nor does a repair keeping the class at one placement). One reason
+    is enough per placement, so we greedily reuse the culprits already picked and otherwise prefer the
+    classes placed earliest - the search can then jump further back.
+    """
+    placement_order = {other_index: order for order, other_index in enumerate(class_assignment)}
+    if class_index in kept_placements:
+        placements = [kept_placements[class_index]]
+    else:
+        placements = (candidate_placements[candidate_id] for candidate_id in class_candidate_ids[class_index])
+    culprits = set()
+    for placement in placements:
+        reasons = candidate_reasons(class_index, *placement)
+        if not reasons or any(reason <= culprits for reason in reasons):
             continue
-        
-        # we initialize teacher_schedule if it's not present
-        if teacher_code not in teacher_schedule:
-            teacher_schedule[teacher_code] = 0
+        culprits |= min(reasons, key=lambda reason: max((placement_order[c] for c in reason), default=-1))
+    return culprits
 
+def teacher_limit_culprits(teacher_code, time_code):
+    """
+    Placed classes of a teacher that one more class at time_code would push to his weekly (R6)
+    or daily (E1) maximum.
+    """
+    teacher_classes = placed_by_teacher.get(teacher_code, set())
+    if teacher_schedule.get(teacher_code, 0) + 1 >= teacher_max_hours[teacher_code]:
+        return teacher_classes
+    day = slot_day[time_code]
+    if daily_teacher_hours.get(teacher_code, {}).get(day, 0) + 1 >= teacher_max_daily_hours[teacher_code]:
+        return {other_index for other_index in teacher_classes if slot_day[class_assignment[other_index][1]] == day}
+    return set()
+
+def live_candidates(class_index):
+    """
+    Yields the (teacher_code, time_code, room_code) placements of a class that are still
+    possible in the current partial timetable (R2, R3, R4.1, R6, E1, E2), in file order.
+    Without forward checking, every placement skipped is counted as a failure of its rule
+    (with it, forward_check counted them when they were blocked).
+    """
+    if FORWARD_CHECKING:
+        for candidate_id in class_candidate_ids[class_index]:
+            if not candidate_blocks[candidate_id]:
+                yield candidate_placements[candidate_id]
+        return
+
+    failures = metrics['failures']
+    group_busy_at = group_busy[model.groups.code[model.class_group[class_index]]]
+    for teacher_code in class_teachers[class_index]:
         # check that teacher is below his maximum weekly hours (R6)
-        if teacher_schedule[teacher_code] >= teachers[teacher_code]['max_hours']:
+        if teacher_schedule.get(teacher_code, 0) >= teacher_max_hours[teacher_code]:
+            failures['R6'] += sum(len(room_codes) for _, room_codes in class_slots[class_index])
             continue
-        
-        # WE TRY each possible TIMESLOT
-        for time in loaded_data['time_slots']:
-            time_code = time['code']
-            
+        unpreferred_slots = () if SOFT_PREFERENCES else teacher_unpreferred_slots[teacher_code]
+        max_daily_hours = teacher_max_daily_hours[teacher_code]
+
+        for time_code, room_codes in class_slots[class_index]:
             # if the group is already busy, skip (R2)
-            if time_code in group_schedule.get(group_code, set()):
+            if group_busy_at[time_code]:
+                failures['R2'] += len(room_codes)
                 continue
-            
             # if the teacher is already busy, skip (R3)
             if time_code in current_timetable.get(teacher_code, {}):
+                failures['R3'] += len(room_codes)
                 continue
+            # the teacher doesn't want this timeslot, skip (E2)
+            if time_code in unpreferred_slots:
+                failures['E2'] += len(room_codes)
+                continue
+            # the teacher already has his maximum daily hours, skip (E1)
+            if daily_teacher_hours.get(teacher_code, {}).get(slot_day[time_code], 0) >= max_daily_hours:
+                failures['E1'] += len(room_codes)
+                continue
+            for room_code in room_codes:
+                # the room is already taken, skip (R4.1)
+                if time_code in room_schedule.get(room_code, ()):
+                    failures['R4.1'] += 1
+                else:
+                    yield teacher_code, time_code, room_code
 
-            # WE TRY each possible ROOM
-            for room in loaded_data['rooms']:
-                room_code = room['code']
-                is_course = (class_type == 'course')
+def count_candidates(class_index, limit=None):
+    """
+    Number of placements left for a class (stops counting once it goes past limit).
+    """
+    if FORWARD_CHECKING:
+        return live_count[class_index]
+    count = 0
+    for _ in live_candidates(class_index):
+        count += 1
+        if limit is not None and count > limit:
+            break
+    return count
 
-                # if the room doesn't allow courses, skip (R5)
-                if is_course and not room['course_possible']:
-                    continue
-                
-                # if the room is not available at this timeslot, skip (R4)
-                if time_code not in room['possible_times']:
-                    continue
+def select_next_class(depth):
+    """
+    Picks the class to place at this depth of the search (see VARIABLE_ORDERING).
+    """
+    if VARIABLE_ORDERING == 'static':
+        if depth not in class_assignment and (depth == 0 or depth - 1 in class_assignment):
+            return depth  # classes are placed in class_list order
+        # a repair starts with some classes already placed => the first class not placed yet
+        return next(class_index for class_index in range(len(class_list)) if class_index not in class_assignment)
+
+    best_class = None
+    best_key = None
+    for class_index in range(len(class_list)):
+        if class_index in class_assignment:
+            continue
+        degree = sum(1 for neighbor in class_neighbors[class_index] if neighbor not in class_assignment)
+        if VARIABLE_ORDERING == 'mrv':
+            limit = best_key[0] if best_key is not None else None
+            count = count_candidates(class_index, limit)
+            key = (count, -degree)
+        else:  # 'domwdeg'
+            count = count_candidates(class_index)
+            key = (count / max(degree + class_weights[class_index], 1), -degree)
+        if tie_breaker is not None:
+            key += (tie_breaker.random(),)
+        if count == 0:
+            return class_index  # dead end, fail right away
+        if best_key is None or key < best_key:
+            best_class, best_key = class_index, key
+    return best_class
+
+def ordered_candidates(class_index, break_symmetry=None):
+    """
+    The placements of a class in the order they are tried (see VALUE_ORDERING), one per symmetry class
+    unless break_symmetry is False (None: SYMMETRY_BREAKING).
+    """
+    candidates = value_ordered_candidates(class_index)
+    if class_index in kept_placements:
+        return [placement for placement in candidates if placement == kept_placements[class_index]]
+    if SYMMETRY_BREAKING if break_symmetry is None else break_symmetry:
+        # (the live candidates only have free rooms)
+        return symmetry.representatives(candidates, room_class, teacher_class, has_classes)
+    return candidates
+
+def has_classes(teacher_code):
+    return teacher_schedule.get(teacher_code, 0) > 0
+
+def value_ordered_candidates(class_index):
+    if VALUE_ORDERING == 'static':
+        if tie_breaker is not None or SOFT_PREFERENCES:
+            candidates = list(live_candidates(class_index))
+            if tie_breaker is not None:
+                tie_breaker.shuffle(candidates)
+            if SOFT_PREFERENCES:
+                candidates.sort(key=is_unpreferred)  # unpreferred timeslots last, the order is kept otherwise
+            return candidates
+        return live_candidates(class_index)
 
-                # attempt to assign
-                if add_to_timetable(teacher_code, time_code, group_code, room_code, subject_code, class_type):
-                    return_value = backtracking(class_index + 1)
-                    if return_value == 1:
-                        return 1
-                    # if not successful, remove assignment
-                    remove_from_timetable(teacher_code, time_code)
+    # least constraining value: how many placements of the other unplaced classes each candidate takes away,
+    # counted per (group, timeslot), (teacher, timeslot) and (room, timeslot) like add_to_timetable checks them
+    # (the effect on the weekly / daily hours of the teacher is not counted)
+    by_group_time = {}
+    by_teacher_time = {}
+    by_room_time = {}
+    for other_index in range(len(class_list)):
+        if other_index == class_index or other_index in class_assignment:
+            continue
+        other_group = class_list[other_index]['group_code']
+        for teacher_code, time_code, room_code in live_candidates(other_index):
+            by_group_time[(other_group, time_code)] = by_group_time.get((other_group, time_code), 0) + 1
+            by_teacher_time[(teacher_code, time_code)] = by_teacher_time.get((teacher_code, time_code), 0) + 1
+            by_room_time[(room_code, time_code)] = by_room_time.get((room_code, time_code), 0) + 1
+
+    group_code = class_list[class_index]['group_code']
+    def removed_placements(candidate):
+        teacher_code, time_code, room_code = candidate
+        return (sum(by_group_time.get((code, time_code), 0) for code in group_conflicts[group_code])
+                + by_teacher_time.get((teacher_code, time_code), 0)
+                + by_room_time.get((room_code, time_code), 0))
+
+    if tie_breaker is not None:
+        candidates = sorted(live_candidates(class_index), key=lambda candidate: (removed_placements(candidate), tie_breaker.random()))
+    else:
+        candidates = sorted(live_candidates(class_index), key=removed_placements)
+    if SOFT_PREFERENCES:
+        candidates.sort(key=is_unpreferred)
+    return candidates
+
+def is_unpreferred(candidate):
+    # E2 under SOFT_PREFERENCES: the placement is allowed but costs UNPREFERRED_SLOT_WEIGHT
+    teacher_code, time_code, _ = candidate
+    return time_code in teacher_unpreferred_slots[teacher_code]
+
+def backtracking(depth):
+    """
+    We TRY to assign each class(group, subject, type) to a
+    (TEACHER, TIMESLOT, ROOM) ensuring no overlapping constraints
+    depth = number of classes already placed (the class_list index for the static order)
+    """
+    global best_timetable, best_assignment, failure_conflict, search_aborted, deepest_assignment
+    search_stats['nodes'] += 1
+    if depth > len(deepest_assignment):
+        deepest_assignment = dict(class_assignment)
+    # base case: if we've processed all classes, success (R1) - even with no nodes left
+    if depth == len(class_list):
+        best_timetable = copy.deepcopy(current_timetable)
+        best_assignment = dict(class_assignment)
+        return 1
+    if (node_limit is not None and search_stats['nodes'] > node_limit
+            or should_stop is not None and should_stop()):
+        search_aborted = True
+        return None
+
+    class_index = select_next_class(depth)
+    cls = class_list[class_index]
+    subject_code = cls['subject_code']
+    group_code = cls['group_code']
+    class_type = cls['type']
+
+    conflict = set()  # placed classes that explain why the placements of this class fail (CBJ)
+    wipeout_culprits = {}  # class left without candidates by a placement -> class_culprits before the placement
+
+    # WE TRY each (TEACHER, TIMESLOT, ROOM) still possible for the class
+    # (teachers which can teach this subject and are elligible for courses (R8), rooms valid at the
+    # timeslot (R4, R5) - see compile_candidate_tables; R2, R3, R4.1, R6, E1, E2 - see live_candidates)
+    candidates = ordered_candidates(class_index)
+    if work_requested is not None:
+        # parallel search: the untried placements stay visible to split_work()
+        while open_choices and open_choices[-1][0] >= depth:
+            open_choices.pop()  # left behind by a backjump
+        if work_requested():
+            split_work()
+        choices = deque(candidates)
+        open_choices.append((depth, class_index, choices))
+        candidates = drain(choices)
+    for teacher_code, time_code, room_code in candidates:
+        if BACKJUMPING:
+            # this placement together with the current ones was already proven to have no solution
+            nogood = nogood_store.find(class_assignment, class_index, (teacher_code, time_code, room_code))
+            if nogood is not None:
+                conflict |= {other_index for other_index, _ in nogood if other_index != class_index}
+                continue
+
+        # attempt to assign
+        if add_to_timetable(teacher_code, time_code, group_code, room_code, subject_code, class_type, class_index):
+            record_assignment(class_index, teacher_code, time_code, room_code)
+            return_value = backtracking(depth + 1)
+            if return_value == 1:
+                return 1
+            # if not successful, remove assignment
+            forget_assignment(class_index)
+            remove_from_timetable(teacher_code, time_code)
+            if search_aborted:
+                return None  # out of nodes, nothing was proven - just unwind
+            search_stats['backtracks'] += 1
+            if BACKJUMPING:
+                if class_index not in failure_conflict:
+                    # this class has nothing to do with the failure below => jump back over it
+                    search_stats['backjumps'] += 1
+                    return None
+                conflict |= failure_conflict - {class_index}
+        elif BACKJUMPING and FORWARD_CHECKING:
+            # the placement left another class without candidates: blame what already blocked that class
+            # (computed once per class at this node), plus the teacher's classes if it used up his hours
+            if wiped_out_class not in wipeout_culprits:
+                wipeout_culprits[wiped_out_class] = class_culprits(wiped_out_class)
+            conflict |= wipeout_culprits[wiped_out_class]
+            conflict |= teacher_limit_culprits(teacher_code, time_code)
+
+    class_weights[class_index] += 1  # dead end (dom/wdeg)
+    if donated_depth is not None and depth <= donated_depth:
+        # some placements of this class (or of a class above) are tried by another worker =>
+        # no nogood, and the caller must not jump over anything
+        failure_conflict = set(class_assignment)
+    elif BACKJUMPING:
+        # placements that were never possible are explained by the classes blocking them
+        conflict |= class_culprits(class_index)
+        nogood_store.add((other_index, class_assignment[other_index]) for other_index in conflict)
+        failure_conflict = conflict
+
+def drain(choices):
+    while choices:
+        yield choices.popleft()
+
+def split_work():
+    """
+    Gives half of the untried placements of the shallowest open class (at least one) to give_work(),
+    as subproblems: the placements above that class + one of its placements.
+    """
+    global donated_depth
+    for depth, class_index, choices in open_choices:
+        if choices:
+            prefix = list(class_assignment.items())[:depth]
+            stolen = [choices.pop() for _ in range((len(choices) + 1) // 2)]
+            give_work([prefix + [(class_index, placement)] for placement in reversed(stolen)])
+            donated_depth = depth if donated_depth is None else min(donated_depth, depth)
+            return
+
+def reset_search_state(keep_learned=False):
+    """
+    Clears the partial timetable and every structure the search builds
+    (except the nogoods and the dom/wdeg weights if keep_learned, e.g. on a restart).
+    """
+    global current_timetable, teacher_schedule, group_schedule, group_busy, room_schedule
+    global daily_teacher_hours, class_assignment, class_weights, search_stats, candidate_blocks, live_count
+    global placed_at_time, placed_by_teacher, search_aborted, donated_depth, deepest_assignment
+
+    instrumentation.fold(metrics, search_stats)  # the counters of the run that ends here
+    current_timetable = {}
+    teacher_schedule = {}
+    group_schedule = {}
+    group_busy = new_group_busy()
+    room_schedule = {}
+    daily_teacher_hours = {}
+    class_assignment = {}
+    if not keep_learned:
+        class_weights = [0] * len(class_list)
+    search_stats = {'nodes': 0, 'backtracks': 0, 'backjumps': 0}
+    placed_at_time = {}
+    placed_by_teacher = {}
+    if not keep_learned:
+        nogood_store.clear()  # nogoods only hold for the restrictions they were found with
+    search_aborted = False
+    deepest_assignment = {}
+    open_choices.clear()
+    donated_depth = None
+
+    # forward checking: nothing is blocked yet, except teachers whose limits are already 0
+    # and, in a repair, every placement of a kept class but its kept one, and the placements of the other
+    # classes that take the teacher, the room or the group of a kept placement at its timeslot (R3, R4.1, R2 -
+    # whichever is placed first)
+    candidate_blocks = [0] * len(candidate_placements)
+    for class_index, placement in kept_placements.items():
+        teacher_code, time_code, room_code = placement
+        candidate_ids = class_candidate_ids[class_index]
+        candidate_blocks[candidate_ids.start:candidate_ids.stop] = [1] * len(candidate_ids)
+        if placement in candidate_placements[candidate_ids.start:candidate_ids.stop]:
+            candidate_blocks[candidate_placements.index(placement, candidate_ids.start, candidate_ids.stop)] = 0
+        for candidate_ids in (candidates_by_teacher_time.get((teacher_code, time_code), ()),
+                              candidates_by_room_time.get((room_code, time_code), ()),
+                              candidates_by_group_time.get((class_list[class_index]['group_code'], time_code), ())):
+            for candidate_id in candidate_ids:
+                if candidate_class[candidate_id] != class_index:
+                    candidate_blocks[candidate_id] += 1
+    # (the classes the search has to place count these, and the E2 placements compile_candidate_tables left out, as failures)
+    for rule, candidate_lists in (('E1', [ids for (teacher_code, _), ids in candidates_by_teacher_day.items()
+                                          if teacher_max_daily_hours[teacher_code] <= 0]),
+                                  ('R6', [ids for teacher_code, ids in candidates_by_teacher.items()
+                                          if teacher_max_hours[teacher_code] <= 0])):
+        for candidate_ids in candidate_lists:
+            for candidate_id in candidate_ids:
+                candidate_blocks[candidate_id] += 1
+                if candidate_blocks[candidate_id] == 1 and FORWARD_CHECKING and candidate_class[candidate_id] not in kept_placements:
+                    metrics['failures'][rule] += 1
+    if FORWARD_CHECKING:
+        metrics['failures']['E2'] += sum(count for class_index, count in enumerate(class_unpreferred_candidates)
+                                         if class_index not in kept_placements)
+    live_count = [0] * len(class_list)
+    for candidate_id, class_index in enumerate(candidate_class):
+        if not candidate_blocks[candidate_id]:
+            live_count[class_index] += 1
+
+reset_search_state()
+
+def solve_timetable():
+    """
+    Searches the timetable from scratch (with ENGINE) under SEARCH_TIME_BUDGET / SEARCH_NODE_BUDGET / RESTART_SCHEDULE
+    and sets best_timetable (the deepest partial timetable if a budget ran out). Returns the search_control result.
+    """
+    global best_timetable, best_assignment
+    if ENGINE != 'backtracking':
+        # an external solver already minimizes E2 under SOFT_PREFERENCES, no local search after it
+        result = mip_backend.solve_eng_main(sys.modules[__name__], ENGINE, time_limit=SEARCH_TIME_BUDGET)
+        best_assignment = result['assignment'] or {}
+    else:
+        result = search_control.solve_eng_main(
+            sys.modules[__name__], node_budget=SEARCH_NODE_BUDGET, time_budget=SEARCH_TIME_BUDGET,
+            restarts=RESTART_SCHEDULE, restart_base=RESTART_BASE,
+        )
+    best_timetable = result['timetable']
+    if result['status'] == 'solved' and SOFT_PREFERENCES and LOCAL_SEARCH and ENGINE == 'backtracking':
+        optimize_timetable()
+    if result['status'] == 'timeout':
+        print(f"Search stopped by its budget after {result['nodes']} nodes ({result['elapsed']:.1f} s): "
+              f"partial timetable with {result['placed']} of {result['total']} classes.")
+    elif result['status'] == 'infeasible':
+        print("No timetable satisfies the restrictions.")
+    return result
+
+def optimize_timetable():
+    """
+    Lowers the E2 penalty of best_assignment with local search (SOFT_PREFERENCES), best_timetable follows.
+    Returns the local_search.improve result.
+    """
+    global best_timetable, best_assignment
+    result = local_search.improve(local_search.eng_main_model(sys.modules[__name__]), best_assignment,
+                                  method=LOCAL_SEARCH, time_budget=LOCAL_SEARCH_TIME_BUDGET)
+    best_assignment = result['assignment']
+    best_timetable = timetable_of(best_assignment)
+    print(f"Local search ({LOCAL_SEARCH}): penalty {result['initial_penalty']} -> {result['penalty']} "
+          f"after {result['iterations']} iterations ({result['elapsed']:.1f} s).")
+    return result
+
+def changed_teachers(old_restrictions, new_restrictions):
+    """
+    Codes of the teachers whose max_daily_hours or unpreferred_timeslots differ between two extra_restrictions.
+    """
+    changed = set()
+    for key in ("max_daily_hours", "unpreferred_timeslots"):
+        old_values = old_restrictions.get(key, {})
+        new_values = new_restrictions.get(key, {})
+        for code in set(old_values) | set(new_values):
+            if old_values.get(code) != new_values.get(code):
+                changed.add(int(code))
+    return changed
+
+def broken_placements(previous_assignment, teacher_codes):
+    """
+    Classes of previous_assignment taught by one of teacher_codes that the current restrictions
+    no longer allow: an unpreferred timeslot (E2) or a day above the daily maximum (E1).
+    """
+    daily_hours = {}
+    for teacher_code, time_code, _ in previous_assignment.values():
+        key = (teacher_code, slot_day[time_code])
+        daily_hours[key] = daily_hours.get(key, 0) + 1
+    broken = set()
+    for class_index, (teacher_code, time_code, _) in previous_assignment.items():
+        if teacher_code not in teacher_codes:
+            continue
+        if (not SOFT_PREFERENCES and time_code in teacher_unpreferred_slots[teacher_code]
+                or daily_hours[(teacher_code, slot_day[time_code])] > teacher_max_daily_hours[teacher_code]):
+            broken.add(class_index)
+    return broken
+
+def repair_neighborhood(previous_assignment, class_indexes):
+    """
+    Placed classes sharing a day and the teacher or the group with one of class_indexes -
+    the first ones worth moving to make room for it.
+    """
+    neighborhood = set()
+    for class_index in class_indexes:
+        teacher_code, time_code, _ = previous_assignment[class_index]
+        day = slot_day[time_code]
+        group_code = class_list[class_index]['group_code']
+        for other_index, (other_teacher, other_time, _) in previous_assignment.items():
+            if slot_day[other_time] == day and (
+                    other_teacher == teacher_code or class_list[other_index]['group_code'] == group_code):
+                neighborhood.add(other_index)
+    return neighborhood
+
+def repair_timetable(previous_assignment, free_classes):
+    """
+    Re-solves only the free_classes of previous_assignment: every other class keeps its placement
+    (kept_placements - still placed in the usual search order, the R2 check depends on it), within
+    REPAIR_NODES_PER_PLACEMENT nodes per placement the free classes can take.
+    Returns 1 if a timetable was found (best_timetable / best_assignment are updated), None otherwise.
+    """
+    global node_limit, kept_placements
+    kept_placements = {class_index: placement for class_index, placement in previous_assignment.items()
+                       if class_index not in free_classes}
+    try:
+        reset_search_state()
+        unplaced = [class_index for class_index in range(len(class_list)) if class_index not in kept_placements]
+        print(f"Repairing {len(unplaced)} of {len(class_list)} classes...")
+        free_placements = sum(count_candidates(class_index) for class_index in unplaced)
+        node_limit = len(class_list) + int(REPAIR_NODES_PER_PLACEMENT * free_placements)
+        return 1 if backtracking(0) == 1 else None
+    finally:
+        node_limit = None
+        kept_placements = {}
+
+def timetable_of(assignment):
+    """
+    current_timetable layout of a (possibly partial) class_assignment.
+    """
+    timetable = {}
+    for class_index, (teacher_code, time_code, room_code) in assignment.items():
+        cls = class_list[class_index]
+        timetable.setdefault(teacher_code, {})[time_code] = (cls['group_code'], room_code, cls['subject_code'], cls['type'])
+    return timetable
 
 def transform_data(best_timetable):
     """
@@ -275,27 +1059,100 @@ def transform_data(best_timetable):
 
     return timetable_data
 
-# Initial run of the scheduling
-backtracking(0)
-a = 1
-transformed_timetable = transform_data(best_timetable)
-
 app = Flask(__name__)
+service = None  # job_service.JobService of the running app (started in __main__)
+restrictions_lock = threading.Lock()  # extra_restrictions = the restrictions of the last job submitted
+
+def published_snapshot():
+    # the last published timetable (see scheduling_job), None until the first job publishes one
+    return service.snapshot if service is not None else None
+
+def render_pages(transformed_timetable):
+    """
+    Every page of a timetable, pre-rendered (see page_cache.py): 'index' and one per group code.
+    """
+    pages = {'index': ('eng_index.html', {'groups': transformed_timetable.keys()})}
+    for group_code, data in transformed_timetable.items():
+        pages[group_code] = ('eng_timetable.html', {'group': group_code, 'timetable_data': data})
+    return page_cache.prerender(app, pages)
 
 @app.route('/')
 def index():
-    global transformed_timetable
-    groups = transformed_timetable.keys()
-    return render_template('eng_index.html', groups=groups)
+    snapshot = published_snapshot()
+    if snapshot is None:
+        return render_template('eng_index.html', groups=[])
+    return page_cache.cached_response(snapshot['pages']['index'])
 
 @app.route('/timetable/<int:group_code>')
 def timetable(group_code):
-    global transformed_timetable
-    if group_code not in transformed_timetable:
+    snapshot = published_snapshot()
+    if snapshot is None or group_code not in snapshot['pages']:
         return "Timetable for this group is not available.", 404
+    return page_cache.cached_response(snapshot['pages'][group_code])
+
+@app.route('/export')
+def export():
+    """
+    Every group, teacher and room in one response: ?format=jsonl (default, one JSON line each)
+    or ?format=ics (zip of their calendars), see timetable_export.py.
+    """
+    export_format = request.args.get('format', 'jsonl')
+    if export_format not in ('jsonl', 'ics'):
+        return jsonify(error='format must be jsonl or ics'), 400
+    snapshot = published_snapshot()
+    if snapshot is None:
+        return jsonify(error='no timetable published yet'), 503
+    if export_format == 'jsonl':
+        return page_cache.cached_response(snapshot['exports']['jsonl'], mimetype='application/jsonl')
+    response = page_cache.cached_response(snapshot['exports']['ics'], mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename=timetable-calendars.zip'
+    return response
+
+@app.route('/export/<view>/<int:code>.ics')
+def export_calendar(view, code):
+    # one calendar, e.g. /export/group/101.ics, /export/teacher/2.ics, /export/room/1.ics
+    snapshot = published_snapshot()
+    if snapshot is None or view not in timetable_export.VIEWS or code not in snapshot['views'][view]:
+        return "Calendar not available.", 404
+    return Response(timetable_export.calendar(sys.modules[__name__], view, code, snapshot['views'][view][code]),
+                    mimetype='text/calendar')
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Submits a restriction change: {"restrictions": {"unpreferred_timeslots": {...}, "max_daily_hours": {...}}}
+    (the given teachers get these values, the others keep theirs) or {"prompt": "..."} (see
+    parse_prompt_and_add_restrictions), with "profile": true to run the job under the sampling profiler
+    (its job record gets the top functions). Answers 202 with the job id, 429 when too many jobs are pending.
+    """
+    if service is None:
+        return jsonify(error='no job service running'), 503
+    body = request.get_json(silent=True) or {}
+    if 'restrictions' not in body and 'prompt' not in body:
+        return jsonify(error='expected "restrictions" or "prompt"'), 400
+    profile = bool(body.get('profile', False))
+    try:
+        if 'prompt' in body:
+            job_id = submit_restriction_change(prompt=body['prompt'], profile=profile)
+        else:
+            job_id = submit_restriction_change(changes=body['restrictions'], profile=profile)
+    except job_service.JobQueueFull as error:
+        return jsonify(error=str(error)), 429
+    return jsonify(job=job_id, status=f'/jobs/{job_id}'), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = service.status(job_id) if service is not None else None
+    if job is None:
+        return jsonify(error='unknown job'), 404
+    return jsonify(job)
 
-    data = transformed_timetable[group_code]
-    return render_template('eng_timetable.html', group=group_code, timetable_data=data)
+@app.route('/metrics')
+def metrics_route():
+    # Prometheus scrape target: the search counters of every job (see instrumentation.py)
+    records, snapshot_version = (service.records(), service.snapshot_version) if service is not None else ([], 0)
+    return Response(instrumentation.prometheus_text('eng_main', records, snapshot_version),
+                    mimetype='text/plain; version=0.0.4')
 
 # ------------------------------------------------------------------------------------
 # NEW CODE: prompt in console to add restrictions + re-generate timetable
@@ -363,41 +1220,116 @@ def parse_prompt_and_add_restrictions(line, extra_restrictions):
     return json.loads(completion.choices[0].message.content) 
     # You could add other patterns here for different restriction types
 
-def rerun_scheduling():
+def reschedule(previous_restrictions=None):
     """
-    Clears existing schedules and re-runs the backtracking with updated restrictions.
+    Re-runs the scheduling with updated restrictions. Given the restrictions the current timetable
+    was built with (and INCREMENTAL_RESCHEDULING), only the placements the change broke are re-solved,
+    otherwise (or if that repair fails) everything is cleared and the backtracking starts from scratch.
+    Returns True if a complete timetable was found (best_timetable / best_assignment).
     """
-    global best_timetable, current_timetable, teacher_schedule
-    global group_schedule, room_schedule, daily_teacher_hours, transformed_timetable
+    global best_timetable
 
-    # Clear existing global structures
-    current_timetable = {}
-    teacher_schedule = {}
-    group_schedule = {}
-    room_schedule = {}
-    daily_teacher_hours = {}
-    best_timetable = None
+    compile_candidate_tables()
+    if INCREMENTAL_RESCHEDULING and previous_restrictions is not None and best_assignment:
+        previous_assignment = best_assignment
+        broken = broken_placements(previous_assignment, changed_teachers(previous_restrictions, extra_restrictions))
+        best_timetable = None
+        if repair_timetable(previous_assignment, broken | repair_neighborhood(previous_assignment, broken)) != 1:
+            print("Repair failed, solving from scratch...")
+            return solve_timetable()['status'] == 'solved'
+        if SOFT_PREFERENCES and LOCAL_SEARCH:
+            optimize_timetable()
+        return True
+    # Re-run backtracking from scratch (solve_timetable clears the existing global structures)
+    return solve_timetable()['status'] == 'solved'
 
-    # Re-run backtracking
-    backtracking(0)
-    # Re-transform
+def scheduling_job(restrictions, previous_restrictions=None, previous_assignment=None, profile=False):
+    """
+    Runs in a job_service worker: the timetable for restrictions, repaired from the previous published
+    one when given (under the sampling profiler if profile). Returns (result, snapshot to publish or None).
+    """
+    global extra_restrictions, best_assignment
+    extra_restrictions = restrictions
+    best_assignment = previous_assignment or {}
+    instrumentation.reset(metrics, search_stats)
+    profile_report = {}
+    job_service.watch(lambda: {
+        'placed': len(class_assignment), 'total': len(class_list), 'nodes': search_stats['nodes'],
+        'metrics': instrumentation.sample(metrics, search_stats), **profile_report,
+    })
+    if profile:
+        with instrumentation.SamplingProfiler() as profiler:
+            solved = reschedule(previous_restrictions)
+        os.makedirs(PROFILE_DIRECTORY, exist_ok=True)
+        path = os.path.join(PROFILE_DIRECTORY, f'job-{job_service.current_job_id}.folded')
+        with open(path, 'w') as file:
+            file.write(profiler.folded())
+        profile_report['profile'] = {'samples': profiler.samples(), 'top': profiler.top(), 'folded': path}
+    else:
+        solved = reschedule(previous_restrictions)
+    if not solved:
+        return 'no timetable', None  # infeasible, or a budget ran out - the last good timetable stays
     transformed_timetable = transform_data(best_timetable)
-    print("Re-run scheduling complete! Refresh your browser to see updates.")
+    module = sys.modules[__name__]
+    views = timetable_export.build_views(module, best_timetable)
+    snapshot = {
+        'restrictions': restrictions,
+        'assignment': best_assignment,
+        'timetable': best_timetable,
+        'transformed': transformed_timetable,
+        'pages': render_pages(transformed_timetable),  # rendered here, not by every request
+        'views': views,
+        'exports': {
+            'jsonl': page_cache.prepare(''.join(timetable_export.jsonl_lines(module, views)).encode('utf-8')),
+            'ics': page_cache.prepare(timetable_export.ics_archive(module, views)),
+        },
+    }
+    return 'solved', snapshot
 
-def console_input_thread():
+def submit_restriction_change(changes=None, prompt=None, description=None, profile=False):
+    """
+    Applies a restriction change (per teacher values, or a prompt) to the restrictions of the last job
+    submitted and queues the scheduling job (profiled if profile). Returns the job id.
+    """
     global extra_restrictions
+    with restrictions_lock:
+        if prompt is not None:
+            updated_restrictions = parse_prompt_and_add_restrictions(prompt, extra_restrictions)
+        else:
+            updated_restrictions = copy.deepcopy(extra_restrictions)
+            for key, values in changes.items():
+                updated_restrictions.setdefault(key, {}).update(values)
+        snapshot = service.snapshot  # what the repair starts from
+        if snapshot is None:
+            job_id = service.submit(scheduling_job, updated_restrictions, None, None, profile,
+                                    description=description or prompt)
+        else:
+            job_id = service.submit(scheduling_job, updated_restrictions, snapshot['restrictions'],
+                                    snapshot['assignment'], profile, description=description or prompt)
+        extra_restrictions = copy.deepcopy(updated_restrictions)
+    return job_id
+
+def console_input_thread():
     while True:
         line = input("\nEnter new restriction (or press Ctrl+C to quit): ")
         if not line.strip():
             continue
-        updated_restrictions = parse_prompt_and_add_restrictions(line, extra_restrictions)
-        extra_restrictions = copy.deepcopy(updated_restrictions)
-        rerun_scheduling()
+        try:
+            job_id = submit_restriction_change(prompt=line)
+        except job_service.JobQueueFull as error:
+            print(f"Not submitted: {error}.")
+            continue
+        print(f"Re-scheduling in the background (job {job_id}), the timetable is swapped in once it is ready.")
 
-# Start a daemon thread to listen for new console input
-threading.Thread(target=console_input_thread, daemon=True).start()
+if __name__ == '__main__':
+    # Initial run of the scheduling, in the background - the server starts right away
+    service = job_service.JobService(workers=JOB_WORKERS, max_pending=MAX_PENDING_JOBS)
+    service.submit(scheduling_job, copy.deepcopy(extra_restrictions), description='initial timetable')
 
-# ------------------------------------------------------------------------------------
-# Run the Flask app
-# ------------------------------------------------------------------------------------
-app.run(debug=False,use_reloader=False)
+    # Start a daemon thread to listen for new console input
+    threading.Thread(target=console_input_thread, daemon=True).start()
+
+    # ------------------------------------------------------------------------------------
+    # Run the Flask app
+    # ------------------------------------------------------------------------------------
+    app.run(debug=False,use_reloader=False)
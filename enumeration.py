@@ -0,0 +1,164 @@
+"""
+Solution enumeration for eng_main.py and ac3.py: generators that walk the same search tree as their
+backtracking() but yield every timetable they reach instead of stopping at the first one.
+
+A solution is an immutable snapshot - a tuple with the (teacher, timeslot, room) of every class, indexed
+by class_index - built from the current assignment when the search reaches a leaf; the placements are
+the solver's own tuples, nothing else is copied. dict(enumerate(solution)) is the usual class_assignment
+(eng_main.timetable_of / ac3.format_solution turn it into a timetable).
+
+symmetry:
+    None    - every timetable counts
+    'rooms' - timetables that only swap identical rooms (same possible timeslots, same course flag - the room
+              classes of symmetry.py) count as one: at a node only the first free room of each kind is tried for a (teacher, timeslot),
+              so the swapped timetables are never even searched
+    a callable(solution) -> hashable key - solutions with a key already yielded are skipped
+
+The generators run on the solver's search state (like search_control.py, the module is passed in): do not
+start another search of the same module before the generator is exhausted or closed; the state is reset /
+rolled back when it ends. Enumeration is chronological (no backjumps, no nogoods - a subtree with a
+solution in it proves nothing about its siblings) and ignores should_stop / tie_breaker.
+
+usage: python enumeration.py [eng_main|ac3] [--limit 5] [--symmetry rooms]
+"""
+import argparse
+import contextlib
+import sys
+import time
+
+import symmetry as symmetry_classes
+
+
+def distinct(solutions, limit=None, key=None):
+    """
+    The first `limit` solutions (all with limit=None), skipping those with a key already seen.
+    """
+    seen = set()
+    found = 0
+    if limit is not None and limit <= 0:
+        return
+    for solution in solutions:
+        if key is not None:
+            solution_key = key(solution)
+            if solution_key in seen:
+                continue
+            seen.add(solution_key)
+        found += 1
+        yield solution
+        if found == limit:
+            return  # before the search looks for one more
+
+
+def eng_main_solutions(eng_main, limit=None, symmetry=None):
+    """
+    Timetables of eng_main (MRV / value ordering and forward checking as configured), see the module docstring.
+    """
+    room_kind = symmetry_classes.room_classes(eng_main.model) if symmetry == 'rooms' else None
+    class_count = len(eng_main.class_list)
+
+    def search(depth):
+        eng_main.search_stats['nodes'] += 1
+        if depth == class_count:
+            yield tuple(eng_main.class_assignment[class_index] for class_index in range(class_count))
+            return
+        class_index = eng_main.select_next_class(depth)
+        cls = eng_main.class_list[class_index]
+        tried = set()  # (teacher, timeslot, room kind) already searched at this node
+        # the candidates are listed before the first placement changes what live_candidates() sees
+        for teacher_code, time_code, room_code in list(eng_main.ordered_candidates(class_index, break_symmetry=False)):
+            if room_kind is not None:
+                kind = (teacher_code, time_code, room_kind[room_code])
+                if kind in tried:
+                    continue
+            if not eng_main.add_to_timetable(teacher_code, time_code, cls['group_code'], room_code,
+                                             cls['subject_code'], cls['type'], class_index):
+                continue
+            if room_kind is not None:
+                tried.add(kind)
+            eng_main.record_assignment(class_index, teacher_code, time_code, room_code)
+            yield from search(depth + 1)
+            eng_main.forget_assignment(class_index)
+            eng_main.remove_from_timetable(teacher_code, time_code)
+            eng_main.search_stats['backtracks'] += 1
+
+    eng_main.reset_search_state()
+    try:
+        yield from distinct(search(0), limit, symmetry if callable(symmetry) else None)
+    finally:
+        eng_main.reset_search_state()
+
+
+def ac3_solutions(ac3, limit=None, symmetry=None):
+    """
+    Timetables of ac3 on the preprocessed domains (MRV, MAC as configured), see the module docstring.
+    """
+    room_kind = symmetry_classes.room_classes(ac3.model) if symmetry == 'rooms' else None
+    variable_domains = ac3.variable_domains
+    class_count = len(ac3.class_list)
+    assignment = {}
+
+    def search():
+        ac3.search_stats['nodes'] += 1
+        if len(assignment) == class_count:
+            yield tuple(assignment[Xi] for Xi in range(class_count))
+            return
+        Xi = min((Xk for Xk in range(class_count) if Xk not in assignment), key=lambda Xk: len(variable_domains[Xk]))
+        tried = set()
+        for value in variable_domains[Xi]:
+            prof, time_index, room = value
+            if room_kind is not None:
+                kind = (prof, time_index, room_kind[room])
+                if kind in tried:
+                    continue
+            mark = len(ac3.domain_trail)
+            conflict_mark = len(ac3.conflict_trail)
+            assignment[Xi] = value
+            ac3.domain_trail.append((Xi, variable_domains[Xi]))
+            variable_domains[Xi] = [value]
+            if ac3.MAINTAIN_ARC_CONSISTENCY:
+                consistent = ac3.AC3(variable_domains, ac3.domain_trail, Xi)
+            else:
+                consistent = all(ac3.is_consistent(value, assignment[Xk], ac3.model.relations[Xi][Xk])
+                                 for Xk in ac3.Neighbors[Xi] if Xk in assignment)
+            if consistent:
+                if room_kind is not None:
+                    tried.add(kind)
+                yield from search()
+            ac3.undo_trail(variable_domains, ac3.domain_trail, mark)
+            ac3.undo_conflicts(conflict_mark)
+            del assignment[Xi]
+
+    ac3.reset_search_state()
+    mark = len(ac3.domain_trail)
+    conflict_mark = len(ac3.conflict_trail)
+    try:
+        yield from distinct(search(), limit, symmetry if callable(symmetry) else None)
+    finally:
+        # closed in the middle of the search => back to the preprocessed domains
+        ac3.undo_trail(variable_domains, ac3.domain_trail, mark)
+        ac3.undo_conflicts(conflict_mark)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('solver', nargs='?', default='eng_main', choices=['eng_main', 'ac3'])
+    parser.add_argument('--limit', type=int, default=5, help='number of timetables')
+    parser.add_argument('--symmetry', default=None, choices=['rooms'])
+    args = parser.parse_args()
+
+    from portfolio import load_solver
+    with contextlib.redirect_stdout(sys.stderr):  # ac3 prints its preprocessed domains on import
+        solver = load_solver(args.solver)
+    solutions = eng_main_solutions if args.solver == 'eng_main' else ac3_solutions
+    start = time.perf_counter()
+    first = None
+    for number, solution in enumerate(solutions(solver, args.limit, args.symmetry), 1):
+        first = first or solution
+        # how many classes moved compared to the first timetable
+        changed = sum(1 for placement, first_placement in zip(solution, first) if placement != first_placement)
+        print(f"timetable {number}: {changed} of {len(solution)} classes placed differently than in timetable 1 "
+              f"({time.perf_counter() - start:.2f} s, {solver.search_stats['nodes']} nodes)")
+
+
+if __name__ == '__main__':
+    main()
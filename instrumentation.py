@@ -0,0 +1,248 @@
+"""
+Search instrumentation for eng_main.py and ac3.py: the counters both solvers keep in a module-level
+`metrics` dict (new_metrics), their Prometheus text exposition for the /metrics route of the Flask apps,
+and an opt-in sampling profiler for a single solve.
+
+    search   - nodes, backtracks, backjumps (+ revisions: arcs revised by AC3() in ac3's search);
+               search_stats is folded in on every reset_search_state(), sample() adds the current run
+    failures - eng_main: placements rejected by each rule, wherever they are filtered out - tried by add_to_timetable
+               (R2 / R4.1 / E1 / E2), skipped by live_candidates or blocked by a forward check (R2 / R3 / R4.1 / R6 / E1),
+               or never searched (E2 placements left out of the candidate tables, R6 / E1 for a limit of 0)
+    seconds, calls - time spent in / calls of add_to_timetable (eng_main) and AC3 (ac3)
+    queue    - ac3: arcs put on the AC-3 queue and the longest queue
+
+The counters are per job: scheduling_job resets them and its progress samples carry them (see
+job_service.watch), the app sums the last sample of every job - so the totals only ever grow.
+
+usage: python instrumentation.py [eng_main|ac3] [--interval 0.005] [--folded FILE] [--top 25]
+       (one solve under the sampling profiler: the functions the search spends its time in, and the counters)
+"""
+import argparse
+import collections
+import contextlib
+import functools
+import os
+import sys
+import threading
+import time
+
+FAILURE_RULES = ('R2', 'R3', 'R4.1', 'R6', 'E1', 'E2')
+PROFILE_INTERVAL = 0.005  # seconds between two stack samples
+
+
+def new_metrics(functions=(), rules=()):
+    return {
+        'search': {'nodes': 0, 'backtracks': 0, 'backjumps': 0, 'revisions': 0},
+        'failures': {rule: 0 for rule in rules},
+        'seconds': {function: 0.0 for function in functions},
+        'calls': {function: 0 for function in functions},
+        'queue': {'arcs_queued': 0, 'longest': 0},
+    }
+
+
+def reset(metrics, search_stats):
+    # in place: the timed() wrappers and the solver hold on to these dicts
+    for group in metrics.values():
+        for key in group:
+            group[key] = 0
+    for key in search_stats:
+        search_stats[key] = 0
+
+
+def fold(metrics, search_stats):
+    # the counters of a finished search run (called before reset_search_state clears them)
+    for key, value in search_stats.items():
+        metrics['search'][key] = metrics['search'].get(key, 0) + value
+
+
+def sample(metrics, search_stats):
+    """
+    A copy of the counters, the search run in progress included.
+    """
+    copied = {name: dict(group) for name, group in metrics.items()}
+    fold(copied, search_stats)
+    return copied
+
+
+def timed(metrics, function_name):
+    """
+    Decorator: adds the time spent in the function to metrics['seconds'] and counts its calls.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                metrics['seconds'][function_name] += time.perf_counter() - start
+                metrics['calls'][function_name] += 1
+        return wrapper
+    return decorate
+
+
+def merge(total, metrics):
+    for name, group in metrics.items():
+        for key, value in group.items():
+            if name == 'queue' and key == 'longest':
+                total[name][key] = max(total[name].get(key, 0), value)
+            else:
+                total[name][key] = total[name].get(key, 0) + value
+
+
+def label_text(labels):
+    return ','.join(f'{key}="{value}"' for key, value in labels.items())
+
+
+def prometheus_text(solver_name, jobs, published_job=0):
+    """
+    Prometheus text exposition (version 0.0.4) of the counters of all the jobs (job_service records)
+    of a solver, plus the jobs per state and the sequence of the job whose timetable is published.
+    """
+    total = new_metrics()
+    states = collections.Counter()
+    for job in jobs:
+        states[job['state']] += 1
+        if 'metrics' in job['progress']:
+            merge(total, job['progress']['metrics'])
+
+    solver = {'solver': solver_name}
+    families = [
+        ('timetable_search_nodes_total', 'counter', 'Search nodes visited.',
+         [(solver, total['search']['nodes'])]),
+        ('timetable_search_backtracks_total', 'counter', 'Placements undone after a failed subtree.',
+         [(solver, total['search']['backtracks'])]),
+        ('timetable_search_backjumps_total', 'counter', 'Classes jumped over by conflict-directed backjumping.',
+         [(solver, total['search']['backjumps'])]),
+        ('timetable_constraint_failures_total', 'counter', 'Placements rejected, by the rule that rejected them.',
+         [(dict(solver, rule=rule), count) for rule, count in sorted(total['failures'].items())]),
+        ('timetable_function_seconds_total', 'counter', 'Time spent in the instrumented search functions.',
+         [(dict(solver, function=function), round(seconds, 6)) for function, seconds in sorted(total['seconds'].items())]),
+        ('timetable_function_calls_total', 'counter', 'Calls of the instrumented search functions.',
+         [(dict(solver, function=function), calls) for function, calls in sorted(total['calls'].items())]),
+        ('timetable_ac3_revisions_total', 'counter', 'Arcs revised by AC-3 during the search.',
+         [(solver, total['search']['revisions'])]),
+        ('timetable_ac3_arcs_queued_total', 'counter', 'Arcs put on the AC-3 queue during the search.',
+         [(solver, total['queue']['arcs_queued'])]),
+        ('timetable_ac3_queue_length_max', 'gauge', 'Longest AC-3 queue seen.',
+         [(solver, total['queue']['longest'])]),
+        ('timetable_jobs', 'gauge', 'Scheduling jobs by state.',
+         [(dict(solver, state=state), states[state]) for state in ('queued', 'running', 'done', 'failed')]),
+        ('timetable_published_job', 'gauge', 'Sequence number of the job whose timetable is served (0: none).',
+         [(solver, published_job)]),
+    ]
+    lines = []
+    for name, kind, help_text, samples in families:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines += [f'{name}{{{label_text(labels)}}} {value}' for labels, value in samples]
+    return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of one thread (the caller's by default) every `interval` seconds from a
+    helper thread - a statistical profile, with far less overhead than cProfile on the hot search loops.
+        with SamplingProfiler() as profiler:
+            solve()
+        print(profiler.report())
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL, thread_id=None):
+        self.interval = interval
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.stacks = collections.Counter()  # (outermost frame, ..., innermost frame) -> samples
+        self.stopped = threading.Event()
+        self.sampler = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self.stopped.clear()
+        self.sampler = threading.Thread(target=self.run, daemon=True)
+        self.sampler.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.sampler.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            if self.stopped.is_set():
+                break  # the thread is already in stop()
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def folded(self):
+        """
+        The stacks in the folded format of flamegraph.pl / speedscope: "outer;...;inner samples" per line.
+        """
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, limit=25):
+        """
+        [(function, self samples, total samples)] - the functions seen the most, innermost (self) first.
+        """
+        own = collections.Counter()
+        total = collections.Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for function in set(stack):
+                total[function] += count
+        ranked = sorted(total, key=lambda function: (own[function], total[function]), reverse=True)
+        return [(function, own[function], total[function]) for function in ranked[:limit]]
+
+    def report(self, limit=25):
+        samples = max(self.samples(), 1)
+        lines = [f"{self.samples()} samples, every {self.interval * 1000:g} ms",
+                 f"{'self %':>7} {'total %':>8}  function"]
+        for function, own, total in self.top(limit):
+            lines.append(f"{100 * own / samples:>7.1f} {100 * total / samples:>8.1f}  {function}")
+        return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('solver', nargs='?', default='eng_main', choices=['eng_main', 'ac3'])
+    parser.add_argument('--interval', type=float, default=PROFILE_INTERVAL, help='seconds between two samples')
+    parser.add_argument('--folded', default=None, help='also write the folded stacks (flame graph input) to this file')
+    parser.add_argument('--top', type=int, default=25, help='functions listed')
+    args = parser.parse_args()
+    folded_path = None if args.folded is None else os.path.abspath(args.folded)
+
+    from portfolio import load_solver
+    import search_control
+    with contextlib.redirect_stdout(sys.stderr):  # ac3 prints its preprocessed domains on import
+        solver = load_solver(args.solver)
+    solve = search_control.solve_eng_main if args.solver == 'eng_main' else search_control.solve_ac3
+    reset(solver.metrics, solver.search_stats)
+    with SamplingProfiler(args.interval) as profiler:
+        result = solve(solver)
+    print(f"{result['status']}: {result['nodes']} nodes in {result['elapsed']:.2f} s")
+    print(profiler.report(args.top))
+    counters = sample(solver.metrics, solver.search_stats)
+    for name, group in counters.items():
+        if group:
+            print(f"{name}: " + ', '.join(f'{key} {round(value, 4)}' for key, value in group.items()))
+    if folded_path is not None:
+        with open(folded_path, 'w') as file:
+            file.write(profiler.folded())
+        print(f"folded stacks written to {folded_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Background scheduling jobs for the Flask apps of eng_main.py and ac3.py: the solver runs in a bounded pool of
+forked worker processes while the web server keeps answering with the last published timetable.
+
+Every job gets an id and goes queued -> running -> done / failed; its record (see JobService.status) holds
+the progress the worker reports while it searches. The result of a job is a snapshot - a dict the app
+builds (timetable, the restrictions it was built with, ...) that is published by swapping one reference, so
+a request reads either the old snapshot or the new one, never a half-updated timetable. A job that finishes
+after a job submitted later than it does not replace the newer snapshot.
+
+Workers are forked from the app process, so a job function sees the problem the solver module already
+loaded (the candidate tables / preprocessed domains); it must get everything else as arguments, since a
+worker may have been forked long before the job was submitted.
+"""
+import concurrent.futures
+import itertools
+import multiprocessing
+import threading
+import time
+
+PROGRESS_INTERVAL = 0.5  # seconds between two progress reports of a running job
+
+# set in every worker process by init_worker
+progress_queue = None
+current_job_id = None
+job_finished = None
+job_sample = None  # the sample() of the running job, reported once more when it returns
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def init_worker(queue):
+    global progress_queue
+    progress_queue = queue
+
+
+def watch(sample):
+    """
+    Called by a job function in its worker: sample() (a dict) is reported as the progress of the job
+    every PROGRESS_INTERVAL seconds until the job returns, and one last time when it returns.
+    """
+    global job_sample
+    job_id, finished = current_job_id, job_finished
+    job_sample = sample
+
+    def report():
+        while not finished.wait(PROGRESS_INTERVAL):
+            progress_queue.put((job_id, sample()))
+    threading.Thread(target=report, daemon=True).start()
+
+
+def execute(job_id, function, args):
+    # runs in a worker
+    global current_job_id, job_finished, job_sample
+    current_job_id, job_finished, job_sample = job_id, threading.Event(), None
+    progress_queue.put((job_id, {'started': time.time()}))
+    try:
+        return function(*args)
+    finally:
+        job_finished.set()
+        if job_sample is not None:
+            progress_queue.put((job_id, job_sample()))  # the final counters, even if the job failed
+
+
+class JobService:
+    def __init__(self, workers=1, max_pending=4, snapshot=None):
+        """
+        workers - worker processes; max_pending - jobs queued or running at most (submit raises JobQueueFull)
+        snapshot - what is served until the first job publishes one (None: nothing yet)
+        """
+        self.max_pending = max_pending
+        self.snapshot = snapshot
+        self.snapshot_version = 0  # sequence number of the job that published the snapshot
+        self.jobs = {}  # job_id -> record
+        self.lock = threading.Lock()
+        self.sequence = itertools.count(1)
+        self.workers = workers
+        self.context = multiprocessing.get_context('fork')
+        self.progress = self.context.Queue()
+        self.executor = self.new_executor()
+        threading.Thread(target=self.read_progress, daemon=True).start()
+
+    def new_executor(self):
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=self.context, initializer=init_worker, initargs=(self.progress,))
+
+    def pending(self):
+        return sum(1 for job in self.jobs.values() if job['state'] in ('queued', 'running'))
+
+    def submit(self, function, *args, description=None):
+        """
+        Queues function(*args), a module-level function that returns (result, snapshot): a short outcome
+        ('solved', 'infeasible', ...) and the snapshot to publish or None. Returns the job id.
+        A broken pool (a worker died) is replaced and the job submitted again; if the job still cannot be
+        submitted, its record is failed right away (it does not stay queued and count as pending).
+        """
+        with self.lock:
+            if self.pending() >= self.max_pending:
+                raise JobQueueFull(f"{self.max_pending} jobs are already queued or running")
+            sequence = next(self.sequence)
+            job_id = f"{sequence:06d}"
+            self.jobs[job_id] = {
+                'id': job_id, 'sequence': sequence, 'description': description, 'state': 'queued',
+                'submitted': time.time(), 'started': None, 'finished': None, 'progress': {}, 'result': None,
+                'error': None, 'published': False,
+            }
+        try:
+            try:
+                future = self.executor.submit(execute, job_id, function, args)
+            except concurrent.futures.process.BrokenProcessPool:
+                self.replace_executor()
+                future = self.executor.submit(execute, job_id, function, args)
+        except Exception as error:
+            with self.lock:
+                job = self.jobs[job_id]
+                job['state'], job['error'], job['finished'] = 'failed', repr(error), time.time()
+            return job_id
+        future.add_done_callback(lambda future: self.finish(job_id, future))
+        return job_id
+
+    def replace_executor(self):
+        with self.lock:
+            broken, self.executor = self.executor, self.new_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def read_progress(self):
+        while True:
+            job_id, progress = self.progress.get()
+            with self.lock:
+                job = self.jobs.get(job_id)
+                if job is None:
+                    continue
+                if 'started' in progress:
+                    if job['state'] == 'queued':
+                        job['state'], job['started'] = 'running', progress['started']
+                else:
+                    job['progress'] = progress  # the last sample may arrive after the job is done
+
+    def finish(self, job_id, future):
+        with self.lock:
+            job = self.jobs[job_id]
+            job['finished'] = time.time()
+            try:
+                job['result'], snapshot = future.result()
+            except Exception as error:
+                job['state'], job['error'] = 'failed', repr(error)
+                return
+            job['state'] = 'done'
+            if snapshot is not None and job['sequence'] > self.snapshot_version:
+                self.snapshot, self.snapshot_version = snapshot, job['sequence']
+                job['published'] = True
+
+    def status(self, job_id):
+        """
+        A copy of the job record (state, progress, result, times, error, published), None for an unknown id.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return None if job is None else dict(job, progress=dict(job['progress']))
+
+    def records(self):
+        """
+        Copies of all the job records, oldest first (e.g. for the /metrics route).
+        """
+        with self.lock:
+            return [dict(job, progress=dict(job['progress'])) for job in self.jobs.values()]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,341 @@
+"""
+Soft-constraint optimization: starts from a feasible timetable found by the backtracking and lowers its
+weighted preference penalty with tabu search or simulated annealing, over two neighborhoods:
+    move - one class gets another (teacher, timeslot, room) of its candidates
+    swap - two classes exchange their (timeslot, room)
+Every timetable visited satisfies the hard constraints of the solver it came from.
+
+The hard constraints are kept as occupancy counters over resources ("teacher 3 at timeslot 5",
+"group 101 at timeslot 5", ...), so checking and scoring a move only touches the handful of counters of
+the placements involved - O(1) per move, whatever the size of the timetable.
+
+A model (see eng_main_model / ac3_model) describes the problem to the engine:
+    candidates[c] - placements (teacher, timeslot, room) class c can ever get (the static checks passed)
+    uses(c, placement) - resources the placement occupies
+    needs(c, placement) - resources no other class may occupy for the placement to be valid
+    limits(c, placement) - (counter, maximum) pairs the placement counts towards (weekly / daily hours)
+    precedes[c] - (other, c_first) pairs: if c_first c must be at an earlier timeslot than other, else later
+    penalty(c, placement) - weight of the preferences the placement breaks (0 = none)
+"""
+import math
+import random
+import time
+
+import problem_model
+
+TABU_TENURE = (5, 15)  # a class can't go back to a placement it just left for a random number of iterations in this range
+FOCUS_CLASSES = 3  # penalized classes whose every move (and a sample of swaps) tabu search looks at per iteration
+SAMPLED_MOVES = 200  # moves / swaps of random classes looked at per iteration, on top of the penalized classes
+# simulated annealing cools geometrically from the start to the end temperature over the time budget
+ANNEALING_START_TEMPERATURE = 2.0
+ANNEALING_END_TEMPERATURE = 0.05
+
+
+def eng_main_model(eng_main):
+    """
+    eng_main.py: R2 (group_conflicts), R3, R4.1 as resources, R6 / E1 as limits, E2 (unpreferred timeslots)
+    as a penalty of UNPREFERRED_SLOT_WEIGHT per class.
+    """
+    class_list = eng_main.class_list
+    candidates = []
+    for class_index in range(len(class_list)):
+        candidates.append([
+            (teacher_code, time_code, room_code)
+            for teacher_code in eng_main.class_teachers[class_index]
+            for time_code, room_codes in eng_main.class_slots[class_index]
+            for room_code in room_codes
+        ])
+
+    def uses(class_index, placement):
+        teacher_code, time_code, room_code = placement
+        group_code = class_list[class_index]['group_code']
+        keys = [('group', code, time_code) for code in eng_main.group_conflicts[group_code]]
+        keys.append(('teacher', teacher_code, time_code))
+        keys.append(('room', room_code, time_code))
+        return keys
+
+    def needs(class_index, placement):
+        # like add_to_timetable: the group itself must be free (a main group is busy when a subgroup is)
+        teacher_code, time_code, room_code = placement
+        return [('group', class_list[class_index]['group_code'], time_code),
+                ('teacher', teacher_code, time_code), ('room', room_code, time_code)]
+
+    def limits(class_index, placement):
+        teacher_code, time_code, _ = placement
+        return [(('hours', teacher_code), eng_main.teacher_max_hours[teacher_code]),
+                (('daily', teacher_code, eng_main.slot_day[time_code]), eng_main.teacher_max_daily_hours[teacher_code])]
+
+    def penalty(class_index, placement):
+        teacher_code, time_code, _ = placement
+        if time_code in eng_main.teacher_unpreferred_slots[teacher_code]:
+            return eng_main.UNPREFERRED_SLOT_WEIGHT
+        return 0
+
+    return {
+        'candidates': candidates,
+        'uses': uses,
+        'needs': needs,
+        'limits': limits,
+        'precedes': [[] for _ in class_list],
+        'penalty': penalty,
+    }
+
+
+def ac3_model(ac3):
+    """
+    ac3.py: is_consistent() as resources (same group / prof / room at the same time) and precedences
+    (course before seminar), candidates from the domains before AC-3; a class taught by a professor
+    outside his preferred interval (extraRestrictions, tip 2) costs PREFERRED_INTERVAL_WEIGHT.
+    """
+    class_list = ac3.class_list
+
+    def uses(class_index, placement):
+        prof, time_index, room = placement
+        return [('group', class_list[class_index]['grupa'], time_index),
+                ('teacher', prof, time_index), ('room', room, time_index)]
+
+    precedes = [[] for _ in class_list]
+    for i in range(len(class_list)):
+        for j in range(len(class_list)):
+            if ac3.model.relations[i][j] & problem_model.BEFORE:
+                precedes[i].append((j, True))
+                precedes[j].append((i, False))
+
+    def penalty(class_index, placement):
+        prof, time_index, _ = placement
+        preferred = ac3.preferred_times.get(prof)
+        if preferred is not None and time_index not in preferred:
+            return ac3.PREFERRED_INTERVAL_WEIGHT
+        return 0
+
+    return {
+        'candidates': [list(ac3.variable_domains_preAC3[Xi]) for Xi in range(len(class_list))],
+        'uses': uses,
+        'needs': uses,
+        'limits': lambda class_index, placement: [],
+        'precedes': precedes,
+        'penalty': penalty,
+    }
+
+
+class LocalSearch:
+    """
+    A complete, feasible assignment (class -> placement) and the counters of its resources and limits.
+    """
+
+    def __init__(self, model, assignment):
+        self.uses = model['uses']
+        self.needs = model['needs']
+        self.limits = model['limits']
+        self.penalty_of = model['penalty']
+        self.precedes = model['precedes']
+        self.candidates = model['candidates']
+        self.candidate_sets = [set(placements) for placements in self.candidates]
+        self.assignment = {}
+        self.occupancy = {}
+        self.counters = {}
+        self.penalty = 0
+        for class_index, placement in assignment.items():
+            self.place(class_index, placement)
+
+    def occupy(self, class_index, placement, step):
+        # step = 1 / -1: the placement starts / stops counting, self.assignment is left alone
+        for key in self.uses(class_index, placement):
+            self.occupancy[key] = self.occupancy.get(key, 0) + step
+        for key, _ in self.limits(class_index, placement):
+            self.counters[key] = self.counters.get(key, 0) + step
+        self.penalty += step * self.penalty_of(class_index, placement)
+
+    def place(self, class_index, placement):
+        # the assignment stays in placement order (eng_main replays it in that order, see best_assignment)
+        self.assignment[class_index] = placement
+        self.occupy(class_index, placement, 1)
+
+    def unplace(self, class_index):
+        placement = self.assignment.pop(class_index)
+        self.occupy(class_index, placement, -1)
+        return placement
+
+    def fits(self, class_index, placement):
+        """
+        Whether the class can take the placement next to the other classes (its own placement must not count).
+        """
+        for key in self.needs(class_index, placement):
+            if self.occupancy.get(key, 0):
+                return False
+        for key, maximum in self.limits(class_index, placement):
+            if self.counters.get(key, 0) + 1 > maximum:
+                return False
+        time_code = placement[1]
+        for other_index, first in self.precedes[class_index]:
+            other = self.assignment[other_index]
+            if time_code >= other[1] if first else time_code <= other[1]:
+                return False
+        return True
+
+    def move_delta(self, class_index, placement):
+        """
+        Penalty change of moving the class to placement, None if the move breaks a hard constraint.
+        """
+        old = self.assignment[class_index]
+        self.occupy(class_index, old, -1)
+        delta = None
+        if self.fits(class_index, placement):
+            delta = self.penalty_of(class_index, placement) - self.penalty_of(class_index, old)
+        self.occupy(class_index, old, 1)
+        return delta
+
+    def swapped(self, first_index, second_index):
+        """
+        The placements of two classes after exchanging their (timeslot, room), None if not candidates.
+        """
+        first = self.assignment[first_index]
+        second = self.assignment[second_index]
+        new_first = (first[0], second[1], second[2])
+        new_second = (second[0], first[1], first[2])
+        if new_first not in self.candidate_sets[first_index] or new_second not in self.candidate_sets[second_index]:
+            return None
+        return new_first, new_second
+
+    def swap_delta(self, first_index, second_index):
+        placements = self.swapped(first_index, second_index)
+        if placements is None:
+            return None
+        new_first, new_second = placements
+        old_first = self.assignment[first_index]
+        old_second = self.assignment[second_index]
+        self.occupy(first_index, old_first, -1)
+        self.occupy(second_index, old_second, -1)
+        delta = None
+        if self.fits(first_index, new_first):
+            # the second class is checked with the first one already moved, like apply() places them
+            self.occupy(first_index, new_first, 1)
+            self.assignment[first_index] = new_first
+            if self.fits(second_index, new_second):
+                delta = (self.penalty_of(first_index, new_first) + self.penalty_of(second_index, new_second)
+                         - self.penalty_of(first_index, old_first) - self.penalty_of(second_index, old_second))
+            self.assignment[first_index] = old_first
+            self.occupy(first_index, new_first, -1)
+        self.occupy(first_index, old_first, 1)
+        self.occupy(second_index, old_second, 1)
+        return delta
+
+    def apply(self, move):
+        if move[0] == 'move':
+            _, class_index, placement = move
+            self.unplace(class_index)
+            self.place(class_index, placement)
+        else:
+            _, first_index, second_index = move
+            new_first, new_second = self.swapped(first_index, second_index)
+            self.unplace(first_index)
+            self.unplace(second_index)
+            self.place(first_index, new_first)
+            self.place(second_index, new_second)
+
+    def changes(self, move):
+        """
+        (class_index, new placement) of every class the move takes somewhere else.
+        """
+        if move[0] == 'move':
+            return [(move[1], move[2])]
+        return list(zip(move[1:3], self.swapped(move[1], move[2])))
+
+    def penalized_classes(self):
+        return [class_index for class_index, placement in self.assignment.items() if self.penalty_of(class_index, placement)]
+
+    def neighbors(self, rng):
+        """
+        Yields (move, delta) for every move of FOCUS_CLASSES penalized classes, their swaps with a sample
+        of classes, and SAMPLED_MOVES random moves / swaps of any class.
+        """
+        classes = list(self.assignment)
+        penalized = self.penalized_classes()
+        for class_index in rng.sample(penalized, min(len(penalized), FOCUS_CLASSES)):
+            for placement in self.candidates[class_index]:
+                if placement != self.assignment[class_index]:
+                    delta = self.move_delta(class_index, placement)
+                    if delta is not None:
+                        yield ('move', class_index, placement), delta
+            for other_index in rng.sample(classes, min(len(classes), SAMPLED_MOVES)):
+                if other_index != class_index:
+                    delta = self.swap_delta(class_index, other_index)
+                    if delta is not None:
+                        yield ('swap', class_index, other_index), delta
+        for _ in range(SAMPLED_MOVES):
+            move, delta = self.random_neighbor(rng, classes)
+            if move is not None:
+                yield move, delta
+
+    def random_neighbor(self, rng, classes):
+        """
+        A random move or swap that keeps the hard constraints and its delta, (None, None) if the one drawn does not.
+        """
+        class_index = rng.choice(classes)
+        if rng.random() < 0.5:
+            placement = rng.choice(self.candidates[class_index])
+            move = ('move', class_index, placement)
+            delta = None if placement == self.assignment[class_index] else self.move_delta(class_index, placement)
+        else:
+            other_index = rng.choice(classes)
+            move = ('swap', class_index, other_index)
+            delta = None if other_index == class_index else self.swap_delta(class_index, other_index)
+        return (None, None) if delta is None else (move, delta)
+
+
+def improve(model, assignment, method='tabu', time_budget=5.0, max_iterations=None, seed=None):
+    """
+    Lowers the penalty of a feasible assignment (class -> placement) with 'tabu' search or simulated
+    'annealing', until the penalty is 0 or the budget runs out.
+    Returns {'assignment', 'penalty', 'initial_penalty', 'iterations', 'elapsed'} for the best assignment seen.
+    """
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    state = LocalSearch(model, assignment)
+    initial_penalty = state.penalty
+    best_penalty = state.penalty
+    best_assignment = dict(state.assignment)
+    tabu_until = {}
+    iteration = 0
+
+    while best_penalty > 0 and time.perf_counter() - start < time_budget:
+        if max_iterations is not None and iteration >= max_iterations:
+            break
+        iteration += 1
+        if method == 'tabu':
+            # best non-tabu neighbor (a tabu one is fine if it beats the best assignment seen - aspiration)
+            chosen = None
+            for move, delta in state.neighbors(rng):
+                tabu = any(tabu_until.get(change, 0) > iteration for change in state.changes(move))
+                if tabu and state.penalty + delta >= best_penalty:
+                    continue
+                if chosen is None or delta < chosen[1] or delta == chosen[1] and rng.random() < 0.5:
+                    chosen = (move, delta)
+            if chosen is None:
+                continue
+            left = [(class_index, state.assignment[class_index]) for class_index, _ in state.changes(chosen[0])]
+            state.apply(chosen[0])
+            for change in left:
+                tabu_until[change] = iteration + rng.randint(*TABU_TENURE)
+        elif method == 'annealing':
+            move, delta = state.random_neighbor(rng, list(state.assignment))
+            if move is None:
+                continue
+            progress = (time.perf_counter() - start) / time_budget
+            temperature = ANNEALING_START_TEMPERATURE * (ANNEALING_END_TEMPERATURE / ANNEALING_START_TEMPERATURE) ** progress
+            if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+                state.apply(move)
+        else:
+            raise ValueError(f"unknown local search method {method!r}")
+
+        if state.penalty < best_penalty:
+            best_penalty = state.penalty
+            best_assignment = dict(state.assignment)
+
+    return {
+        'assignment': best_assignment,
+        'penalty': best_penalty,
+        'initial_penalty': initial_penalty,
+        'iterations': iteration,
+        'elapsed': time.perf_counter() - start,
+    }
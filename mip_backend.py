@@ -0,0 +1,248 @@
+"""
+Alternative engine: the timetable model compiled to an external solver, OR-Tools CP-SAT ('cpsat') or the
+CBC MIP solver through PuLP ('cbc'). Both run locally; they are optional - pip install ortools / pulp.
+
+One binary variable per placement a class can ever get (teacher, timeslot, room), taken from the domains
+the solver already builds (eng_main's candidate tables: R4, R5, R8 and E2 applied; ac3's domains after the
+AC-3 preprocessing), and linear constraints:
+    every class gets exactly one placement
+    limits   - at most `maximum` of a set of placements: a group / teacher / room at a timeslot (R2, R3, R4.1),
+               the weekly (R6) and daily (E1) hours of a teacher
+    precedes - (course, seminar): the course is at an earlier timeslot (ac3.py)
+    costs    - weight of the soft preferences a placement breaks, minimized when optimize=True
+               (E2 under SOFT_PREFERENCES in eng_main, preferred intervals in ac3)
+
+R2 follows add_to_timetable: two classes of the same group, or a class of EVERYONE (group 0) and one of a
+main group, never share a timeslot. A main group and one of its own subgroups may - the backtracking allows
+it too whenever the main group is placed first.
+
+The solution is decoded into the same class_index -> (teacher, timeslot, room) assignment and
+teacher -> timeslot -> (group, room, subject, class type) timetable as search_control.py returns, so
+transform_data and the Flask pages work unchanged.
+"""
+import time
+
+import problem_model
+
+try:
+    from ortools.sat.python import cp_model
+except ImportError:
+    cp_model = None
+try:
+    import pulp
+except ImportError:
+    pulp = None
+
+CPSAT_WORKERS = 8  # parallel search workers of CP-SAT
+
+
+def available_backends():
+    return [name for name, module in (('cpsat', cp_model), ('cbc', pulp)) if module is not None]
+
+
+def new_model(class_count):
+    return {
+        'placements': [],  # variable -> (class_index, (teacher, timeslot, room))
+        'class_variables': [[] for _ in range(class_count)],
+        'limits': [],  # (variables, maximum)
+        'precedes': [],  # (first class_index, second class_index)
+        'costs': {},  # variable -> weight
+    }
+
+
+def add_placement(model, class_index, placement):
+    variable = len(model['placements'])
+    model['placements'].append((class_index, placement))
+    model['class_variables'][class_index].append(variable)
+    return variable
+
+
+def add_limits(model, variables_by_key, maximum_of):
+    # a limit only matters if more placements than the maximum share the key
+    for key, variables in variables_by_key.items():
+        maximum = maximum_of(key)
+        if len(variables) > maximum:
+            model['limits'].append((variables, maximum))
+
+
+def eng_main_model(eng_main):
+    """
+    eng_main.py: the placements of class_candidate_ids, R2 / R3 / R4.1 per timeslot, R6 / E1 per teacher,
+    E2 as costs under SOFT_PREFERENCES.
+    """
+    model = new_model(len(eng_main.class_list))
+    by_group_time = {}
+    by_teacher_time = {}
+    by_room_time = {}
+    by_teacher = {}
+    by_teacher_day = {}
+    for class_index, cls in enumerate(eng_main.class_list):
+        group_code = cls['group_code']
+        for candidate_id in eng_main.class_candidate_ids[class_index]:
+            teacher_code, time_code, room_code = placement = eng_main.candidate_placements[candidate_id]
+            variable = add_placement(model, class_index, placement)
+            # the group itself, and a main group / EVERYONE pair
+            if group_code == 0:
+                group_keys = [0] + list(eng_main.main_group_codes)
+            else:
+                group_keys = [group_code]
+            for key in group_keys:
+                by_group_time.setdefault((key, time_code), []).append(variable)
+            by_teacher_time.setdefault((teacher_code, time_code), []).append(variable)
+            by_room_time.setdefault((room_code, time_code), []).append(variable)
+            by_teacher.setdefault(teacher_code, []).append(variable)
+            by_teacher_day.setdefault((teacher_code, eng_main.slot_day[time_code]), []).append(variable)
+            if eng_main.SOFT_PREFERENCES and eng_main.is_unpreferred(placement):
+                model['costs'][variable] = eng_main.UNPREFERRED_SLOT_WEIGHT
+
+    add_limits(model, by_group_time, lambda key: 1)
+    add_limits(model, by_teacher_time, lambda key: 1)
+    add_limits(model, by_room_time, lambda key: 1)
+    add_limits(model, by_teacher, lambda teacher_code: eng_main.teacher_max_hours[teacher_code])
+    add_limits(model, by_teacher_day, lambda key: eng_main.teacher_max_daily_hours[key[0]])
+    return model
+
+
+def ac3_model(ac3):
+    """
+    ac3.py: the preprocessed variable_domains (build it before a search narrows them), is_consistent() as
+    limits per timeslot and course-before-seminar precedences, preferred intervals (extraRestrictions tip 2) as costs.
+    """
+    model = new_model(len(ac3.class_list))
+    by_group_time = {}
+    by_prof_time = {}
+    by_room_time = {}
+    for Xi, cls in enumerate(ac3.class_list):
+        for placement in ac3.variable_domains[Xi]:
+            prof, time_index, room = placement
+            variable = add_placement(model, Xi, placement)
+            by_group_time.setdefault((cls['grupa'], time_index), []).append(variable)
+            by_prof_time.setdefault((prof, time_index), []).append(variable)
+            by_room_time.setdefault((room, time_index), []).append(variable)
+            preferred = ac3.preferred_times.get(prof)
+            if preferred is not None and time_index not in preferred:
+                model['costs'][variable] = ac3.PREFERRED_INTERVAL_WEIGHT
+
+    add_limits(model, by_group_time, lambda key: 1)
+    add_limits(model, by_prof_time, lambda key: 1)
+    add_limits(model, by_room_time, lambda key: 1)
+    for Xi in range(len(ac3.class_list)):
+        for Xj in range(len(ac3.class_list)):
+            if ac3.model.relations[Xi][Xj] & problem_model.BEFORE:
+                model['precedes'].append((Xi, Xj))
+    return model
+
+
+def solve_model(model, backend=None, time_limit=None, optimize=False):
+    """
+    Solves a model with 'cpsat' or 'cbc' (None => the first one installed).
+    Returns {'status', 'assignment', 'placed', 'total', 'nodes', 'objective', 'backend', 'elapsed'} with status
+    'solved', 'infeasible' or 'timeout' (no timetable within time_limit seconds) like search_control.py.
+    """
+    if backend is None:
+        backends = available_backends()
+        if not backends:
+            raise ImportError("no MIP backend installed (pip install ortools, or pulp for CBC)")
+        backend = backends[0]
+    if backend == 'cpsat':
+        if cp_model is None:
+            raise ImportError("the 'cpsat' backend needs OR-Tools (pip install ortools)")
+        solve = solve_cpsat
+    elif backend == 'cbc':
+        if pulp is None:
+            raise ImportError("the 'cbc' backend needs PuLP (pip install pulp)")
+        solve = solve_cbc
+    else:
+        raise ValueError(f"unknown MIP backend {backend!r}")
+
+    start = time.perf_counter()
+    status, chosen, nodes, objective = solve(model, time_limit, optimize)
+    assignment = None
+    if chosen is not None:
+        placements = model['placements']
+        assignment = dict(sorted(placements[variable] for variable in chosen))
+    return {
+        'status': status,
+        'assignment': assignment,
+        'placed': 0 if assignment is None else len(assignment),
+        'total': len(model['class_variables']),
+        'nodes': nodes,
+        'objective': objective,
+        'backend': backend,
+        'elapsed': time.perf_counter() - start,
+    }
+
+
+def timeslot_sum(model, class_index, term):
+    # timeslot of a class as a linear expression of its placement variables
+    placements = model['placements']
+    return sum(placements[variable][1][1] * term(variable) for variable in model['class_variables'][class_index])
+
+
+def solve_cpsat(model, time_limit, optimize):
+    cp = cp_model.CpModel()
+    x = [cp.NewBoolVar(f'x{variable}') for variable in range(len(model['placements']))]
+    for variables in model['class_variables']:
+        cp.AddExactlyOne(x[variable] for variable in variables)
+    for variables, maximum in model['limits']:
+        if maximum == 1:
+            cp.AddAtMostOne(x[variable] for variable in variables)
+        else:
+            cp.Add(sum(x[variable] for variable in variables) <= maximum)
+    for first, second in model['precedes']:
+        cp.Add(timeslot_sum(model, first, x.__getitem__) + 1 <= timeslot_sum(model, second, x.__getitem__))
+    if optimize and model['costs']:
+        cp.Minimize(sum(weight * x[variable] for variable, weight in model['costs'].items()))
+
+    solver = cp_model.CpSolver()
+    solver.parameters.num_workers = CPSAT_WORKERS
+    if time_limit is not None:
+        solver.parameters.max_time_in_seconds = time_limit
+    result = solver.Solve(cp)
+    if result in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        chosen = [variable for variable in range(len(x)) if solver.BooleanValue(x[variable])]
+        objective = solver.ObjectiveValue() if optimize and model['costs'] else 0
+        return 'solved', chosen, solver.NumBranches(), objective
+    status = 'infeasible' if result == cp_model.INFEASIBLE else 'timeout'
+    return status, None, solver.NumBranches(), None
+
+
+def solve_cbc(model, time_limit, optimize):
+    problem = pulp.LpProblem('timetable', pulp.LpMinimize)
+    x = [pulp.LpVariable(f'x{variable}', cat='Binary') for variable in range(len(model['placements']))]
+    if optimize and model['costs']:
+        problem += pulp.lpSum(weight * x[variable] for variable, weight in model['costs'].items())
+    else:
+        problem += pulp.lpSum([])  # any timetable will do
+    for variables in model['class_variables']:
+        problem += pulp.lpSum(x[variable] for variable in variables) == 1
+    for variables, maximum in model['limits']:
+        problem += pulp.lpSum(x[variable] for variable in variables) <= maximum
+    for first, second in model['precedes']:
+        problem += timeslot_sum(model, first, x.__getitem__) + 1 <= timeslot_sum(model, second, x.__getitem__)
+
+    problem.solve(pulp.PULP_CBC_CMD(msg=False, timeLimit=time_limit))
+    if problem.sol_status in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+        chosen = [variable for variable in range(len(x)) if x[variable].value() > 0.5]
+        objective = pulp.value(problem.objective) if optimize and model['costs'] else 0
+        return 'solved', chosen, 0, objective
+    status = 'infeasible' if problem.sol_status == pulp.LpSolutionInfeasible else 'timeout'
+    return status, None, 0, None
+
+
+def solve_eng_main(eng_main, backend=None, time_limit=None):
+    """
+    eng_main's timetable from the external solver (E2 minimized under SOFT_PREFERENCES), plus 'timetable'.
+    """
+    result = solve_model(eng_main_model(eng_main), backend, time_limit, optimize=eng_main.SOFT_PREFERENCES)
+    result['timetable'] = None if result['assignment'] is None else eng_main.timetable_of(result['assignment'])
+    return result
+
+
+def solve_ac3(ac3, backend=None, time_limit=None, optimize=False):
+    """
+    ac3's timetable from the external solver (preferred intervals minimized if optimize), plus 'timetable'.
+    """
+    result = solve_model(ac3_model(ac3), backend, time_limit, optimize)
+    result['timetable'] = None if result['assignment'] is None else ac3.format_solution(result['assignment'], ac3.class_list)
+    return result
@@ -0,0 +1,61 @@
+"""
+Bounded store of nogoods shared by the backjumping searches of eng_main.py and ac3.py.
+
+A nogood is a set of assignments (variable, value) proven to have no solution together,
+e.g. the conflict set of a dead end found by conflict-directed backjumping. The store
+keeps at most `capacity` nogoods and evicts the least recently used one.
+"""
+from collections import OrderedDict
+
+
+class NogoodStore:
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.nogoods = OrderedDict()  # frozenset of (variable, value) -> None, least recently used first
+        self.by_literal = {}  # (variable, value) -> nogoods containing it
+        self.hits = 0
+
+    def __len__(self):
+        return len(self.nogoods)
+
+    def clear(self):
+        self.nogoods.clear()
+        self.by_literal.clear()
+        self.hits = 0
+
+    def add(self, literals):
+        """
+        Records a nogood given as (variable, value) pairs. The empty nogood is not stored
+        (it means the problem has no solution at all).
+        """
+        nogood = frozenset(literals)
+        if not nogood:
+            return
+        if nogood in self.nogoods:
+            self.nogoods.move_to_end(nogood)
+            return
+        self.nogoods[nogood] = None
+        for literal in nogood:
+            self.by_literal.setdefault(literal, set()).add(nogood)
+        if len(self.nogoods) > self.capacity:
+            self.evict(next(iter(self.nogoods)))
+
+    def evict(self, nogood):
+        del self.nogoods[nogood]
+        for literal in nogood:
+            watching = self.by_literal[literal]
+            watching.discard(nogood)
+            if not watching:
+                del self.by_literal[literal]
+
+    def find(self, assignment, variable, value):
+        """
+        Returns a stored nogood that assigning value to variable would complete, given the
+        current assignment (dict variable -> value), or None.
+        """
+        for nogood in self.by_literal.get((variable, value), ()):
+            if all(other == variable or assignment.get(other) == other_value for other, other_value in nogood):
+                self.nogoods.move_to_end(nogood)
+                self.hits += 1
+                return nogood
+        return None
@@ -0,0 +1,41 @@
+"""
+Pre-rendered timetable pages for the Flask apps of eng_main.py and ac3.py.
+
+A scheduling job renders every page of its timetable once, in its worker, and the pages travel inside
+the snapshot it publishes (see job_service.py) - so the cache is keyed on (page, timetable version) by
+construction, and publishing a new timetable replaces all the pages at once. A request only looks its
+page up and answers with an ETag (hash of the page) and Last-Modified (when the timetable was built),
+or with 304 Not Modified when the browser already has that page.
+"""
+import hashlib
+import time
+
+from flask import Response, render_template, request
+
+
+def prerender(app, pages):
+    """
+    pages: key -> (template name, template context). Returns key -> page, rendered outside any request.
+    """
+    built = time.time()
+    rendered = {}
+    with app.test_request_context():  # url_for in the templates needs a request context
+        for key, (template, context) in pages.items():
+            rendered[key] = prepare(render_template(template, **context).encode('utf-8'), built)
+    return rendered
+
+
+def prepare(body, built=None):
+    # a page (or any other prepared response body: exports, ...) with its ETag
+    return {'body': body, 'etag': hashlib.sha1(body).hexdigest(), 'built': time.time() if built is None else built}
+
+
+def cached_response(page, mimetype='text/html'):
+    """
+    The page as a response to the current request: 200 with ETag / Last-Modified, or 304.
+    """
+    response = Response(page['body'], mimetype=mimetype)
+    response.set_etag(page['etag'])
+    response.last_modified = page['built']
+    response.cache_control.no_cache = True  # browsers revalidate, a new timetable shows up right away
+    return response.make_conditional(request)
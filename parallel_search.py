@@ -0,0 +1,192 @@
+"""
+Parallel tree search for eng_main.py: the first levels of the backtracking tree are expanded into
+subproblems (the placements of the first split_depth classes picked by the variable ordering, the most
+constrained ones with 'mrv' / 'domwdeg'), and a pool of worker processes solves them with work stealing -
+a worker that runs out of subproblems gets half of the untried placements of the shallowest open class
+of a busy worker (eng_main.split_work), so one hard subtree does not leave the other cores idle.
+
+Every worker is a forked process with its own copy of the eng_main module: it reads the candidate tables
+built once in the parent and keeps its own current_timetable / group_schedule / room_schedule /
+teacher_schedule, nothing is shared between workers except the subproblem queue and a few counters.
+
+usage: python parallel_search.py [--workers N] [--split-depth K] [--variable-ordering mrv]
+"""
+import argparse
+import concurrent.futures
+import multiprocessing
+import os
+import queue
+import time
+
+from portfolio import load_solver
+
+# shared between the parent and the workers (set by init_worker in every worker)
+task_queue = None  # subproblems waiting for a worker
+result_queue = None  # the timetable of the first worker that finds one
+waiting_tasks = None  # subproblems in task_queue
+unfinished_tasks = None  # subproblems queued or being solved - 0 => the whole tree was explored
+idle_workers = None  # workers waiting for a subproblem
+stop_event = None  # a timetable was found
+
+
+def init_worker(tasks, results, waiting, unfinished, idle, stop):
+    global task_queue, result_queue, waiting_tasks, unfinished_tasks, idle_workers, stop_event
+    task_queue, result_queue = tasks, results
+    waiting_tasks, unfinished_tasks, idle_workers, stop_event = waiting, unfinished, idle, stop
+
+
+def add_tasks(subproblems):
+    with unfinished_tasks.get_lock():
+        unfinished_tasks.value += len(subproblems)
+    with waiting_tasks.get_lock():
+        waiting_tasks.value += len(subproblems)
+    for subproblem in subproblems:
+        task_queue.put(subproblem)
+
+
+def work_requested():
+    # some worker is idle and nothing is left in the queue for it
+    return idle_workers.value > 0 and waiting_tasks.value == 0
+
+
+def expand_subproblems(eng_main, split_depth):
+    """
+    The placements of the first split_depth classes (chosen like backtracking() does) that pass
+    add_to_timetable, as subproblems in search order.
+    """
+    subproblems = []
+
+    def expand(depth):
+        if depth == split_depth or depth == len(eng_main.class_list):
+            subproblems.append(list(eng_main.class_assignment.items()))
+            return
+        class_index = eng_main.select_next_class(depth)
+        cls = eng_main.class_list[class_index]
+        for teacher_code, time_code, room_code in list(eng_main.ordered_candidates(class_index)):
+            if eng_main.add_to_timetable(teacher_code, time_code, cls['group_code'], room_code, cls['subject_code'], cls['type'], class_index):
+                eng_main.record_assignment(class_index, teacher_code, time_code, room_code)
+                expand(depth + 1)
+                eng_main.forget_assignment(class_index)
+                eng_main.remove_from_timetable(teacher_code, time_code)
+
+    eng_main.reset_search_state()
+    expand(0)
+    eng_main.reset_search_state()
+    return subproblems
+
+
+def solve_subproblem(eng_main, subproblem):
+    """
+    Replays the placements of the subproblem and searches below them. Returns the timetable or None.
+    """
+    eng_main.reset_search_state()
+    for class_index, (teacher_code, time_code, room_code) in subproblem:
+        cls = eng_main.class_list[class_index]
+        if not eng_main.add_to_timetable(teacher_code, time_code, cls['group_code'], room_code, cls['subject_code'], cls['type'], class_index):
+            return None  # forward checking already sees a dead end
+        eng_main.record_assignment(class_index, teacher_code, time_code, room_code)
+    if eng_main.backtracking(len(subproblem)) == 1:
+        return eng_main.best_timetable
+    return None
+
+
+def worker_loop(settings):
+    """
+    Runs in a worker until a timetable is found or every subproblem is solved.
+    Returns the number of subproblems solved, subproblems given away and search nodes of this worker.
+    """
+    eng_main = load_solver('eng_main')  # already imported before the fork
+    eng_main.VARIABLE_ORDERING, eng_main.VALUE_ORDERING, eng_main.FORWARD_CHECKING = settings
+    eng_main.should_stop = stop_event.is_set
+    eng_main.work_requested = work_requested
+
+    solved_tasks = 0
+    given_tasks = 0
+    nodes = 0
+
+    def give_work(subproblems):
+        nonlocal given_tasks
+        given_tasks += len(subproblems)
+        add_tasks(subproblems)
+    eng_main.give_work = give_work
+
+    while not stop_event.is_set():
+        with idle_workers.get_lock():
+            idle_workers.value += 1
+        subproblem = None
+        while subproblem is None and not stop_event.is_set() and unfinished_tasks.value > 0:
+            try:
+                subproblem = task_queue.get(timeout=0.05)
+            except queue.Empty:
+                pass
+        with idle_workers.get_lock():
+            idle_workers.value -= 1
+        if subproblem is None:
+            break  # stopped, or nothing left anywhere
+        with waiting_tasks.get_lock():
+            waiting_tasks.value -= 1
+
+        timetable = solve_subproblem(eng_main, subproblem)
+        solved_tasks += 1
+        nodes += eng_main.search_stats['nodes']
+        if timetable is not None:
+            result_queue.put(timetable)
+            stop_event.set()
+        with unfinished_tasks.get_lock():
+            unfinished_tasks.value -= 1
+    return solved_tasks, given_tasks, nodes
+
+
+def solve_parallel(workers=None, split_depth=1, variable_ordering='mrv', value_ordering='static', forward_checking=True):
+    """
+    Parallel search of the (already loaded) eng_main problem. Returns (timetable or None, statistics).
+    """
+    eng_main = load_solver('eng_main')
+    eng_main.VARIABLE_ORDERING = variable_ordering
+    eng_main.VALUE_ORDERING = value_ordering
+    eng_main.FORWARD_CHECKING = forward_checking
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    context = multiprocessing.get_context('fork')
+    shared = (context.Queue(), context.Queue(), context.Value('i', 0), context.Value('i', 0),
+              context.Value('i', 0), context.Event())
+    init_worker(*shared)
+    subproblems = expand_subproblems(eng_main, split_depth)
+    add_tasks(subproblems)
+
+    stats = {'subproblems': len(subproblems), 'solved_subproblems': 0, 'stolen_subproblems': 0, 'nodes': 0}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                                initializer=init_worker, initargs=shared) as executor:
+        settings = (variable_ordering, value_ordering, forward_checking)
+        futures = [executor.submit(worker_loop, settings) for _ in range(workers)]
+        for future in concurrent.futures.as_completed(futures):
+            solved_tasks, given_tasks, nodes = future.result()
+            stats['solved_subproblems'] += solved_tasks
+            stats['stolen_subproblems'] += given_tasks
+            stats['nodes'] += nodes
+    timetable = result_queue.get() if stop_event.is_set() else None  # put before the event is set
+    task_queue.cancel_join_thread()  # subproblems nobody will solve are dropped, not flushed at exit
+    return timetable, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('--split-depth', type=int, default=1, help='levels of the tree expanded into the first subproblems')
+    parser.add_argument('--variable-ordering', default='mrv', choices=['static', 'mrv', 'domwdeg'])
+    parser.add_argument('--value-ordering', default='static', choices=['static', 'lcv'])
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    timetable, stats = solve_parallel(args.workers, args.split_depth, args.variable_ordering, args.value_ordering)
+    elapsed = time.perf_counter() - start
+    if timetable is None:
+        print(f"No solution found ({elapsed:.2f} s, {stats}).")
+        return
+    classes = sum(len(schedule) for schedule in timetable.values())
+    print(f"Solution found in {elapsed:.2f} s, {classes} classes placed ({stats})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Portfolio solving: several configurations of one solver (eng_main.py or ac3.py) search in parallel
+worker processes, the first one to settle the problem wins and the other workers are stopped - settled
+by a timetable, or by a configuration that explored its whole tree without one (every configuration is
+complete, so that proves no timetable exists). time_budget caps every configuration's search.
+
+The solver module is imported once, in this process, before the pool starts - that parses the JSON
+files and builds the class list and the candidate tables (eng_main) / the AC-3 preprocessed domains
+(ac3). The workers are forked from this process, so they all read that one preprocessed problem
+instead of loading it again; a worker only changes its own search state.
+
+usage: python portfolio.py [eng_main|ac3] [--workers N] [--time-budget SECONDS]
+"""
+import argparse
+import concurrent.futures
+import importlib
+import multiprocessing
+import os
+import sys
+import time
+
+import search_control
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# eng_main.py configurations: variable / value ordering, forward checking and an optional seed
+# (seed => random tie-breaking, and the search restarts on a geometric schedule - see search_control.py)
+ENG_MAIN_PORTFOLIO = [
+    {'variable_ordering': 'mrv', 'value_ordering': 'static', 'forward_checking': True},
+    {'variable_ordering': 'domwdeg', 'value_ordering': 'static', 'forward_checking': True},
+    {'variable_ordering': 'static', 'value_ordering': 'static', 'forward_checking': True},
+    {'variable_ordering': 'mrv', 'value_ordering': 'lcv', 'forward_checking': True},
+    {'variable_ordering': 'mrv', 'value_ordering': 'static', 'forward_checking': False},
+    {'variable_ordering': 'domwdeg', 'value_ordering': 'static', 'forward_checking': True, 'seed': 1},
+    {'variable_ordering': 'mrv', 'value_ordering': 'static', 'forward_checking': True, 'seed': 2},
+    {'variable_ordering': 'static', 'value_ordering': 'static', 'forward_checking': True, 'seed': 3},
+]
+# ac3.py configurations: AC-3 maintained during the search (MAC) or plain backtracking,
+# seed => random tie-breaking (MRV ties, order of the values)
+AC3_PORTFOLIO = [
+    {'mac': True},
+    {'mac': False},
+    {'mac': True, 'seed': 1},
+    {'mac': False, 'seed': 2},
+]
+PORTFOLIOS = {'eng_main': ENG_MAIN_PORTFOLIO, 'ac3': AC3_PORTFOLIO}
+
+RESTART_NODES = 1000  # node limit of the first run of a seeded eng_main configuration
+
+stop_event = None  # set by the parent once a worker found a timetable (one per worker process)
+
+
+def load_solver(solver_name):
+    """
+    Imports (parses + preprocesses) the solver module, the solvers read ./data and ./eng_data.
+    """
+    os.chdir(REPO_DIR)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    return importlib.import_module(solver_name)
+
+
+def init_worker(event):
+    global stop_event
+    stop_event = event
+
+
+def run_eng_main(config, stats, time_budget=None):
+    eng_main = sys.modules['eng_main']
+    eng_main.VARIABLE_ORDERING = config.get('variable_ordering', 'static')
+    eng_main.VALUE_ORDERING = config.get('value_ordering', 'static')
+    eng_main.FORWARD_CHECKING = config.get('forward_checking', True)
+
+    seed = config.get('seed')
+    outcome = search_control.solve_eng_main(
+        eng_main, restarts=None if seed is None else 'geometric', restart_base=RESTART_NODES,
+        seed=seed, should_stop=stop_event.is_set, time_budget=time_budget,
+    )
+    stats['nodes'] += outcome['nodes']
+    stats['restarts'] += outcome['restarts']
+    return outcome
+
+
+def run_ac3(config, stats, time_budget=None):
+    ac3 = sys.modules['ac3']
+    ac3.MAINTAIN_ARC_CONSISTENCY = config.get('mac', True)
+
+    outcome = search_control.solve_ac3(ac3, seed=config.get('seed'), should_stop=stop_event.is_set,
+                                       time_budget=time_budget)
+    stats['nodes'] += outcome['nodes']
+    return outcome
+
+
+def solve_configuration(solver_name, config, time_budget=None):
+    """
+    Runs in a worker: one configuration of the (already loaded) solver.
+    Returns the configuration, the search_control status ('solved', 'infeasible' or 'timeout' - out of
+    time, or stopped because another worker won), the timetable (teacher -> timeslot -> (group, room,
+    subject, type)) if solved else None, search statistics and the wall time.
+    """
+    stats = {'nodes': 0, 'restarts': 0}
+    start = time.perf_counter()
+    if solver_name == 'eng_main':
+        outcome = run_eng_main(config, stats, time_budget)
+    else:
+        outcome = run_ac3(config, stats, time_budget)
+    timetable = outcome['timetable'] if outcome['status'] == 'solved' else None
+    return {'config': config, 'status': outcome['status'], 'timetable': timetable, 'stats': stats,
+            'elapsed': time.perf_counter() - start}
+
+
+def solve_portfolio(solver_name='eng_main', configurations=None, workers=None, time_budget=None):
+    """
+    Runs the configurations (default: PORTFOLIOS[solver_name]) in a process pool, each for at most
+    time_budget seconds (None: no limit), and returns the result of the first one that settles the
+    problem (see solve_configuration): status 'solved' with its timetable, or 'infeasible'.
+    None if every configuration ran out of time.
+    """
+    load_solver(solver_name)  # once, before the workers are forked
+    if configurations is None:
+        configurations = PORTFOLIOS[solver_name]
+    if workers is None:
+        workers = min(len(configurations), os.cpu_count() or 1)
+
+    context = multiprocessing.get_context('fork')
+    stop = context.Event()
+    winner = None
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                                initializer=init_worker, initargs=(stop,)) as executor:
+        pending = {executor.submit(solve_configuration, solver_name, config, time_budget) for config in configurations}
+        while pending and winner is None:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result['status'] in ('solved', 'infeasible') and winner is None:
+                    winner = result
+        # first answer wins: queued configurations never start, running ones give up at their next node
+        stop.set()
+        for future in pending:
+            future.cancel()
+    return winner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('solver', nargs='?', default='eng_main', choices=sorted(PORTFOLIOS))
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per configuration, at most the cores)')
+    parser.add_argument('--time-budget', type=float, default=None, help='seconds each configuration may search')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    winner = solve_portfolio(args.solver, workers=args.workers, time_budget=args.time_budget)
+    elapsed = time.perf_counter() - start
+    if winner is None:
+        print(f"No solution found within the time budget ({elapsed:.2f} s).")
+        return
+    if winner['status'] == 'infeasible':
+        print(f"No timetable exists: proven by {winner['config']} in {winner['elapsed']:.2f} s "
+              f"({winner['stats']['nodes']} nodes), portfolio wall time {elapsed:.2f} s")
+        return
+    classes = sum(len(schedule) for schedule in winner['timetable'].values())
+    print(f"Solution found by {winner['config']} in {winner['elapsed']:.2f} s "
+          f"({winner['stats']['nodes']} nodes, {winner['stats']['restarts']} restarts), "
+          f"{classes} classes placed, portfolio wall time {elapsed:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+On-disk cache of what the solvers compute at startup from their JSON files (eng_main.py: the candidate
+tables, ac3.py: the domains before / after the AC-3 preprocessing and the neighbors), so a restart on an
+unchanged instance reads one file instead of rebuilding them.
+
+A cache file holds named int32 columns:
+
+    CACHE_DIRECTORY/<name>-<key>.bin
+        MAGIC, column count, then per column (name, byte offset, items), then the column bytes (8-aligned)
+
+load() maps the file (mmap, read-only) and returns every column as a memoryview over the mapping: nothing
+is copied or parsed, the pages are read on first use and are shared by all the processes that map the
+same file (the job workers, several solver processes on the same instance).
+
+key = digest(input files, settings) - the SHA-256 of the bytes of the input files and of everything
+else the cached tables depend on, so editing any input file (or a setting in the key) gives a new key and
+the old file is simply never read again; save() keeps the CACHE_FILES_KEPT newest files of each name.
+Ragged tables (a list per class, per key...) are stored as offsets + values columns (pack_lists).
+"""
+import array
+import glob
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+CACHE_DIRECTORY = 'cache'  # relative to the working directory, like ./data and ./eng_data
+CACHE_FILES_KEPT = 8  # per name (eng_main keeps one per set of extra restrictions it was compiled with)
+FORMAT_VERSION = 1  # part of every key - bump it when what the solvers store changes
+MAGIC = b'TTCACHE\0'
+HEADER = struct.Struct('<8sI4x')  # magic, column count
+COLUMN = struct.Struct('<32sQQ')  # name, byte offset, items
+
+
+def digest(contents, *settings):
+    """
+    Cache key of the input files (their bytes, as the solver read and parsed them) and of the settings
+    (anything with a stable repr()).
+    """
+    sha = hashlib.sha256(repr((FORMAT_VERSION, sys.byteorder, settings)).encode())
+    for content in contents:
+        sha.update(struct.pack('<Q', len(content)))
+        sha.update(content)
+    return sha.hexdigest()
+
+
+def cache_path(name, key):
+    return os.path.join(CACHE_DIRECTORY, f'{name}-{key}.bin')
+
+
+def pack_lists(lists):
+    """
+    (offsets, values) columns of a list of int sequences: lists[i] = values[offsets[i]:offsets[i + 1]].
+    """
+    offsets = array.array('i', [0])
+    values = array.array('i')
+    for items in lists:
+        values.extend(items)
+        offsets.append(len(values))
+    return offsets, values
+
+
+def unpack_lists(offsets, values):
+    # memoryview slices of the mapped values (no copy)
+    return [values[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+
+def save(name, key, columns):
+    """
+    Writes {column name: int sequence} as the cache file of the key (atomically: a reader sees the whole file
+    or none) and removes the oldest files of the name beyond CACHE_FILES_KEPT. A cache that can't be written
+    only costs the next start its rebuild, so OSErrors are ignored.
+    """
+    path = cache_path(name, key)
+    data = [(column, items if isinstance(items, array.array) and items.typecode == 'i' else array.array('i', items))
+            for column, items in columns.items()]
+    offset = HEADER.size + COLUMN.size * len(data)
+    table = []
+    for column, items in data:
+        offset += -offset % 8
+        table.append(COLUMN.pack(column.encode(), offset, len(items)))
+        offset += len(items) * items.itemsize
+    try:
+        os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, len(data)))
+            file.write(b''.join(table))
+            for _, items in data:
+                file.write(b'\0' * (-file.tell() % 8))
+                items.tofile(file)
+        os.replace(temporary, path)
+        older = sorted(glob.glob(cache_path(name, '*')), key=os.path.getmtime, reverse=True)
+        for stale in older[CACHE_FILES_KEPT:]:
+            os.remove(stale)
+    except OSError:
+        pass
+
+
+def load(name, key):
+    """
+    {column name: memoryview of int32} of the cache file of the key, None if there is none (or it is unreadable).
+    """
+    try:
+        with open(cache_path(name, key), 'rb') as file:
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):  # ValueError: empty file
+        return None
+    try:
+        magic, count = HEADER.unpack_from(mapping, 0)
+        if magic != MAGIC:
+            return None
+        view = memoryview(mapping)
+        columns = {}
+        for position in range(count):
+            column, offset, items = COLUMN.unpack_from(mapping, HEADER.size + COLUMN.size * position)
+            if offset + 4 * items > len(mapping):
+                return None
+            columns[column.rstrip(b'\0').decode()] = view[offset:offset + 4 * items].cast('i')
+        return columns
+    except (struct.error, ValueError, UnicodeDecodeError):
+        return None
@@ -0,0 +1,140 @@
+"""
+Compiled problem model shared by eng_main.py and ac3.py.
+
+The groups, subjects, teachers, rooms and timeslots get dense integer ids (0, 1, 2, ... in file order) and
+everything the search loops read about them or about the classes is a parallel array column indexed by
+those ids / by class_index, with the class type coded as a ClassType instead of the 'course' / 'seminar'
+string - so a hot loop indexes arrays instead of hashing JSON dicts and comparing strings:
+
+    model.teachers.code[teacher_id], model.teachers.id_of[teacher_code]   (groups, subjects, rooms, slots too)
+    model.class_kind[class_index]           - ClassType.COURSE / ClassType.SEMINAR
+    model.class_subject / class_group       - subject / group id of every class
+    model.teacher_max_hours, teacher_can_teach_course, teacher_subjects (bitmask of subject ids)
+    model.room_course_possible, room_slots (bitmask of slot ids), slot_day (day id, model.days holds the names)
+    model.relations[Xi][Xj]                 - SAME_GROUP | BEFORE | AFTER bits of a pair of classes
+
+Each solver keeps its class_list of dicts (what the pages, exports and the other modules show) and compiles
+the model from it and from its own JSON schema: compile_eng_data (eng_data/) or compile_ac3_data (data/).
+"""
+import enum
+from array import array
+
+# relations[Xi][Xj] bits
+SAME_GROUP = 1  # same group code => never at the same timeslot
+BEFORE = 2  # Xi is the course and Xj the seminar of the same subject and group => Xi at an earlier timeslot
+AFTER = 4  # Xi is the seminar and Xj the course => Xi at a later timeslot
+
+# field names of the two JSON schemas
+ENG_DATA_KEYS = {
+    'code': 'code', 'subjects_taught': 'subjects_taught', 'max_hours': 'max_hours', 'can_teach_course': 'can_teach_course',
+    'possible_times': 'possible_times', 'course_possible': 'course_possible', 'day': 'day',
+    'class_subject': 'subject_code', 'class_group': 'group_code',
+}
+AC3_DATA_KEYS = {
+    'code': 'cod', 'subjects_taught': 'materiiPredate', 'max_hours': 'nrMaximOre', 'can_teach_course': 'poatePredaCurs',
+    'possible_times': 'timp_posibil', 'course_possible': 'curs_posibil', 'day': 'zi',
+    'class_subject': 'materie', 'class_group': 'grupa',
+}
+
+
+class ClassType(enum.IntEnum):
+    COURSE = 0
+    SEMINAR = 1
+
+    @classmethod
+    def of(cls, name):
+        # the 'type' of a class dict
+        return cls.COURSE if name == 'course' else cls.SEMINAR
+
+
+class Index:
+    """
+    Dense ids of the codes of one kind of entity, in file order.
+    """
+    __slots__ = ('code', 'id_of')
+
+    def __init__(self, codes):
+        self.code = array('i', codes)
+        self.id_of = {code: entity_id for entity_id, code in enumerate(codes)}
+
+    def __len__(self):
+        return len(self.code)
+
+
+class ProblemModel:
+    __slots__ = (
+        'groups', 'subjects', 'teachers', 'rooms', 'slots', 'days',
+        'class_kind', 'class_subject', 'class_group',
+        'teacher_max_hours', 'teacher_can_teach_course', 'teacher_subjects',
+        'room_course_possible', 'room_slots', 'slot_day', 'relations',
+    )
+
+    def __init__(self, groups, subjects, teachers, rooms, slots, class_list, keys):
+        code = keys['code']
+        self.groups = Index([group[code] for group in groups])
+        self.subjects = Index([subject[code] for subject in subjects])
+        self.teachers = Index([teacher[code] for teacher in teachers])
+        self.rooms = Index([room[code] for room in rooms])
+        self.slots = Index([slot[code] for slot in slots])
+
+        self.class_kind = array('b', [ClassType.of(cls['type']) for cls in class_list])
+        self.class_subject = array('i', [self.subjects.id_of[cls[keys['class_subject']]] for cls in class_list])
+        self.class_group = array('i', [self.groups.id_of[cls[keys['class_group']]] for cls in class_list])
+
+        self.teacher_max_hours = array('i', [teacher[keys['max_hours']] for teacher in teachers])
+        self.teacher_can_teach_course = array('b', [bool(teacher[keys['can_teach_course']]) for teacher in teachers])
+        self.teacher_subjects = [self.mask(self.subjects, teacher[keys['subjects_taught']]) for teacher in teachers]
+
+        self.room_course_possible = array('b', [bool(room[keys['course_possible']]) for room in rooms])
+        self.room_slots = [self.mask(self.slots, room[keys['possible_times']]) for room in rooms]
+        self.days = list(dict.fromkeys(slot[keys['day']] for slot in slots))
+        self.slot_day = array('i', [self.days.index(slot[keys['day']]) for slot in slots])
+
+        # pairs of classes sharing a group, and course / seminar pairs of the same subject and group
+        class_count = len(class_list)
+        self.relations = [bytearray(class_count) for _ in range(class_count)]
+        by_group = {}
+        for class_index in range(class_count):
+            by_group.setdefault(self.class_group[class_index], []).append(class_index)
+        for members in by_group.values():
+            for Xi in members:
+                row = self.relations[Xi]
+                for Xj in members:
+                    if Xi == Xj:
+                        continue
+                    row[Xj] = SAME_GROUP
+                    if self.class_subject[Xi] == self.class_subject[Xj]:
+                        if self.class_kind[Xi] == ClassType.COURSE and self.class_kind[Xj] == ClassType.SEMINAR:
+                            row[Xj] |= BEFORE
+                        elif self.class_kind[Xi] == ClassType.SEMINAR and self.class_kind[Xj] == ClassType.COURSE:
+                            row[Xj] |= AFTER
+
+    @staticmethod
+    def mask(index, codes):
+        # bitmask of the ids of the codes (unknown codes are left out)
+        bits = 0
+        for code in codes:
+            if code in index.id_of:
+                bits |= 1 << index.id_of[code]
+        return bits
+
+    def teaches(self, teacher_id, class_index):
+        """
+        The teacher teaches the subject of the class, and courses if it is a course (R8).
+        """
+        return (self.teacher_subjects[teacher_id] >> self.class_subject[class_index] & 1
+                and (self.class_kind[class_index] != ClassType.COURSE or self.teacher_can_teach_course[teacher_id]))
+
+    def room_free(self, room_id, slot_id):
+        # the room is available at the timeslot (R4)
+        return self.room_slots[room_id] >> slot_id & 1
+
+
+def compile_eng_data(loaded_data, class_list):
+    return ProblemModel(loaded_data['groups'], loaded_data['subjects'], loaded_data['teachers'], loaded_data['rooms'],
+                        loaded_data['time_slots'], class_list, ENG_DATA_KEYS)
+
+
+def compile_ac3_data(loaded_data, class_list):
+    return ProblemModel(loaded_data['grupe'], loaded_data['materii'], loaded_data['profesori'], loaded_data['sali'],
+                        loaded_data['timp'], class_list, AC3_DATA_KEYS)
@@ -0,0 +1,135 @@
+"""
+Search controller for eng_main.py and ac3.py: node and wall-clock budgets, restarts on a Luby or
+geometric schedule with randomized tie-breaking, and a result that says how the search ended.
+
+The solver module itself is passed in (eng_main / ac3, or sys.modules['__main__'] when the solver runs
+as a script), the controller only drives its backtracking() through should_stop and tie_breaker.
+
+A result is a dict:
+    status     - 'solved', 'infeasible' (the whole tree was explored, no timetable exists)
+                 or 'timeout' (a budget ran out or should_stop() asked to stop)
+    assignment - class_index -> (teacher, timeslot, room); on a timeout the deepest partial assignment
+                 any run reached, None if infeasible
+    timetable  - the same as teacher -> timeslot -> (group, room, subject, class type)
+    placed, total - classes in the timetable / classes to schedule
+    nodes, restarts, elapsed
+"""
+import random
+import time
+
+RESTART_GROWTH = 2  # geometric schedule: restart_base * RESTART_GROWTH ** run
+
+
+def luby(i):
+    """
+    i-th term (from 1) of the Luby sequence: 1 1 2 1 1 2 4 1 1 2 1 1 2 4 8 ...
+    """
+    k = 1
+    while True:
+        if i == (1 << k) - 1:
+            return 1 << (k - 1)
+        if (1 << (k - 1)) <= i < (1 << k) - 1:
+            i -= (1 << (k - 1)) - 1
+            k = 1
+        else:
+            k += 1
+
+
+def restart_limit(schedule, restart_base, run):
+    """
+    Node limit of a run (from 0) of the restart schedule, None for no restarts.
+    """
+    if schedule is None:
+        return None
+    if schedule == 'luby':
+        return restart_base * luby(run + 1)
+    if schedule == 'geometric':
+        return restart_base * RESTART_GROWTH ** run
+    raise ValueError(f"unknown restart schedule {schedule!r}")
+
+
+def solve_eng_main(eng_main, **budgets):
+    """
+    Searches eng_main's timetable from scratch (see controlled_search for the budgets).
+    """
+    def run():
+        if eng_main.backtracking(0) == 1:
+            return 'solved', eng_main.best_assignment
+        return ('timeout' if eng_main.search_aborted else 'infeasible'), None
+    return controlled_search(eng_main, run, eng_main.timetable_of, **budgets)
+
+
+def solve_ac3(ac3, **budgets):
+    """
+    Searches ac3's timetable on the preprocessed domains (see controlled_search for the budgets).
+    """
+    def run():
+        solution = ac3.backtracking({}, ac3.variable_domains)
+        if solution is not None:
+            return 'solved', solution
+        return ('timeout' if ac3.search_aborted else 'infeasible'), None
+    return controlled_search(ac3, run, lambda assignment: ac3.format_solution(assignment, ac3.class_list), **budgets)
+
+
+def controlled_search(solver, run, timetable_of, node_budget=None, time_budget=None, restarts=None,
+                      restart_base=100, seed=None, should_stop=None):
+    """
+    Calls run() (one search from an empty timetable) until it ends on its own or a budget runs out.
+    node_budget / time_budget (seconds) - for all the runs together, None = no limit
+    restarts - None, 'luby' or 'geometric': every run gets restart_base * schedule nodes, then the search
+               starts over with random tie-breaking (learned nogoods and weights are kept)
+    seed - random tie-breaking already in the first run (None => the first run keeps the solver's own order)
+    should_stop - optional callable, checked at every node, to stop from outside
+    """
+    start = time.perf_counter()
+    deadline = None if time_budget is None else start + time_budget
+    rng = random.Random(seed)
+    nodes = 0
+    deepest = {}
+    run_index = 0
+    previous_hooks = (solver.should_stop, solver.tie_breaker)
+
+    def out_of_budget():
+        return (node_budget is not None and nodes >= node_budget
+                or deadline is not None and time.perf_counter() > deadline
+                or should_stop is not None and should_stop())
+
+    def result(status, assignment):
+        timetable = None if assignment is None else timetable_of(assignment)
+        return {
+            'status': status,
+            'assignment': assignment,
+            'timetable': timetable,
+            'placed': 0 if assignment is None else len(assignment),
+            'total': len(solver.class_list),
+            'nodes': nodes,
+            'restarts': run_index,
+            'elapsed': time.perf_counter() - start,
+        }
+
+    try:
+        solver.reset_search_state()
+        while True:
+            limit = restart_limit(restarts, restart_base, run_index)
+            if node_budget is not None:
+                limit = node_budget - nodes if limit is None else min(limit, node_budget - nodes)
+
+            def stop(limit=limit):
+                return (limit is not None and solver.search_stats['nodes'] > limit
+                        or deadline is not None and time.perf_counter() > deadline
+                        or should_stop is not None and should_stop())
+            solver.should_stop = stop
+            solver.tie_breaker = rng if run_index > 0 or seed is not None else None
+
+            status, assignment = run()
+            nodes += solver.search_stats['nodes']
+            if len(solver.deepest_assignment) > len(deepest):
+                deepest = solver.deepest_assignment
+            if status != 'timeout':
+                return result(status, assignment)
+            if restarts is None or out_of_budget():
+                return result('timeout', deepest)
+            run_index += 1
+            solver.reset_search_state(keep_learned=True)
+    finally:
+        solver.should_stop, solver.tie_breaker = previous_hooks
@@ -0,0 +1,92 @@
+"""
+Symmetry detection for eng_main.py and ac3.py: the rooms and the teachers nothing in the problem tells apart
+are grouped into equivalence classes, and the search tries one placement per class instead of one per
+room / teacher.
+
+    rooms    - same possible timeslots and course flag (R4, R5). A room only matters at the timeslot it is
+               used at (R4.1), so the free rooms of a class are interchangeable at that timeslot whatever the
+               rest of the timetable is: the search branches on (teacher, timeslot, room class) and the room
+               it commits is just the first free one of the class (which one is decided late - any would do).
+    teachers - same subjects, course flag, weekly hours and the same extra restrictions of the solver
+               (E1 / E2 in eng_main, preferred intervals in ac3). Placed classes tell a teacher apart, so only
+               the teachers without any class yet are interchangeable: of those, the first of each class is tried.
+
+A placement skipped this way fails exactly when the one tried in its place does (swap the two rooms at that
+timeslot / the two teachers everywhere: the current timetable stays the same and one subtree maps onto the
+other), so the conflict set of the tried placement explains the skipped one too - backjumping and the
+nogoods stay sound.
+
+usage: python symmetry.py [eng_main|ac3]   (the equivalence classes found in the solver's data)
+"""
+import argparse
+import contextlib
+import sys
+
+
+def equivalence_classes(codes, signatures):
+    """
+    {code: class id} - codes with equal signatures share the id (ids numbered in order of appearance).
+    """
+    ids = {}
+    return {code: ids.setdefault(signature, len(ids)) for code, signature in zip(codes, signatures)}
+
+
+def room_classes(model):
+    return equivalence_classes(model.rooms.code, zip(model.room_slots, model.room_course_possible))
+
+
+def teacher_classes(model, restrictions=None):
+    """
+    restrictions[teacher_id] - hashable summary of the solver's extra restrictions of the teacher.
+    """
+    if restrictions is None:
+        restrictions = [None] * len(model.teachers)
+    signatures = zip(model.teacher_subjects, model.teacher_can_teach_course, model.teacher_max_hours, restrictions)
+    return equivalence_classes(model.teachers.code, signatures)
+
+
+def representatives(placements, room_class, teacher_class, teacher_used, room_free=None):
+    """
+    Yields the first (teacher_code, time_code, room_code) placement of every symmetry class, in order.
+    teacher_used(teacher_code) - the teacher already has placed classes;
+    room_free(room_code, time_code) - None if the solver only gives placements with a free room.
+    Lazy: the search state can change (and be restored) between two placements.
+    """
+    seen = set()
+    for placement in placements:
+        teacher_code, time_code, room_code = placement
+        teacher_key = teacher_code if teacher_used(teacher_code) else ('class', teacher_class[teacher_code])
+        if room_free is None or room_free(room_code, time_code):
+            room_key = ('class', room_class[room_code])
+        else:
+            room_key = room_code
+        key = (teacher_key, time_code, room_key)
+        if key not in seen:
+            seen.add(key)
+            yield placement
+
+
+def describe(classes):
+    # the classes with more than one member, as lists of codes
+    members = {}
+    for code, class_id in classes.items():
+        members.setdefault(class_id, []).append(code)
+    return [codes for codes in members.values() if len(codes) > 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('solver', nargs='?', default='eng_main', choices=['eng_main', 'ac3'])
+    args = parser.parse_args()
+
+    from portfolio import load_solver
+    with contextlib.redirect_stdout(sys.stderr):  # ac3 prints its preprocessed domains on import
+        solver = load_solver(args.solver)
+    for name, classes in (('rooms', solver.room_class), ('teachers', solver.teacher_class)):
+        interchangeable = describe(classes)
+        print(f"{name}: {len(classes)} in {len(set(classes.values()))} classes, interchangeable: "
+              + (', '.join('{' + ', '.join(map(str, codes)) + '}' for codes in interchangeable) or 'none'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+"""
+Regression test: the published score is the penalty of the published solution even without the local
+search (it used to stay 0 with LOCAL_SEARCH = None).
+"""
+import contextlib
+import io
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_score_without_local_search(monkeypatch):
+    os.chdir(REPO_DIR)  # ac3 reads ./data
+    sys.path.insert(0, REPO_DIR)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import ac3
+        import job_service
+        import local_search
+        monkeypatch.setattr(job_service, 'watch', lambda sample: None)  # no job_service worker here
+        assert ac3.LOCAL_SEARCH is None
+        status, snapshot = ac3.scheduling_job()
+    assert status == 'solved'
+    penalty = local_search.LocalSearch(local_search.ac3_model(ac3), snapshot['solution']).penalty
+    assert penalty > 0
+    assert snapshot['score'] == penalty
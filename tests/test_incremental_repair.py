@@ -0,0 +1,81 @@
+"""
+Regression tests of reschedule(): a restriction change that breaks no placement must return the previous
+timetable (it used to loop forever with an empty free set and a node limit of 0), and a one-teacher change
+must be repaired in place - fewer classes moved than a solve from scratch, and no slower (the repair used
+to escalate to a full solve after several rounds).
+"""
+import contextlib
+import copy
+import io
+import os
+import sys
+import time
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def eng_main():
+    os.chdir(REPO_DIR)  # eng_main reads ./eng_data
+    sys.path.insert(0, REPO_DIR)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import eng_main
+        assert eng_main.solve_timetable()['status'] == 'solved'
+    return eng_main
+
+
+def test_change_that_frees_no_class(eng_main):
+    previous_restrictions = copy.deepcopy(eng_main.extra_restrictions)
+    previous_assignment = dict(eng_main.best_assignment)
+    eng_main.extra_restrictions = copy.deepcopy(previous_restrictions)
+    eng_main.extra_restrictions.setdefault('max_daily_hours', {})['2'] = 8  # only loosens teacher 2
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert eng_main.reschedule(previous_restrictions)
+        assert eng_main.best_assignment == previous_assignment
+    finally:
+        eng_main.extra_restrictions = previous_restrictions
+        eng_main.compile_candidate_tables()
+
+
+def test_unchanged_restrictions(eng_main):
+    previous_assignment = dict(eng_main.best_assignment)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert eng_main.reschedule(copy.deepcopy(eng_main.extra_restrictions))
+    assert eng_main.best_assignment == previous_assignment
+
+
+def reschedule_timed(eng_main, previous_assignment, previous_restrictions):
+    # (seconds, nodes, classes moved, printed output) of the best of three runs from previous_assignment
+    runs = []
+    for _ in range(3):
+        eng_main.best_assignment = dict(previous_assignment)
+        output = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output):
+            assert eng_main.reschedule(previous_restrictions)
+        elapsed = time.perf_counter() - start
+        moved = sum(1 for class_index, placement in eng_main.best_assignment.items()
+                    if previous_assignment[class_index] != placement)
+        runs.append((elapsed, eng_main.search_stats['nodes'], moved, output.getvalue()))
+    return min(runs)
+
+
+def test_one_teacher_change_is_repaired_in_place(eng_main):
+    previous_restrictions = copy.deepcopy(eng_main.extra_restrictions)
+    previous_assignment = dict(eng_main.best_assignment)
+    eng_main.extra_restrictions = copy.deepcopy(previous_restrictions)
+    eng_main.extra_restrictions.setdefault('max_daily_hours', {})['4'] = 1
+    try:
+        scratch_seconds, scratch_nodes, scratch_moved, _ = reschedule_timed(eng_main, previous_assignment, None)
+        seconds, nodes, moved, output = reschedule_timed(eng_main, previous_assignment, previous_restrictions)
+        assert 'Repair failed' not in output
+        assert 0 < moved < scratch_moved
+        assert nodes <= scratch_nodes
+        assert seconds <= 1.5 * scratch_seconds + 0.01
+    finally:
+        eng_main.extra_restrictions = previous_restrictions
+        eng_main.best_assignment = previous_assignment
+        eng_main.compile_candidate_tables()
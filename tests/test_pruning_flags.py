@@ -0,0 +1,109 @@
+"""
+The pruning of eng_main's search (BACKJUMPING with its nogoods, FORWARD_CHECKING, SYMMETRY_BREAKING) must
+only ever cut away dead ends: on small generated instances, solved and infeasible ones, every combination
+of the flags reaches the same verdict, and every timetable found satisfies the rules.
+"""
+import contextlib
+import importlib
+import io
+import itertools
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+
+from instance_generator import generate, write_instance
+
+INSTANCE = dict(main_groups=1, subgroups=1, subjects=3, optional_subjects=0, teachers=4, rooms=2, course_rooms=1,
+                days=1, slots_per_day=3)
+# (instance_generator.generate() arguments, verdict)
+INSTANCES = [
+    (dict(INSTANCE, tightness=0, seed=1), 'solved'),
+    (dict(INSTANCE, tightness=0, seed=2), 'solved'),
+    (dict(INSTANCE, tightness=0.8, seed=2), 'infeasible'),
+    (dict(INSTANCE, subgroups=2, subjects=2, tightness=0.8, seed=1), 'infeasible'),
+    (dict(INSTANCE, subgroups=2, tightness=0, seed=2), 'infeasible'),
+    (dict(INSTANCE, subgroups=2, subjects=2, tightness=0, seed=1, slots_per_day=4), 'solved'),
+    (dict(main_groups=2, subgroups=2, subjects=3, optional_subjects=1, teachers=8, rooms=6, days=5, slots_per_day=4,
+          tightness=0.6, seed=2), 'solved'),
+]
+FLAGS = ('BACKJUMPING', 'FORWARD_CHECKING', 'SYMMETRY_BREAKING')
+
+
+@pytest.fixture
+def load_eng_main(tmp_path, monkeypatch):
+    # eng_main loads its instance (./eng_data) when imported => a fresh import per instance, the one of the
+    # repo put back afterwards
+    previous = sys.modules.pop('eng_main', None)
+    monkeypatch.syspath_prepend(REPO_DIR)
+
+    def load(instance):
+        write_instance(instance, str(tmp_path))
+        monkeypatch.chdir(tmp_path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return importlib.import_module('eng_main')
+    yield load
+    sys.modules.pop('eng_main', None)
+    if previous is not None:
+        sys.modules['eng_main'] = previous
+
+
+def violations(instance, eng_main, assignment):
+    """
+    The rules the assignment (class_index -> (teacher, timeslot, room), in placement order) breaks,
+    checked against the generated instance rather than the solver's compiled tables.
+    """
+    teachers = {teacher['code']: teacher for teacher in instance['teachers']}
+    rooms = {room['code']: room for room in instance['rooms']}
+    day_of = {time['code']: time['day'] for time in instance['time_slots']}
+    max_daily_hours = instance['extra_restrictions']['max_daily_hours']
+    unpreferred_timeslots = instance['extra_restrictions']['unpreferred_timeslots']
+    broken = []
+    if len(assignment) != len(eng_main.class_list):
+        broken.append(f'{len(assignment)} of {len(eng_main.class_list)} classes placed')
+    taken = set()
+    hours = {}
+    busy_groups = {}
+    for class_index, (teacher_code, time_code, room_code) in assignment.items():
+        cls = eng_main.class_list[class_index]
+        teacher, room = teachers[teacher_code], rooms[room_code]
+        is_course = cls['type'] == 'course'
+        if cls['subject_code'] not in teacher['subjects_taught'] or (is_course and not teacher['can_teach_course']):
+            broken.append(f'R8: class {class_index} taught by teacher {teacher_code}')
+        if time_code not in room['possible_times'] or (is_course and not room['course_possible']):
+            broken.append(f'R4: class {class_index} in room {room_code} at {time_code}')
+        for resource in (('teacher', teacher_code), ('room', room_code)):  # R3, R4.1
+            if (resource, time_code) in taken:
+                broken.append(f'R3 / R4.1: {resource} twice at {time_code}')
+            taken.add((resource, time_code))
+        # R2 as add_to_timetable checks it: the group must not be busy because of a class placed before
+        if cls['group_code'] in busy_groups.get(time_code, set()):
+            broken.append(f'R2: group {cls["group_code"]} busy at {time_code}')
+        busy_groups.setdefault(time_code, set()).update(eng_main.group_conflicts[cls['group_code']])
+        for key in (teacher_code, (teacher_code, day_of[time_code])):
+            hours[key] = hours.get(key, 0) + 1
+        if hours[teacher_code] > teacher['max_hours']:
+            broken.append(f'R6: teacher {teacher_code} over {teacher["max_hours"]} hours')
+        if hours[teacher_code, day_of[time_code]] > max_daily_hours.get(str(teacher_code), teacher['max_hours']):
+            broken.append(f'E1: teacher {teacher_code} over the daily limit on {day_of[time_code]}')
+        if time_code in unpreferred_timeslots.get(str(teacher_code), []):
+            broken.append(f'E2: teacher {teacher_code} at unpreferred timeslot {time_code}')
+    return broken
+
+
+@pytest.mark.parametrize('arguments, verdict', INSTANCES)
+def test_every_flag_combination_agrees(arguments, verdict, load_eng_main, monkeypatch):
+    instance = generate(**arguments)
+    eng_main = load_eng_main(instance)
+    for values in itertools.product((True, False), repeat=len(FLAGS)):
+        configuration = dict(zip(FLAGS, values))
+        for flag, value in configuration.items():
+            monkeypatch.setattr(eng_main, flag, value)
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = eng_main.solve_timetable()
+        assert result['status'] == verdict, configuration
+        if verdict == 'solved':
+            assert violations(instance, eng_main, eng_main.best_assignment) == [], configuration
@@ -0,0 +1,195 @@
+"""
+Bulk export of an eng_main.py timetable: the group, teacher and room views are built together in one pass
+over best_timetable, and written as JSON lines (one line per group / teacher / room) or as iCalendar files
+(one weekly recurring calendar per group / teacher / room, all of them zipped for the bulk export).
+
+The group view follows transform_data: a class of EVERYONE (group 0) shows up in every main group.
+
+usage: python timetable_export.py [--format jsonl|ics] [--output PATH] [--start-date YYYY-MM-DD]
+       (jsonl goes to stdout without --output, ics files go to the --output directory, default ./export)
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import sys
+import zipfile
+
+CLASS_HOURS = 2  # every timeslot is a 2 hour class
+SEMESTER_WEEKS = 14  # the calendar events repeat weekly this many times
+DAY_ORDER = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+VIEWS = ('group', 'teacher', 'room')
+
+
+def build_views(eng_main, timetable):
+    """
+    One pass over a timetable (teacher_code -> time_code -> (group_code, room_code, subject_code, class_type)).
+    Returns {'group' | 'teacher' | 'room': {code: [class, ...]}}, every list sorted by day and hour.
+    """
+    views = {view: {} for view in VIEWS}
+    for teacher_code, schedule in timetable.items():
+        for time_code, (group_code, room_code, subject_code, class_type) in schedule.items():
+            time_slot = eng_main.time_slots[time_code]
+            start_hour = int(time_slot['hour'][:2])
+            entry = {
+                'day': time_slot['day'],
+                'start': time_slot['hour'],
+                'end': f"{start_hour + CLASS_HOURS:02d}:{time_slot['hour'][3:]}",
+                'time_code': time_code,
+                'subject_code': subject_code,
+                'subject': eng_main.subjects[subject_code]['name'],
+                'type': class_type,
+                'teacher_code': teacher_code,
+                'teacher': eng_main.teachers[teacher_code]['name'],
+                'room_code': room_code,
+                'room': eng_main.rooms[room_code]['name'],
+                'group_code': group_code,
+                'group': eng_main.groups[group_code]['name'],
+            }
+            group_codes = sorted(eng_main.main_group_codes) if group_code == 0 else [group_code]
+            for code in group_codes:
+                views['group'].setdefault(code, []).append(entry)
+            views['teacher'].setdefault(teacher_code, []).append(entry)
+            views['room'].setdefault(room_code, []).append(entry)
+
+    for entries_by_code in views.values():
+        for entries in entries_by_code.values():
+            entries.sort(key=lambda entry: (DAY_ORDER.index(entry['day']), entry['start']))
+    return views
+
+
+def view_name(eng_main, view, code):
+    catalog = {'group': eng_main.groups, 'teacher': eng_main.teachers, 'room': eng_main.rooms}[view]
+    return catalog[code]['name']
+
+
+def jsonl_lines(eng_main, views):
+    """
+    Yields one JSON line per group, teacher and room: {"view", "code", "name", "classes"}.
+    """
+    for view in VIEWS:
+        for code in sorted(views[view]):
+            record = {'view': view, 'code': code, 'name': view_name(eng_main, view, code), 'classes': views[view][code]}
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def semester_start(start_date=None):
+    # the Monday the calendars start on: start_date's week, or the coming one
+    if start_date is None:
+        today = datetime.date.today()
+        return today + datetime.timedelta(days=(7 - today.weekday()) % 7)
+    return start_date - datetime.timedelta(days=start_date.weekday())
+
+
+def ics_text(value):
+    return str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def ics_fold(line):
+    # content lines are folded at 75 octets (RFC 5545 3.1)
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74  # continuation lines start with a space
+        while cut > 0 and (encoded[cut] & 0xC0) == 0x80:  # never split a UTF-8 character
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode('utf-8'))
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def calendar(eng_main, view, code, entries, start_date=None):
+    """
+    iCalendar text of one group / teacher / room: a weekly event per class for SEMESTER_WEEKS weeks.
+    """
+    monday = semester_start(start_date)
+    title = f'{view.capitalize()} {view_name(eng_main, view, code)}'
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//FII-AI-Timetable//timetable export//EN',
+        f'X-WR-CALNAME:{ics_text(title)}',
+    ]
+    for entry in entries:
+        day = monday + datetime.timedelta(days=DAY_ORDER.index(entry['day']))
+        start = datetime.datetime.combine(day, datetime.time.fromisoformat(entry['start']))
+        end = start + datetime.timedelta(hours=CLASS_HOURS)
+        summary = f"{entry['subject']} ({entry['type']})"
+        description = f"Teacher: {entry['teacher']}, group: {entry['group']}"
+        lines += [
+            'BEGIN:VEVENT',
+            f"UID:{view}-{code}-{entry['time_code']}-{entry['group_code']}-{entry['subject_code']}-{entry['type']}@fii-ai-timetable",
+            f'DTSTAMP:{stamp}',
+            f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}",
+            f"DTEND:{end.strftime('%Y%m%dT%H%M%S')}",
+            f'RRULE:FREQ=WEEKLY;COUNT={SEMESTER_WEEKS}',
+            f'SUMMARY:{ics_text(summary)}',
+            f"LOCATION:{ics_text(entry['room'])}",
+            f'DESCRIPTION:{ics_text(description)}',
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return ''.join(ics_fold(line) for line in lines)
+
+
+def calendars(eng_main, views, start_date=None):
+    """
+    Yields (file name, iCalendar text) for every group, teacher and room: groups/101.ics, teachers/2.ics, ...
+    """
+    for view in VIEWS:
+        for code in sorted(views[view]):
+            yield f'{view}s/{code}.ics', calendar(eng_main, view, code, views[view][code], start_date)
+
+
+def ics_archive(eng_main, views, start_date=None):
+    """
+    All the calendars in one zip file (bytes).
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for file_name, text in calendars(eng_main, views, start_date):
+            archive.writestr(file_name, text)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--format', default='jsonl', choices=['jsonl', 'ics'])
+    parser.add_argument('--output', default=None, help='jsonl: output file (default stdout), ics: output directory (default ./export)')
+    parser.add_argument('--start-date', type=datetime.date.fromisoformat, default=None,
+                        help='first week of the calendars (default: the coming Monday)')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output or 'export') if args.output or args.format == 'ics' else None
+
+    from portfolio import load_solver
+    eng_main = load_solver('eng_main')  # changes to the repository directory, eng_main reads ./eng_data
+    with contextlib.redirect_stdout(sys.stderr):  # the solver's messages stay out of the jsonl output
+        status = eng_main.solve_timetable()['status']
+    if status != 'solved':
+        sys.exit(1)
+    views = build_views(eng_main, eng_main.best_timetable)
+
+    if args.format == 'jsonl':
+        if output is None:
+            sys.stdout.writelines(jsonl_lines(eng_main, views))
+        else:
+            with open(output, 'w', encoding='utf-8') as file:
+                file.writelines(jsonl_lines(eng_main, views))
+        return
+    directory = output
+    for file_name, text in calendars(eng_main, views, args.start_date):
+        path = os.path.join(directory, file_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            file.write(text)
+    print(f"{sum(len(codes) for codes in views.values())} calendars written to {directory}/")
+
+
+if __name__ == '__main__':
+    main()